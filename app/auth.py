@@ -1,23 +1,108 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from jose.exceptions import JWTError
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from app import schemas, models, database
+from app import schemas, models, database, config, metrics
 
 # Clé secrète à personnaliser en production !
 SECRET_KEY = "secret-key-to-change"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _parse_keys(raw: str) -> Dict[str, str]:
+    keys = {}
+    for entry in raw.split(","):
+        if not entry.strip():
+            continue
+        kid, sep, secret = entry.strip().partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError("JWT_KEYS : entrées attendues au format kid:secret")
+        keys[kid] = secret
+    return keys
+
+# Trousseau : la première clé signe, toutes vérifient (identifiée par l'en-tête "kid" du jeton)
+SIGNING_KEYS: Dict[str, str] = {}
+ACTIVE_KID = ""
+# Clés de vérification construites une fois par kid, pas à chaque requête
+_verification_keys: Dict[str, object] = {}
+
+def set_signing_keys(keys: Dict[str, str]):
+    global SIGNING_KEYS, ACTIVE_KID
+    if not keys:
+        raise ValueError("au moins une clé de signature est requise")
+    SIGNING_KEYS = dict(keys)
+    ACTIVE_KID = next(iter(SIGNING_KEYS))
+    _verification_keys.clear()
+
+set_signing_keys(_parse_keys(config.JWT_KEYS) or {"default": SECRET_KEY})
+
+# Imports différés : python-jose charge tous ses backends crypto (jose.jwt, ≈ 50 ms) et
+# passlib son registre de schémas (≈ 50 ms) ; ils ne pèsent plus sur le démarrage des
+# workers, mais sur le premier jeton ou le premier mot de passe traité.
+
+def _jwt():
+    from jose import jwt
+    return jwt
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+    # min_rounds : un hash calculé avec un coût inférieur est signalé obsolète et refait au login
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__rounds=config.BCRYPT_ROUNDS, bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    )
+
+class HashingBusy(Exception):
+    """Trop de hachages en attente : la requête est refusée (503) plutôt que mise en file."""
+
+# bcrypt libère le GIL : un pool de threads dédié suffit et garde le threadpool des routes libre
+_hash_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+_hash_pending_lock = threading.Lock()
+
+def _timed(operation: str, fn, *args):
+    # Temps de calcul seul (hors attente du pool), exposé dans /metrics
+    if not config.METRICS_ENABLED:
+        return fn(*args)
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        metrics.password_hash_duration.observe(time.perf_counter() - start, operation)
+
+async def _run_hashing(operation: str, fn, *args):
+    global _hash_pending
+    with _hash_pending_lock:
+        if _hash_pending >= config.PASSWORD_HASH_MAX_PENDING:
+            raise HashingBusy()
+        _hash_pending += 1
+    metrics.password_hash_pending.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, _timed, operation, fn, *args)
+    finally:
+        metrics.password_hash_pending.dec()
+        with _hash_pending_lock:
+            _hash_pending -= 1
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _timed("verify", pwd_context().verify, plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _timed("hash", pwd_context().hash, password)
+
+async def hash_password(password: str) -> str:
+    return await _run_hashing("hash", pwd_context().hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_hashing("verify", pwd_context().verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -25,14 +110,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
+    # jti : identifiant unique, permet de révoquer ce jeton seul (POST /users/logout)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _jwt().encode(to_encode, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID})
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
+def decode_token(token: str) -> dict:
+    """Vérifie signature et expiration ; JWTError si le jeton est invalide ou signé par une clé retirée."""
+    # Jetons sans kid (émis avant la rotation des clés) : vérifiés avec la clé active
+    jwt = _jwt()
+    kid = jwt.get_unverified_header(token).get("kid", ACTIVE_KID)
+    key = _verification_keys.get(kid)
+    if key is None:
+        if kid not in SIGNING_KEYS:
+            raise JWTError(f"Unknown key id: {kid}")
+        from jose import jwk
+        key = _verification_keys[kid] = jwk.construct(SIGNING_KEYS[kid], ALGORITHM)
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+async def authenticate_user(db: Session, username: str, password: str):
+    user = await database.run(db, lambda s: s.query(models.User).filter(models.User.username == username).first())
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
-    return user 
\ No newline at end of file
+    if new_hash:
+        # Hash obsolète (coût bcrypt relevé...) : remplacé de façon transparente
+        def save_hash(s):
+            user.hashed_password = new_hash
+            s.commit()
+            s.refresh(user)
+        await database.run(db, save_hash)
+    return user
@@ -0,0 +1,114 @@
+import abc
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import config, models
+
+class CacheBackend(abc.ABC):
+    """Interface des caches clé/valeur. Les valeurs sont des dicts simples (sérialisables),
+    une implémentation partagée entre workers (Redis, memcached...) peut donc s'y brancher."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+class LocalTTLCache(CacheBackend):
+    """Cache LRU borné en taille avec expiration, local au processus."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# Cache des utilisateurs authentifiés, indexé par le "sub" du token (username)
+user_cache: CacheBackend = LocalTTLCache(config.USER_CACHE_MAX_SIZE, config.USER_CACHE_TTL_SECONDS)
+
+# Le hash du mot de passe n'est jamais mis en cache (il reste chargeable à la demande)
+_CACHED_USER_COLUMNS = [c.key for c in models.User.__table__.columns if c.key != "hashed_password"]
+
+def set_user_cache_backend(backend: CacheBackend):
+    """Remplace le cache des utilisateurs, par exemple par un cache partagé entre workers (voir README)."""
+    global user_cache
+    user_cache = backend
+
+def get_user(db: Session, username: str) -> Optional[models.User]:
+    if not config.USER_CACHE_ENABLED:
+        return db.query(models.User).filter(models.User.username == username).first()
+    cached = user_cache.get(username)
+    if cached is not None:
+        # Objet "détaché" rattaché sans requête : les relations (books...) restent chargeables
+        user = models.User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is not None:
+        user_cache.set(username, {key: getattr(user, key) for key in _CACHED_USER_COLUMNS})
+    return user
+
+# Invalidation : toute modification d'un utilisateur (rôle, email, suppression...) vide son entrée.
+# Limites : seules les modifications passant par l'ORM (objet chargé puis commit) déclenchent ces
+# événements, pas les mises à jour en masse (query(...).update(), SQL direct), qui doivent appeler
+# user_cache.delete(username) ; et seul le cache du worker qui écrit est vidé. Avec le cache local,
+# un autre worker peut servir l'ancienne entrée jusqu'à USER_CACHE_TTL_SECONDS ; un cache partagé
+# (set_user_cache_backend) est invalidé pour tous.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.delete(target.username)
+    # Renommage : l'ancien username ne doit plus authentifier
+    for old_username in inspect(target).attrs.username.history.deleted:
+        user_cache.delete(old_username)
@@ -0,0 +1,153 @@
+import os
+
+# Paramètres de l'application, lus dans l'environnement (valeurs par défaut pour le développement)
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Cache des utilisateurs authentifiés (dependencies.get_current_user)
+USER_CACHE_ENABLED = _env_bool("USER_CACHE_ENABLED", True)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Hachage des mots de passe : pool dédié, hors du threadpool des routes
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Au-delà, /users/login et /users/register répondent 503 au lieu d'empiler les requêtes
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Couche base de données async (AsyncSession + aiosqlite / asyncpg) ; False : sessions sync historiques
+DB_ASYNC = _env_bool("DB_ASYNC", False)
+
+# Moteur SQLAlchemy
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./library.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recyclage des connexions (secondes, -1 : jamais) et ping avant réutilisation
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Routage lecture / écriture : GET du catalogue sur un pool de lecture, écritures sur DATABASE_URL.
+# READ_DATABASE_URL : réplique (vide : connexions en lecture seule sur la base principale)
+DB_READ_ROUTING = _env_bool("DB_READ_ROUTING", True)
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+# Après une écriture, les lectures du même client restent sur la base principale pendant
+# READ_STICKY_SECONDS (cookie READ_STICKY_COOKIE) : il relit ses propres écritures malgré le retard de la réplique
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "5"))
+READ_STICKY_COOKIE = os.getenv("READ_STICKY_COOKIE", "read_primary_until")
+# Réplicateur de test (python -m app.replication) : copie SQLite complète toutes les N secondes
+REPLICATION_INTERVAL_SECONDS = float(os.getenv("REPLICATION_INTERVAL_SECONDS", "1"))
+
+# Pragmas SQLite appliqués à chaque connexion
+SQLITE_WAL = _env_bool("SQLITE_WAL", True)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+# Cache HTTP du catalogue (livres, avis) : en-tête Cache-Control des GET publics
+# ("public, no-cache" : stockable, mais revalidé par ETag / Last-Modified à chaque usage)
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "public, no-cache")
+# Cache serveur des listes déjà sérialisées, invalidé par les écritures
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "1000"))
+
+# Couvertures : stockage par contenu (sha256), taille maximale d'upload et miniatures
+COVERS_DIR = os.getenv("COVERS_DIR", "covers").rstrip("/")
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(5 * 1024 * 1024)))
+COVER_CHUNK_SIZE = int(os.getenv("COVER_CHUNK_SIZE", str(64 * 1024)))
+# Côtés maximaux des miniatures (pixels), générées si Pillow est installé
+COVER_THUMBNAIL_SIZES = [int(s) for s in os.getenv("COVER_THUMBNAIL_SIZES", "128,512").split(",") if s.strip()]
+COVER_THUMBNAIL_WORKERS = int(os.getenv("COVER_THUMBNAIL_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+# Métriques Prometheus (GET /metrics) : middleware par route, temps SQL, pools, bcrypt
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+
+# Profilage des requêtes (mode dev/ops) : en-tête PROFILE_HEADER: 1 ou échantillonnage, résultats dans GET /admin/profiles
+PROFILING_ENABLED = _env_bool("PROFILING_ENABLED", False)
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+# Fraction des requêtes profilées d'office (0.01 : une sur cent)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+PROFILE_MAX_STATEMENTS = int(os.getenv("PROFILE_MAX_STATEMENTS", "200"))
+PROFILE_EXPLAIN = _env_bool("PROFILE_EXPLAIN", True)
+
+# Journal des requêtes SQL lentes (vide : désactivé)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+
+# Sérialisation rapide des listes (lignes SQL + orjson si installé), sortie identique octet pour octet
+FAST_JSON = _env_bool("FAST_JSON", True)
+
+# Jetons JWT : clés de signature "kid:secret,kid2:secret2" (la première signe, toutes vérifient).
+# Vide : clé unique auth.SECRET_KEY, kid "default". Rotation : ajouter la nouvelle clé en tête,
+# garder l'ancienne tant que des jetons signés avec elle peuvent être valides.
+JWT_KEYS = os.getenv("JWT_KEYS", "")
+# Jetons révoqués (POST /users/logout) : filtre de Bloom partagé par les workers de la machine via
+# ce fichier, relu (avec les révocations récentes de la table, pour les autres machines) au plus
+# toutes les JWT_REVOCATION_REFRESH_SECONDS ; la table revoked_tokens fait foi
+JWT_REVOCATION_FILE = os.getenv("JWT_REVOCATION_FILE", "revoked_tokens.bloom")
+JWT_REVOCATION_REFRESH_SECONDS = float(os.getenv("JWT_REVOCATION_REFRESH_SECONDS", "5"))
+JWT_REVOCATION_CAPACITY = int(os.getenv("JWT_REVOCATION_CAPACITY", "100000"))
+JWT_REVOCATION_ERROR_RATE = float(os.getenv("JWT_REVOCATION_ERROR_RATE", "0.001"))
+
+# Limitation de débit (seaux à jetons, 429 + Retry-After) : par uid du jeton, sinon par IP.
+# Règles "METHODE /chemin=capacité/secondes" séparées par ";" (méthode "*", chemin "/prefixe/*")
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMITS = os.getenv("RATE_LIMITS", ";".join([
+    "POST /users/login=10/60",
+    "POST /users/register=5/60",
+    "POST /books/import=5/60",
+    "GET /books/export/*=10/60",
+    "GET /borrows/export/*=10/60",
+    "GET /reviews/export/*=10/60",
+]))
+# "memory" : seaux propres à chaque worker ; "sqlite:///ratelimit.db" : partagés par les workers de la machine
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Derrière un proxy de confiance : identité = première adresse de X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = _env_bool("RATE_LIMIT_TRUST_FORWARDED", False)
+
+# Opérations groupées (POST /borrows/batch, POST /borrows/return/batch, GET /books/batch) : éléments par appel
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Durée d'un prêt : Borrow.due_date = date d'emprunt + LOAN_PERIOD_DAYS
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", "14"))
+
+# Tâches de fond (table jobs) : exécutées par des threads du processus de l'API (JOBS_IN_PROCESS)
+# et/ou par des processus dédiés (python -m app.worker)
+JOBS_IN_PROCESS = _env_bool("JOBS_IN_PROCESS", True)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Tâches périodiques planifiées et tâches bloquées (worker arrêté en cours de route) remises en file
+JOB_SCHEDULE_SECONDS = float(os.getenv("JOB_SCHEDULE_SECONDS", "30"))
+JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "900"))
+# locked_at rafraîchi à cet intervalle pendant l'exécution : seule une tâche sans worker vivant est reprise
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LOCK_TIMEOUT_SECONDS / 3)))
+# Nouvel essai après 1x, 2x, 4x... ce délai
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
+# Tâches terminées (et fichiers d'export) supprimées après ce délai
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+# Exports en tâche de fond : répertoire des fichiers et exports simultanés au plus
+JOB_EXPORT_DIR = os.getenv("JOB_EXPORT_DIR", "exports").rstrip("/")
+JOB_EXPORT_CONCURRENCY = int(os.getenv("JOB_EXPORT_CONCURRENCY", "1"))
+# Périodes des tâches de maintenance (secondes, 0 : désactivée)
+OVERDUE_SCAN_SECONDS = float(os.getenv("OVERDUE_SCAN_SECONDS", "3600"))
+RATINGS_REBUILD_SECONDS = float(os.getenv("RATINGS_REBUILD_SECONDS", "86400"))
+
+# Recommandations (GET /books/{id}/similar, GET /users/me/recommendations) : index des
+# RECOMMENDATIONS_TOP_K voisins de chaque livre, fichier ouvert en mmap par les workers
+RECOMMENDATIONS_FILE = os.getenv("RECOMMENDATIONS_FILE", "recommendations.idx")
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "20"))
+# Avis comptés comme une lecture appréciée à partir de cette note
+RECOMMENDATIONS_MIN_RATING = int(os.getenv("RECOMMENDATIONS_MIN_RATING", "3"))
+# Historique d'un utilisateur limité à ses N livres les plus récents
+RECOMMENDATIONS_MAX_ITEMS_PER_USER = int(os.getenv("RECOMMENDATIONS_MAX_ITEMS_PER_USER", "200"))
+# Mise à jour incrémentale (tâche refresh_recommendations), reconstruction complète, relecture du fichier
+RECOMMENDATIONS_REFRESH_SECONDS = float(os.getenv("RECOMMENDATIONS_REFRESH_SECONDS", "300"))
+RECOMMENDATIONS_FULL_REBUILD_SECONDS = float(os.getenv("RECOMMENDATIONS_FULL_REBUILD_SECONDS", "86400"))
+RECOMMENDATIONS_RELOAD_SECONDS = float(os.getenv("RECOMMENDATIONS_RELOAD_SECONDS", "5"))
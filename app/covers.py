@@ -0,0 +1,218 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+import anyio
+from fastapi import HTTPException, UploadFile
+from app import config
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# Couvertures stockées par contenu : covers/<2 premiers caractères du sha256>/<sha256>.<ext>.
+# Deux livres avec la même image partagent le fichier ; les miniatures sont écrites à côté
+# (<sha256>_<taille>.<ext>) par un pool de threads, après la réponse.
+# Les anciennes couvertures (covers/book_<id>_<nom>) restent servies telles quelles.
+
+logger = logging.getLogger(__name__)
+
+# Signatures des formats acceptés (premiers octets du fichier)
+_SIGNATURES = {
+    b"\xff\xd8\xff": ("jpg", "image/jpeg"),
+    b"\x89PNG\r\n\x1a\n": ("png", "image/png"),
+    b"GIF87a": ("gif", "image/gif"),
+    b"GIF89a": ("gif", "image/gif"),
+}
+MEDIA_TYPES = {ext: media_type for ext, media_type in _SIGNATURES.values()}
+MEDIA_TYPES["webp"] = "image/webp"
+
+_thumbnail_executor = ThreadPoolExecutor(max_workers=config.COVER_THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+
+def _sniff(head: bytes) -> Optional[str]:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, (ext, _) in _SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    return None
+
+def cover_path(digest: str, ext: str, size: Optional[int] = None) -> str:
+    name = f"{digest}_{size}.{ext}" if size else f"{digest}.{ext}"
+    return os.path.join(config.COVERS_DIR, digest[:2], name)
+
+def parse_cover_url(cover_url: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(sha256, extension) d'une couverture stockée ici, None pour une URL externe ou ancienne."""
+    if not cover_url or not cover_url.startswith(config.COVERS_DIR + "/"):
+        return None
+    digest, _, ext = os.path.basename(cover_url).partition(".")
+    if len(digest) != 64 or ext not in MEDIA_TYPES:
+        return None
+    return digest, ext
+
+_local_lock = threading.Lock()
+
+def _try_lock(lock_file) -> bool:
+    if fcntl is None:
+        return _local_lock.acquire(blocking=False)
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+def _unlock(lock_file):
+    if fcntl is None:
+        _local_lock.release()
+    else:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@asynccontextmanager
+async def storage_lock() -> AsyncIterator[None]:
+    """Verrou des fichiers de couvertures, entre coroutines, threads et workers de la machine.
+
+    Tenu par l'upload (fichier en place jusqu'à l'enregistrement de cover_url) et par la
+    suppression (vérification qu'aucun livre ne l'utilise, puis suppression) : un upload du
+    même contenu ne peut pas s'intercaler et perdre son fichier.
+    Attente par essais non bloquants : aucun thread n'est occupé pendant l'attente.
+    """
+    await anyio.Path(config.COVERS_DIR).mkdir(parents=True, exist_ok=True)
+    lock_file = await anyio.to_thread.run_sync(open, os.path.join(config.COVERS_DIR, ".lock"), "a")
+    try:
+        while not _try_lock(lock_file):
+            await anyio.sleep(0.01)
+        try:
+            yield
+        finally:
+            _unlock(lock_file)
+    finally:
+        lock_file.close()
+
+@asynccontextmanager
+async def stored_upload(file: UploadFile) -> AsyncIterator[str]:
+    """Écrit l'upload par blocs sans bloquer la boucle, puis le met en place sous storage_lock.
+
+    Renvoie le chemin de la couverture ; le verrou est tenu jusqu'à la fin du bloc, où
+    l'appelant enregistre cover_url. 413 au-delà de COVER_MAX_BYTES, 415 si le contenu
+    n'est pas une image reconnue.
+    """
+    tmp_dir = os.path.join(config.COVERS_DIR, "tmp")
+    await anyio.Path(tmp_dir).mkdir(parents=True, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while chunk := await file.read(config.COVER_CHUNK_SIZE):
+                if ext is None:
+                    ext = _sniff(chunk)
+                    if ext is None:
+                        raise HTTPException(status_code=415, detail="Cover must be a JPEG, PNG, GIF or WebP image")
+                size += len(chunk)
+                if size > config.COVER_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Cover larger than {config.COVER_MAX_BYTES} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+        if ext is None:
+            raise HTTPException(status_code=400, detail="Empty file")
+        path = cover_path(digest.hexdigest(), ext)
+        await anyio.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        async with storage_lock():
+            # Contenu déjà présent : le fichier existant est réutilisé (os.replace l'écraserait à l'identique)
+            if not await anyio.Path(path).exists():
+                await anyio.to_thread.run_sync(os.replace, tmp_path, path)
+            yield path
+    finally:
+        if await anyio.Path(tmp_path).exists():
+            await anyio.Path(tmp_path).unlink()
+
+def _write_thumbnails(path: str, digest: str, ext: str):
+    with _pil_image().open(path) as image:
+        image.load()
+        for size in config.COVER_THUMBNAIL_SIZES:
+            target = cover_path(digest, ext, size)
+            if os.path.exists(target):
+                continue
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            # Écriture puis renommage : un lecteur ne voit jamais de miniature partielle
+            tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+            thumbnail.save(tmp, format=image.format)
+            os.replace(tmp, target)
+
+def _thumbnail_job(path: str):
+    parsed = parse_cover_url(path)
+    try:
+        _write_thumbnails(path, *parsed)
+    except Exception:
+        logger.exception("miniatures impossibles pour %s", path)
+
+@functools.lru_cache(maxsize=None)
+def _pil_image():
+    """PIL.Image, importé à la première miniature plutôt qu'au démarrage ; None sans Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow (requirements.txt) absent : pas de miniatures, l'original est servi
+        logger.warning("Pillow n'est pas installé : miniatures de couverture désactivées (pip install Pillow)")
+        return None
+    return Image
+
+def schedule_thumbnails(path: str):
+    if _pil_image() is None:
+        return
+    if parse_cover_url(path) is None:
+        return
+    _thumbnail_executor.submit(_thumbnail_job, path)
+
+def _resolve_legacy(cover_url: Optional[str]) -> Optional[Tuple[str, str, str]]:
+    # Ancien chemin covers/book_<id>_<nom de fichier du client> : servi s'il reste dans COVERS_DIR
+    if not cover_url or not os.path.basename(cover_url).startswith("book_"):
+        return None
+    root = os.path.realpath(config.COVERS_DIR)
+    path = os.path.realpath(cover_url)
+    if os.path.dirname(path) != root or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        ext = _sniff(f.read(16))
+    if ext is None:
+        return None
+    st = os.stat(path)
+    return path, MEDIA_TYPES[ext], f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def resolve(cover_url: Optional[str], size: Optional[int] = None) -> Optional[Tuple[str, str, str]]:
+    """(chemin, type MIME, ETag) du fichier à servir ; l'original tant que la miniature manque."""
+    parsed = parse_cover_url(cover_url)
+    if parsed is None:
+        return _resolve_legacy(cover_url)
+    digest, ext = parsed
+    if size:
+        thumbnail = cover_path(digest, ext, size)
+        if os.path.exists(thumbnail):
+            return thumbnail, MEDIA_TYPES[ext], f'"{digest}-{size}"'
+    path = cover_path(digest, ext)
+    if not os.path.exists(path):
+        return None
+    # Stockage par contenu : le sha256 est un ETag fort
+    return path, MEDIA_TYPES[ext], f'"{digest}"'
+
+def remove(cover_url: Optional[str]):
+    """Supprime une couverture et ses miniatures.
+
+    Appelé sous storage_lock, après avoir vérifié qu'aucun livre ne l'utilise.
+    """
+    parsed = parse_cover_url(cover_url)
+    if parsed is None:
+        return
+    digest, ext = parsed
+    for size in (None, *config.COVER_THUMBNAIL_SIZES):
+        try:
+            os.remove(cover_path(digest, ext, size))
+        except FileNotFoundError:
+            pass
@@ -1,6 +1,17 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from app import models, schemas, auth
+from sqlalchemy import Float, case, cast, func, insert, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from app import config, models, schemas, auth, search, pagination, http_cache, serialization
+
+# Lecture en lignes pour la sérialisation rapide (rows=True) : colonnes des schémas de réponse,
+# dans l'ordre de leurs champs, suivies des colonnes utiles aux en-têtes (updated_at)
+BOOK_ROW_COLUMNS = serialization.columns_of(schemas.Book, models.Book) + [models.Book.updated_at]
+REVIEW_ROW_COLUMNS = serialization.columns_of(schemas.Review, models.Review) + [models.Review.updated_at]
+BORROW_ROW_COLUMNS = serialization.columns_of(schemas.Borrow, models.Borrow)
+USER_ROW_COLUMNS = serialization.columns_of(schemas.User, models.User, exclude=("books",))
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.username == username).first()
@@ -8,8 +19,9 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -19,25 +31,77 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # Nouvel utilisateur : aucun livre, inutile d'interroger la base à la sérialisation
+    set_committed_value(db_user, "books", [])
     return db_user
 
+def get_users(db: Session, with_books: bool = True) -> List[models.User]:
+    # selectinload : une seule requête pour les livres de tous les utilisateurs (pas de N+1)
+    if with_books:
+        return db.query(models.User).options(selectinload(models.User.books)).all()
+    users = db.query(models.User).options(raiseload(models.User.books)).all()
+    # Livres non demandés : liste vide posée explicitement, sans requête
+    for user in users:
+        set_committed_value(user, "books", [])
+    return users
+
+def get_user_records(db: Session) -> List[dict]:
+    """Utilisateurs et leurs livres en dicts prêts à encoder (même forme que schemas.User), en deux requêtes."""
+    users = serialization.records(db.query(*USER_ROW_COLUMNS).all(), serialization.fields_of(schemas.User))
+    books_by_owner = {user["id"]: [] for user in users}
+    for user in users:
+        user["books"] = books_by_owner[user["id"]]
+    if users:
+        # Même requête IN que selectinload, triée comme l'index ix_books_owner_id
+        book_rows = (
+            db.query(*BOOK_ROW_COLUMNS)
+            .filter(models.Book.owner_id.in_(list(books_by_owner)))
+            .order_by(models.Book.owner_id, models.Book.id)
+            .all()
+        )
+        for book in serialization.records(book_rows, serialization.fields_of(schemas.Book)):
+            books_by_owner[book["owner_id"]].append(book)
+    return users
+
+def load_user_books(db: Session, user: models.User) -> List[models.Book]:
+    # Charge la relation avant la sérialisation (indispensable en mode async)
+    return user.books
+
 def get_book(db: Session, book_id: int) -> Optional[models.Book]:
     return db.query(models.Book).filter(models.Book.id == book_id).first()
 
-def get_books(db: Session, skip: int = 0, limit: int = 10, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None) -> List[models.Book]:
-    query = db.query(models.Book)
+def _filter_books_ilike(query, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None):
+    # Repli pour les autres SGBD (ou SQLite sans FTS5) : scan complet de la table
     if author:
         query = query.filter(models.Book.author.ilike(f"%{author}%"))
     if title:
         query = query.filter(models.Book.title.ilike(f"%{title}%"))
     if keyword:
         query = query.filter(models.Book.description.ilike(f"%{keyword}%"))
+    return query
+
+def query_books(db: Session, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None, ranked: bool = True):
+    query = db.query(models.Book)
+    if not (author or title or keyword):
+        return query
+    if search.fts_available(db):
+        return search.filter_books(query, author=author, title=title, keyword=keyword, ranked=ranked)
+    return _filter_books_ilike(query, author=author, title=title, keyword=keyword)
+
+def get_books(db: Session, skip: int = 0, limit: int = 10, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None, after: Optional[int] = None, rows: bool = False) -> List[models.Book]:
+    # after renseigné : pagination par curseur sur id (pas de tri par pertinence)
+    query = query_books(db, author=author, title=title, keyword=keyword, ranked=after is None)
+    if rows:
+        query = query.with_entities(*BOOK_ROW_COLUMNS)
+    if after is not None:
+        return pagination.seek(query, [models.Book.id], [after]).limit(limit).all()
     return query.offset(skip).limit(limit).all()
 
 def create_book(db: Session, book: schemas.BookCreate, user_id: int) -> models.Book:
     db_book = models.Book(**book.dict(), owner_id=user_id)
     db.add(db_book)
     db.commit()
+    http_cache.invalidate("books")
     db.refresh(db_book)
     return db_book
 
@@ -45,58 +109,262 @@ def update_book(db: Session, db_book: models.Book, book_update: schemas.BookUpda
     for key, value in book_update.dict(exclude_unset=True).items():
         setattr(db_book, key, value)
     db.commit()
+    http_cache.invalidate("books")
     db.refresh(db_book)
     return db_book
 
 def delete_book(db: Session, db_book: models.Book):
     db.delete(db_book)
     db.commit()
+    http_cache.invalidate("books", "reviews")
 
-def create_borrow(db: Session, user_id: int, book_id: int) -> models.Borrow:
-    db_borrow = models.Borrow(user_id=user_id, book_id=book_id)
-    db.add(db_borrow)
+def cover_in_use(db: Session, cover_url: str) -> bool:
+    return db.query(models.Book.id).filter(models.Book.cover_url == cover_url).first() is not None
+
+def set_book_cover(db: Session, db_book: models.Book, cover_url: str) -> Optional[str]:
+    """Change la couverture ; renvoie l'ancienne si plus aucun livre ne l'utilise (fichier à supprimer)."""
+    old_cover = db_book.cover_url
+    db_book.cover_url = cover_url
     db.commit()
+    http_cache.invalidate("books")
+    db.refresh(db_book)
+    if old_cover and old_cover != cover_url and not cover_in_use(db, old_cover):
+        return old_cover
+    return None
+
+def create_borrow(db: Session, user_id: int, book_id: int) -> Optional[models.Borrow]:
+    # Vérification et insertion atomiques : l'index ix_borrows_open_book refuse
+    # un second emprunt en cours. None si le livre est déjà emprunté.
+    now = datetime.utcnow()
+    db_borrow = models.Borrow(user_id=user_id, book_id=book_id, borrow_date=now, due_date=now + timedelta(days=config.LOAN_PERIOD_DAYS))
+    db.add(db_borrow)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
     db.refresh(db_borrow)
     return db_borrow
 
 def return_borrow(db: Session, borrow_id: int) -> Optional[models.Borrow]:
     db_borrow = db.query(models.Borrow).filter(models.Borrow.id == borrow_id).first()
     if db_borrow and db_borrow.return_date is None:
-        from datetime import datetime
         db_borrow.return_date = datetime.utcnow()
         db.commit()
         db.refresh(db_borrow)
     return db_borrow
 
+# Opérations groupées (comptoir de prêt) : vérifications ensemblistes, écritures en une
+# instruction et un seul commit. Un résultat (id demandé, ligne, erreur) par élément, dans l'ordre.
+BATCH_NOT_FOUND = "not_found"
+BATCH_UNAVAILABLE = "unavailable"
+BATCH_FORBIDDEN = "forbidden"
+BATCH_ALREADY_RETURNED = "already_returned"
+
+BatchResult = Tuple[int, Optional[dict], Optional[str]]
+
+def get_books_by_ids(db: Session, book_ids: List[int]) -> Dict[int, models.Book]:
+    return {book.id: book for book in db.query(models.Book).filter(models.Book.id.in_(book_ids))}
+
+def create_borrows(db: Session, user_id: int, book_ids: List[int]) -> List[BatchResult]:
+    existing = set(db.scalars(select(models.Book.id).where(models.Book.id.in_(book_ids))))
+    taken = set(db.scalars(select(models.Borrow.book_id).where(models.Borrow.book_id.in_(book_ids), models.Borrow.return_date.is_(None))))
+    errors: Dict[int, str] = {}
+    candidates: List[int] = []
+    for book_id in book_ids:
+        if book_id not in existing:
+            errors.setdefault(book_id, BATCH_NOT_FOUND)
+        elif book_id in taken:
+            errors.setdefault(book_id, BATCH_UNAVAILABLE)
+        else:
+            # Un livre demandé deux fois : seule la première demande l'emprunte
+            taken.add(book_id)
+            candidates.append(book_id)
+    now = datetime.utcnow()
+    statement = insert(models.Borrow).returning(*BORROW_ROW_COLUMNS)
+    due_date = now + timedelta(days=config.LOAN_PERIOD_DAYS)
+    params = [{"user_id": user_id, "book_id": book_id, "borrow_date": now, "due_date": due_date} for book_id in candidates]
+    created: Dict[int, dict] = {}
+    try:
+        if params:
+            created = {row.book_id: dict(row._mapping) for row in db.execute(statement, params)}
+        db.commit()
+    except IntegrityError:
+        # Emprunt concurrent entre la vérification et l'insertion (ix_borrows_open_book) :
+        # repli livre par livre, chacun dans un savepoint, toujours un seul commit
+        db.rollback()
+        created = {}
+        for item in params:
+            try:
+                with db.begin_nested():
+                    created[item["book_id"]] = dict(db.execute(statement, item).one()._mapping)
+            except IntegrityError:
+                pass
+        db.commit()
+    results: List[BatchResult] = []
+    returned = set()
+    for book_id in book_ids:
+        if book_id in created and book_id not in returned:
+            returned.add(book_id)
+            results.append((book_id, created[book_id], None))
+        else:
+            results.append((book_id, None, errors.get(book_id, BATCH_UNAVAILABLE)))
+    return results
+
+def return_borrows(db: Session, borrow_ids: List[int], user_id: int, is_admin: bool = False) -> List[BatchResult]:
+    found = {row.id: dict(row._mapping) for row in db.execute(select(*BORROW_ROW_COLUMNS).where(models.Borrow.id.in_(borrow_ids)))}
+    errors: Dict[int, str] = {}
+    candidates = set()
+    for borrow_id in borrow_ids:
+        borrow = found.get(borrow_id)
+        if borrow is None:
+            errors[borrow_id] = BATCH_NOT_FOUND
+        elif borrow["user_id"] != user_id and not is_admin:
+            errors[borrow_id] = BATCH_FORBIDDEN
+        elif borrow["return_date"] is not None or borrow_id in candidates:
+            errors.setdefault(borrow_id, BATCH_ALREADY_RETURNED)
+        else:
+            candidates.add(borrow_id)
+    now = datetime.utcnow()
+    returned = set()
+    if candidates:
+        # Un seul UPDATE ; RETURNING écarte les emprunts rendus entre-temps par une autre requête
+        returned = set(db.scalars(
+            update(models.Borrow)
+            .where(models.Borrow.id.in_(candidates), models.Borrow.return_date.is_(None))
+            .values(return_date=now)
+            .returning(models.Borrow.id),
+            execution_options={"synchronize_session": False},
+        ))
+    db.commit()
+    results: List[BatchResult] = []
+    for borrow_id in borrow_ids:
+        if borrow_id in returned:
+            returned.discard(borrow_id)
+            results.append((borrow_id, {**found[borrow_id], "return_date": now}, None))
+        else:
+            results.append((borrow_id, None, errors.get(borrow_id, BATCH_ALREADY_RETURNED)))
+    return results
+
 def get_borrow_by_id(db: Session, borrow_id: int) -> Optional[models.Borrow]:
     return db.query(models.Borrow).filter(models.Borrow.id == borrow_id).first()
 
-def get_borrows_by_user(db: Session, user_id: int) -> List[models.Borrow]:
-    return db.query(models.Borrow).filter(models.Borrow.user_id == user_id).all()
+def get_borrows_by_user(db: Session, user_id: int, after: Optional[Tuple[int]] = None, limit: Optional[int] = None) -> List[models.Borrow]:
+    # raiseload : les listes ne sérialisent aucune relation, un accès paresseux serait un N+1
+    query = db.query(models.Borrow).options(raiseload("*")).filter(models.Borrow.user_id == user_id)
+    return pagination.seek(query, [models.Borrow.id], after).limit(limit).all()
+
+def get_all_borrows(db: Session, after: Optional[Tuple[int]] = None, limit: Optional[int] = None, rows: bool = False) -> List[models.Borrow]:
+    query = db.query(*BORROW_ROW_COLUMNS) if rows else db.query(models.Borrow).options(raiseload("*"))
+    return pagination.seek(query, [models.Borrow.id], after).limit(limit).all()
+
+def get_overdue_borrows(db: Session, now: Optional[datetime] = None, after: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None) -> List[models.Borrow]:
+    # Index partiel ix_borrows_open_due : seuls les prêts en cours sont parcourus, par échéance
+    query = db.query(models.Borrow).options(raiseload("*")).filter(
+        models.Borrow.return_date.is_(None), models.Borrow.due_date < (now or datetime.utcnow())
+    )
+    return pagination.seek(query, [models.Borrow.due_date, models.Borrow.id], after).limit(limit).all()
+
+def flag_overdue_borrows(db: Session, now: Optional[datetime] = None) -> int:
+    """Marque (overdue_at) les prêts passés en retard depuis le dernier passage ; renvoie leur nombre."""
+    now = now or datetime.utcnow()
+    flagged = db.execute(
+        update(models.Borrow)
+        .where(models.Borrow.return_date.is_(None), models.Borrow.due_date < now, models.Borrow.overdue_at.is_(None))
+        .values(overdue_at=now),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.commit()
+    return flagged
 
-def get_all_borrows(db: Session) -> List[models.Borrow]:
-    return db.query(models.Borrow).all()
+def _apply_rating_delta(db: Session, book_id: int, count_delta: int, total_delta: int):
+    # Mise à jour incrémentale en SQL : les membres de droite lisent les anciennes valeurs,
+    # deux avis simultanés ne peuvent pas s'écraser
+    new_count = models.Book.review_count + count_delta
+    new_total = models.Book.rating_total + total_delta
+    db.query(models.Book).filter(models.Book.id == book_id).update({
+        models.Book.review_count: new_count,
+        models.Book.rating_total: new_total,
+        models.Book.average_rating: case((new_count > 0, cast(new_total, Float) / new_count), else_=None),
+        models.Book.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
 
 def create_review(db: Session, user_id: int, review: schemas.ReviewCreate) -> models.Review:
     db_review = models.Review(user_id=user_id, book_id=review.book_id, comment=review.comment, rating=review.rating)
     db.add(db_review)
+    _apply_rating_delta(db, review.book_id, 1, review.rating)
     db.commit()
+    http_cache.invalidate("books", "reviews")
     db.refresh(db_review)
     return db_review
 
-def get_reviews_by_book(db: Session, book_id: int) -> List[models.Review]:
-    return db.query(models.Review).filter(models.Review.book_id == book_id).all()
+def get_reviews_by_book(db: Session, book_id: int, after: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None, rows: bool = False) -> List[models.Review]:
+    query = db.query(*REVIEW_ROW_COLUMNS) if rows else db.query(models.Review).options(raiseload("*"))
+    query = query.filter(models.Review.book_id == book_id)
+    return pagination.seek(query, [models.Review.created_at, models.Review.id], after).limit(limit).all()
 
 def get_review_by_id(db: Session, review_id: int) -> Optional[models.Review]:
     return db.query(models.Review).filter(models.Review.id == review_id).first()
 
 def update_review(db: Session, db_review: models.Review, review_update: schemas.ReviewUpdate) -> models.Review:
+    old_rating = db_review.rating
     for key, value in review_update.dict(exclude_unset=True).items():
         setattr(db_review, key, value)
+    if db_review.rating != old_rating:
+        _apply_rating_delta(db, db_review.book_id, 0, db_review.rating - old_rating)
     db.commit()
+    http_cache.invalidate("books", "reviews")
     db.refresh(db_review)
     return db_review
 
 def delete_review(db: Session, db_review: models.Review):
+    _apply_rating_delta(db, db_review.book_id, -1, -db_review.rating)
     db.delete(db_review)
-    db.commit() 
\ No newline at end of file
+    db.commit()
+    http_cache.invalidate("books", "reviews")
+
+def get_top_rated_books(db: Session, limit: int = 10, min_reviews: int = 1, rows: bool = False) -> List[models.Book]:
+    return (
+        (db.query(*BOOK_ROW_COLUMNS) if rows else db.query(models.Book))
+        .filter(models.Book.review_count >= min_reviews)
+        .order_by(models.Book.average_rating.desc(), models.Book.review_count.desc(), models.Book.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+def get_history_book_ids(db: Session, user_id: int, limit: int) -> List[int]:
+    """Livres empruntés ou bien notés par l'utilisateur, du plus récent au plus ancien."""
+    rows = db.execute(union_all(
+        select(models.Borrow.book_id, models.Borrow.borrow_date).where(models.Borrow.user_id == user_id),
+        select(models.Review.book_id, models.Review.created_at)
+        .where(models.Review.user_id == user_id, models.Review.rating >= config.RECOMMENDATIONS_MIN_RATING),
+    )).all()
+    # Historique d'un seul lecteur : trié et dédoublonné ici plutôt que par un GROUP BY en table temporaire
+    rows.sort(key=lambda row: row[1] or datetime.min, reverse=True)
+    return list(dict.fromkeys(book_id for book_id, _ in rows))[:limit]
+
+def rebuild_book_ratings(db: Session) -> int:
+    """Recalcule en une requête les agrégats d'avis de tous les livres (après un import, par ex.).
+
+    Seuls les livres dont les agrégats changent sont réécrits : leur updated_at (Last-Modified,
+    ETag) et le cache des listes ne bougent pas pour un recalcul qui retombe sur les mêmes valeurs.
+    """
+    reviews = models.Review
+    def per_book(expression):
+        return select(expression).where(reviews.book_id == models.Book.id).scalar_subquery()
+    review_count = per_book(func.count(reviews.id))
+    rating_total = per_book(func.coalesce(func.sum(reviews.rating), 0))
+    result = db.execute(
+        update(models.Book)
+        .where((models.Book.review_count != review_count) | (models.Book.rating_total != rating_total))
+        .values(
+            review_count=review_count,
+            rating_total=rating_total,
+            average_rating=per_book(cast(func.avg(reviews.rating), Float)),
+            updated_at=datetime.utcnow(),
+        )
+    )
+    db.commit()
+    if result.rowcount:
+        http_cache.invalidate("books")
+    return result.rowcount
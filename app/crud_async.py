@@ -0,0 +1,94 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from app import crud, models, schemas
+from app.database import run
+
+# Variantes async de crud.py, utilisées par les routes async.
+# db est une AsyncSession (DB_ASYNC) ou une Session sync : database.run choisit le chemin.
+
+async def get_user_by_username(db, username: str) -> Optional[models.User]:
+    return await run(db, crud.get_user_by_username, username)
+
+async def get_user_by_email(db, email: str) -> Optional[models.User]:
+    return await run(db, crud.get_user_by_email, email)
+
+async def create_user(db, user: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    return await run(db, crud.create_user, user, hashed_password)
+
+async def get_users(db, with_books: bool = True) -> List[models.User]:
+    return await run(db, crud.get_users, with_books=with_books)
+
+async def get_user_records(db) -> List[dict]:
+    return await run(db, crud.get_user_records)
+
+async def load_user_books(db, user: models.User) -> List[models.Book]:
+    return await run(db, crud.load_user_books, user)
+
+async def get_book(db, book_id: int) -> Optional[models.Book]:
+    return await run(db, crud.get_book, book_id)
+
+async def get_books(db, skip: int = 0, limit: int = 10, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None, after: Optional[int] = None, rows: bool = False) -> List[models.Book]:
+    return await run(db, crud.get_books, skip=skip, limit=limit, author=author, title=title, keyword=keyword, after=after, rows=rows)
+
+async def create_book(db, book: schemas.BookCreate, user_id: int) -> models.Book:
+    return await run(db, crud.create_book, book, user_id)
+
+async def update_book(db, db_book: models.Book, book_update: schemas.BookUpdate) -> models.Book:
+    return await run(db, crud.update_book, db_book, book_update)
+
+async def delete_book(db, db_book: models.Book):
+    return await run(db, crud.delete_book, db_book)
+
+async def cover_in_use(db, cover_url: str) -> bool:
+    return await run(db, crud.cover_in_use, cover_url)
+
+async def set_book_cover(db, db_book: models.Book, cover_url: str) -> Optional[str]:
+    return await run(db, crud.set_book_cover, db_book, cover_url)
+
+async def create_borrow(db, user_id: int, book_id: int) -> Optional[models.Borrow]:
+    return await run(db, crud.create_borrow, user_id, book_id)
+
+async def return_borrow(db, borrow_id: int) -> Optional[models.Borrow]:
+    return await run(db, crud.return_borrow, borrow_id)
+
+async def get_books_by_ids(db, book_ids: List[int]) -> Dict[int, models.Book]:
+    return await run(db, crud.get_books_by_ids, book_ids)
+
+async def create_borrows(db, user_id: int, book_ids: List[int]) -> List[crud.BatchResult]:
+    return await run(db, crud.create_borrows, user_id, book_ids)
+
+async def return_borrows(db, borrow_ids: List[int], user_id: int, is_admin: bool = False) -> List[crud.BatchResult]:
+    return await run(db, crud.return_borrows, borrow_ids, user_id, is_admin=is_admin)
+
+async def get_overdue_borrows(db, after: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None) -> List[models.Borrow]:
+    return await run(db, crud.get_overdue_borrows, after=after, limit=limit)
+
+async def get_borrow_by_id(db, borrow_id: int) -> Optional[models.Borrow]:
+    return await run(db, crud.get_borrow_by_id, borrow_id)
+
+async def get_borrows_by_user(db, user_id: int, after: Optional[Tuple[int]] = None, limit: Optional[int] = None) -> List[models.Borrow]:
+    return await run(db, crud.get_borrows_by_user, user_id, after=after, limit=limit)
+
+async def get_all_borrows(db, after: Optional[Tuple[int]] = None, limit: Optional[int] = None, rows: bool = False) -> List[models.Borrow]:
+    return await run(db, crud.get_all_borrows, after=after, limit=limit, rows=rows)
+
+async def create_review(db, user_id: int, review: schemas.ReviewCreate) -> models.Review:
+    return await run(db, crud.create_review, user_id, review)
+
+async def get_reviews_by_book(db, book_id: int, after: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None, rows: bool = False) -> List[models.Review]:
+    return await run(db, crud.get_reviews_by_book, book_id, after=after, limit=limit, rows=rows)
+
+async def get_review_by_id(db, review_id: int) -> Optional[models.Review]:
+    return await run(db, crud.get_review_by_id, review_id)
+
+async def update_review(db, db_review: models.Review, review_update: schemas.ReviewUpdate) -> models.Review:
+    return await run(db, crud.update_review, db_review, review_update)
+
+async def delete_review(db, db_review: models.Review):
+    return await run(db, crud.delete_review, db_review)
+
+async def get_top_rated_books(db, limit: int = 10, min_reviews: int = 1, rows: bool = False) -> List[models.Book]:
+    return await run(db, crud.get_top_rated_books, limit=limit, min_reviews=min_reviews, rows=rows)
+
+async def get_history_book_ids(db, user_id: int, limit: int) -> List[int]:
+    return await run(db, crud.get_history_book_ids, user_id, limit)
@@ -1,12 +1,197 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from typing import Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from app import config, profiling
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./library.db"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+class PoolMetrics:
+    """Compteurs du pool : attente pour obtenir une connexion, durée de détention, timeouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hold_seconds_total = 0.0
+        self.connects = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_hold(self, seconds: float):
+        with self._lock:
+            self.hold_seconds_total += seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "hold_seconds_total": round(self.hold_seconds_total, 6),
+            }
+
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+def _timed_pool_class(base, metrics: PoolMetrics):
+    # _do_get est le point d'extension documenté des pools : on y mesure l'attente d'une connexion
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except sa_exc.TimeoutError:
+                metrics.record_wait(time.perf_counter() - start, timed_out=True)
+                raise
+            metrics.record_wait(time.perf_counter() - start)
+            return conn
+    return TimedPool
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def _engine_options(url, name: str, pool_base) -> dict:
+    options = {"pool_pre_ping": config.DB_POOL_PRE_PING, "pool_recycle": config.DB_POOL_RECYCLE}
+    if url.get_backend_name() == "sqlite" and not url.drivername.endswith("aiosqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    if not _is_sqlite_memory(url):
+        metrics = pool_metrics.setdefault(name, PoolMetrics())
+        options.update(
+            poolclass=_timed_pool_class(pool_base, metrics),
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+    return options
+
+def _instrument(engine: Engine, name: str, read_only: bool = False):
+    metrics = pool_metrics.setdefault(name, PoolMetrics())
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.record_connect()
+        if engine.dialect.name != "sqlite":
+            return
+        # WAL : lecteurs et écrivain ne se bloquent plus ; busy_timeout : attente au lieu de "database is locked"
+        cursor = dbapi_connection.cursor()
+        if config.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        if read_only:
+            # Pool de lecture : toute écriture par erreur échoue au lieu de prendre le verrou
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checkout_at", None)
+        if start is not None:
+            metrics.record_hold(time.perf_counter() - start)
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, **_engine_options(make_url(SQLALCHEMY_DATABASE_URL), "primary", QueuePool)
 )
+_instrument(engine, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base() 
\ No newline at end of file
+Base = declarative_base()
+
+# Pilotes async correspondant aux URL sync
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=_ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(hide_password=False)
+
+# Moteur async, créé uniquement si DB_ASYNC est activé (aiosqlite/asyncpg restent optionnels)
+async_engine = None
+AsyncSessionLocal = None
+if config.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    _async_url = async_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **_engine_options(make_url(_async_url), "async", AsyncAdaptedQueuePool))
+    _instrument(async_engine.sync_engine, "async")
+    # expire_on_commit=False : un attribut expiré serait rechargé hors greenlet (MissingGreenlet)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Routage lecture / écriture : les GET du catalogue lisent sur un pool séparé (réplique si
+# READ_DATABASE_URL, sinon connexions en lecture seule sur la base principale, en WAL les
+# lecteurs ne bloquent pas l'écrivain) ; les écritures restent sur engine.
+READ_DATABASE_URL = config.READ_DATABASE_URL or SQLALCHEMY_DATABASE_URL
+read_engine = engine
+ReadSessionLocal = SessionLocal
+async_read_engine = async_engine
+AsyncReadSessionLocal = AsyncSessionLocal
+read_routing = config.DB_READ_ROUTING and not _is_sqlite_memory(make_url(READ_DATABASE_URL))
+if read_routing:
+    read_engine = create_engine(READ_DATABASE_URL, **_engine_options(make_url(READ_DATABASE_URL), "read", QueuePool))
+    _instrument(read_engine, "read", read_only=True)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    if config.DB_ASYNC:
+        _async_read_url = async_url(READ_DATABASE_URL)
+        async_read_engine = create_async_engine(_async_read_url, **_engine_options(make_url(_async_read_url), "async_read", AsyncAdaptedQueuePool))
+        _instrument(async_read_engine.sync_engine, "async_read", read_only=True)
+        AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+def engines() -> Dict[str, Engine]:
+    """Moteurs (sync) par nom de pool, pour l'instrumentation et les statistiques."""
+    named = {"primary": engine}
+    if async_engine is not None:
+        named["async"] = async_engine.sync_engine
+    if read_routing:
+        named["read"] = read_engine
+        if async_read_engine is not None:
+            named["async_read"] = async_read_engine.sync_engine
+    return named
+
+def pool_stats() -> Dict[str, dict]:
+    """État des pools (taille, connexions prises, débordement) et compteurs cumulés."""
+    stats = {}
+    for name, eng in engines().items():
+        pool = eng.pool
+        stats[name] = {
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            **pool_metrics.setdefault(name, PoolMetrics()).snapshot(),
+        }
+    return stats
+
+async def run(db, fn, *args, **kwargs):
+    """Exécute fn(session, *args) sans bloquer la boucle d'événements.
+
+    Session sync : dans le threadpool. AsyncSession : via run_sync, le code sync de crud.py
+    tourne alors sur le pilote async (lazy loading compris).
+    """
+    if isinstance(db, Session):
+        # Requête profilée : le travail fait dans le thread entre aussi dans le profil
+        return await run_in_threadpool(profiling.in_thread(fn), db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
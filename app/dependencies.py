@@ -1,8 +1,9 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose.exceptions import JWTError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from app import models, schemas, database, auth
+from app import schemas, database, auth, cache, config, revocation, replication
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
@@ -15,30 +16,84 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+# Session des routes async : AsyncSession si DB_ASYNC, sinon la session sync de get_db
+# (même fonction : FastAPI partage alors la session avec les dépendances sur get_db)
+get_session = get_async_db if config.DB_ASYNC else get_db
+
+# Session des GET du catalogue : pool de lecture (réplique), sauf pour un client qui vient
+# d'écrire (cookie de replication.StickyWritesMiddleware) : base principale
+
+def get_read_db(request: Request):
+    db = (database.SessionLocal if replication.is_sticky(request) else database.ReadSessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    factory = database.AsyncSessionLocal if replication.is_sticky(request) else database.AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
+
+if database.read_routing:
+    get_read_session = get_async_read_db if config.DB_ASYNC else get_read_db
+else:
+    get_read_session = get_session
+
 # Dépendance pour obtenir l'utilisateur courant
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def _is_revoked(db, jti: str) -> bool:
+    revocations = revocation.revocations
+    if revocations.needs_rebuild():
+        await database.run(db, revocations.rebuild)
+    elif revocations.needs_sync():
+        # Une requête toutes les JWT_REVOCATION_REFRESH_SECONDS : révocations des autres machines
+        await database.run(db, revocations.sync)
+    # Cas courant : absent du filtre de Bloom, aucune requête SQL
+    if not revocations.might_be_revoked(jti):
+        return False
+    return await database.run(db, revocations.is_revoked, jti)
+
+async def get_token_claims(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)) -> schemas.TokenClaims:
+    """Jeton vérifié (signature, expiration, révocation), sans lecture de l'utilisateur."""
     try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        claims = schemas.TokenClaims(**auth.decode_token(token))
+    except (JWTError, ValidationError):
+        raise _credentials_exception()
+    if claims.jti is not None and await _is_revoked(db, claims.jti):
+        raise _credentials_exception()
+    return claims
+
+async def get_current_user(claims: schemas.TokenClaims = Depends(get_token_claims), db: Session = Depends(get_session)):
+    token_data = schemas.TokenData(username=claims.sub)
+    # Cache des utilisateurs : évite une requête SQL par appel authentifié
+    user = await database.run(db, cache.get_user, token_data.username)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
-# Dépendance pour vérifier le rôle admin
+# Dépendance pour vérifier le rôle admin : le rôle signé dans le jeton suffit, sans accès à la base.
+# Un changement de rôle prend effet à l'expiration du jeton (ou à sa révocation).
 
-def get_current_admin(current_user: models.User = Depends(get_current_user)):
-    if current_user.role != "admin":
+async def get_current_admin(claims: schemas.TokenClaims = Depends(get_token_claims), db: Session = Depends(get_session)) -> schemas.TokenClaims:
+    role = claims.role
+    if role is None:
+        # Jeton émis avant l'ajout du rôle dans les claims
+        user = await database.run(db, cache.get_user, claims.sub)
+        if user is None:
+            raise _credentials_exception()
+        role = user.role
+    if role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return current_user 
\ No newline at end of file
+    return claims
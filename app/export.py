@@ -0,0 +1,120 @@
+import csv
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+from io import StringIO
+import os
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+from app import crud, database, models
+
+# Export en flux : les lignes sont lues par lots (yield_per) et écrites au fil de l'eau,
+# la mémoire utilisée ne dépend pas de la taille de la table.
+BATCH_SIZE = 1000
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv",
+    ExportFormat.ndjson: "application/x-ndjson",
+}
+
+def iter_rows(build_query: Callable[[Session], Query], columns: Sequence, batch_size: int = BATCH_SIZE) -> Iterator[tuple]:
+    # Session propre au générateur : il est consommé après la fin de la requête (et de get_db).
+    # Lecture longue : sur le pool de lecture (réplique), pas sur la base principale
+    db = database.ReadSessionLocal()
+    try:
+        query = build_query(db).with_entities(*columns).order_by(None).order_by(columns[0])
+        for row in query.yield_per(batch_size):
+            yield tuple(row)
+    finally:
+        db.close()
+
+def csv_chunks(header: List[str], rows: Iterable[tuple], batch_size: int = BATCH_SIZE) -> Iterator[str]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def ndjson_chunks(header: List[str], rows: Iterable[tuple], batch_size: int = BATCH_SIZE) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(header, row)), default=_json_default, ensure_ascii=False))
+        if len(lines) == batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    # wbits=31 : en-tête et trailer gzip, compression au fil du flux
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Jeux de données exportables : colonnes et requête, selon des filtres sérialisables en JSON
+# (partagés par les routes /export/{fmt} et les exports en tâche de fond)
+class Dataset(str, Enum):
+    books = "books"
+    reviews = "reviews"
+    borrows = "borrows"
+
+def dataset(name: Dataset, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None,
+            book_id: Optional[int] = None) -> Tuple[list, Callable[[Session], Query]]:
+    if name == Dataset.books:
+        columns = [models.Book.id, models.Book.title, models.Book.author, models.Book.description, models.Book.cover_url, models.Book.owner_id]
+        return columns, lambda db: crud.query_books(db, author=author, title=title, keyword=keyword, ranked=False)
+    if name == Dataset.reviews:
+        columns = [models.Review.id, models.Review.book_id, models.Review.user_id, models.Review.rating, models.Review.comment, models.Review.created_at]
+        def build_query(db):
+            query = db.query(models.Review)
+            if book_id is not None:
+                query = query.filter(models.Review.book_id == book_id)
+            return query
+        return columns, build_query
+    columns = [models.Borrow.id, models.Borrow.user_id, models.Borrow.book_id, models.Borrow.borrow_date, models.Borrow.return_date]
+    return columns, lambda db: db.query(models.Borrow)
+
+def chunks_for(columns: Sequence, build_query: Callable[[Session], Query], fmt: ExportFormat, gzip: bool = False) -> Iterator:
+    header = [column.key for column in columns]
+    writer = csv_chunks if fmt == ExportFormat.csv else ndjson_chunks
+    chunks = writer(header, iter_rows(build_query, columns))
+    return gzip_chunks(chunks) if gzip else chunks
+
+def filename_for(name: str, fmt: ExportFormat, gzip: bool = False) -> str:
+    return f"{name}.{fmt.value}" + (".gz" if gzip else "")
+
+def media_type_for(fmt: ExportFormat, gzip: bool = False) -> str:
+    return "application/gzip" if gzip else MEDIA_TYPES[fmt]
+
+def write_file(path: str, columns: Sequence, build_query: Callable[[Session], Query], fmt: ExportFormat, gzip: bool = False) -> int:
+    """Écrit l'export dans path (fichier temporaire puis renommage) ; renvoie sa taille en octets."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        for chunk in chunks_for(columns, build_query, fmt, gzip=gzip):
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+def stream(name: str, columns: Sequence, build_query: Callable[[Session], Query], fmt: ExportFormat, gzip: bool = False) -> StreamingResponse:
+    chunks = chunks_for(columns, build_query, fmt, gzip=gzip)
+    filename = filename_for(name, fmt, gzip)
+    return StreamingResponse(chunks, media_type=media_type_for(fmt, gzip), headers={"Content-Disposition": f"attachment; filename={filename}"})
@@ -0,0 +1,152 @@
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from app import config, profiling, replication, serialization
+from app.cache import CacheBackend, LocalTTLCache
+
+# Cache HTTP du catalogue : validateurs (ETag, Last-Modified) et réponses 304 pour les GET
+# publics, plus un cache serveur des listes qui évite requête SQL et sérialisation.
+
+# Réponses des listes déjà sérialisées, indexées par espace de noms + paramètres normalisés
+response_cache: CacheBackend = LocalTTLCache(config.RESPONSE_CACHE_MAX_SIZE, config.RESPONSE_CACHE_TTL_SECONDS)
+
+def set_response_cache_backend(backend: CacheBackend):
+    global response_cache
+    response_cache = backend
+
+def _now_seconds() -> datetime:
+    # Arrondi à la seconde supérieure : résolution de Last-Modified / If-Modified-Since
+    now = datetime.utcnow()
+    return now.replace(microsecond=0) + timedelta(seconds=1) if now.microsecond else now
+
+def _generation_entry(namespace: str) -> Dict[str, str]:
+    # Jeton aléatoire plutôt qu'un compteur : s'il est évincé du cache, le nouveau jeton
+    # ne peut pas retomber sur d'anciennes entrées
+    key = f"generation:{namespace}"
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = {"token": uuid.uuid4().hex, "changed_at": _now_seconds().isoformat()}
+        response_cache.set(key, entry)
+    return entry
+
+def _generation(namespace: str) -> str:
+    return _generation_entry(namespace)["token"]
+
+def changed_at(namespace: str) -> datetime:
+    """Date de la dernière invalidation de l'espace de noms (maintenant si elle est inconnue)."""
+    return datetime.fromisoformat(_generation_entry(namespace)["changed_at"])
+
+def invalidate(*namespaces: str):
+    """Rend obsolètes toutes les listes en cache des espaces de noms donnés."""
+    for namespace in namespaces:
+        previous = response_cache.get(f"generation:{namespace}")
+        moment = _now_seconds()
+        if previous is not None:
+            # Strictement croissante : deux invalidations dans la même seconde restent distinctes
+            moment = max(moment, datetime.fromisoformat(previous["changed_at"]) + timedelta(seconds=1))
+        response_cache.set(f"generation:{namespace}", {"token": uuid.uuid4().hex, "changed_at": moment.isoformat()})
+
+def cache_key(namespace: str, **params: Any) -> str:
+    # Ordre des paramètres indifférent, paramètres absents ignorés, espaces superflus retirés
+    normalized = sorted(
+        (name, value.strip() if isinstance(value, str) else value)
+        for name, value in params.items() if value is not None
+    )
+    return f"{namespace}:{_generation(namespace)}:{urlencode(normalized)}"
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    # Les dates de la base sont en UTC naïf
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def version_etag(*parts: Any) -> str:
+    # Identifiant + updated_at : change à chaque modification de la ligne, sans sérialiser
+    raw = ":".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": config.HTTP_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = (c.strip() for c in header.split(","))
+    return etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    # If-None-Match l'emporte sur If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, headers["ETag"])
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            return parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def _replica_may_lag(request: Request, key: str) -> bool:
+    if not replication.reads_from_replica(request):
+        return False
+    # Espace de noms : premier champ de la clé (cache_key)
+    namespace = key.split(":", 1)[0]
+    return datetime.utcnow() < changed_at(namespace) + timedelta(seconds=config.READ_STICKY_SECONDS)
+
+async def cached_json(
+    request: Request,
+    key: str,
+    build: Callable[[Response], Awaitable[Tuple[Any, Optional[datetime]]]],
+) -> Response:
+    """Sert une liste depuis le cache serveur, ou l'y place.
+
+    build(response) renvoie (contenu, date de dernière modification) et peut poser des
+    en-têtes (X-Next-Cursor) sur response ; ils sont mis en cache avec le corps.
+    La clé est calculée avant build : une invalidation concurrente rend l'entrée inaccessible.
+    Un client qui vient d'écrire ne lit pas le cache (il a pu être rempli depuis une réplique
+    en retard) : la liste est reconstruite depuis la base principale et remplace l'entrée.
+    Moins de READ_STICKY_SECONDS après une invalidation, une liste lue sur la réplique n'est
+    pas mise en cache : elle peut ne pas contenir l'écriture qui a invalidé l'espace de noms.
+    """
+    fresh = replication.is_sticky(request)
+    entry = response_cache.get(key) if config.RESPONSE_CACHE_ENABLED and not fresh else None
+    if entry is None:
+        scratch = Response()
+        payload, last_modified = await build(scratch)
+        with profiling.serialization():
+            body = serialization.render(payload)
+        extra = {k: v for k, v in scratch.headers.items() if k not in ("content-length", "content-type")}
+        entry = {
+            "body": body.decode(),
+            "headers": {**extra, **validators(body_etag(body), last_modified)},
+        }
+        if config.RESPONSE_CACHE_ENABLED and not _replica_may_lag(request, key):
+            response_cache.set(key, entry)
+    headers = entry["headers"]
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+def last_modified_of(items: Iterable[Any]) -> Optional[datetime]:
+    return max((i.updated_at for i in items if i.updated_at is not None), default=None)
+
+def list_last_modified(namespace: str, items: Iterable[Any]) -> datetime:
+    """Last-Modified d'une liste : une suppression ne change aucun updated_at restant,
+    la date d'invalidation de l'espace de noms l'emporte donc sur celle des lignes."""
+    newest = last_modified_of(items)
+    invalidated = changed_at(namespace)
+    return invalidated if newest is None else max(newest, invalidated)
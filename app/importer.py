@@ -0,0 +1,126 @@
+import csv
+import gzip
+import io
+import json
+import time
+import zlib
+from typing import BinaryIO, Iterator, List, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app import models, schemas, http_cache
+from app.export import ExportFormat
+
+# Import en masse : validation ligne à ligne, insertion par lots (un INSERT multi-lignes
+# et un commit par lot) au lieu d'un commit + refresh par livre.
+IMPORT_BATCH_SIZE = 1000
+# Au-delà, les lignes rejetées sont comptées mais plus détaillées dans le rapport
+IMPORT_MAX_ERRORS = 1000
+
+_BOOK_FIELDS = set(schemas.BookCreate.model_fields)
+
+# Fichier illisible en cours de route : la ligne fautive est signalée et la lecture s'arrête
+_READ_ERRORS = (UnicodeDecodeError, csv.Error, gzip.BadGzipFile, EOFError, zlib.error)
+
+def detect_format(filename: str) -> ExportFormat:
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return ExportFormat.ndjson if name.endswith((".ndjson", ".jsonl")) else ExportFormat.csv
+
+def iter_records(file: BinaryIO, fmt: ExportFormat, compressed: bool = False) -> Iterator[Tuple[int, object]]:
+    """Lit le fichier au fil de l'eau et renvoie (numéro de ligne, dict ou erreur de lecture)."""
+    row = 0
+    try:
+        for row, record in _iter_lines(file, fmt, compressed):
+            yield row, record
+    except _READ_ERRORS as exc:
+        yield row + 1, _read_error(exc)
+
+def _read_error(exc: Exception) -> ValueError:
+    if isinstance(exc, UnicodeDecodeError):
+        return ValueError("file is not valid UTF-8, import stopped")
+    if isinstance(exc, csv.Error):
+        return ValueError(f"invalid CSV ({exc}), import stopped")
+    return ValueError("corrupt or truncated gzip file, import stopped")
+
+def _iter_lines(file: BinaryIO, fmt: ExportFormat, compressed: bool) -> Iterator[Tuple[int, object]]:
+    if compressed:
+        file = gzip.GzipFile(fileobj=file, mode="rb")
+    # utf-8-sig : tolère le BOM des CSV enregistrés par Excel
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if fmt == ExportFormat.csv:
+        for row, record in enumerate(csv.DictReader(text), 1):
+            yield row, record
+        return
+    for row, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield row, exc
+            continue
+        yield row, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+def _clean(record: dict) -> dict:
+    # Les colonnes id/owner_id de l'export sont ignorées, "" (CSV) vaut None
+    return {k: (v if v != "" else None) for k, v in record.items() if k in _BOOK_FIELDS}
+
+def _format_errors(exc: Exception) -> List[str]:
+    if isinstance(exc, ValidationError):
+        return [f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in exc.errors()]
+    return [str(exc)]
+
+def import_books(db: Session, file: BinaryIO, fmt: ExportFormat, owner_id: int, compressed: bool = False, batch_size: int = IMPORT_BATCH_SIZE) -> schemas.BookImportReport:
+    start = time.perf_counter()
+    inserted = 0
+    rejected = 0
+    errors: List[schemas.BookImportRowError] = []
+    batch: List[Tuple[int, dict]] = []
+
+    def reject(row: int, messages: List[str]):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append(schemas.BookImportRowError(row=row, errors=messages))
+
+    def flush():
+        nonlocal inserted
+        try:
+            db.execute(insert(models.Book), [values for _, values in batch])
+            db.commit()
+            inserted += len(batch)
+        except SQLAlchemyError as exc:
+            # Un lot en échec n'annule pas les lots déjà validés
+            db.rollback()
+            for row, _ in batch:
+                reject(row, [f"database error: {exc.__class__.__name__}"])
+        batch.clear()
+
+    for row, record in iter_records(file, fmt, compressed=compressed):
+        if isinstance(record, Exception):
+            reject(row, _format_errors(record))
+            continue
+        try:
+            book = schemas.BookCreate(**_clean(record))
+        except ValidationError as exc:
+            reject(row, _format_errors(exc))
+            continue
+        batch.append((row, {**book.model_dump(), "owner_id": owner_id}))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if inserted:
+        http_cache.invalidate("books")
+
+    duration = time.perf_counter() - start
+    return schemas.BookImportReport(
+        inserted=inserted,
+        rejected=rejected,
+        errors=errors,
+        duration_seconds=round(duration, 3),
+        rows_per_second=round((inserted + rejected) / duration, 1) if duration > 0 else 0.0,
+    )
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app import config, database, models
+
+# File de tâches persistante (table jobs) : toute tâche est enregistrée avant d'être exécutée,
+# survit aux redémarrages et peut être prise par n'importe quel worker (threads de l'API ou
+# python -m app.worker). Une tâche est réservée par un UPDATE conditionnel sur son statut :
+# deux workers ne peuvent pas exécuter la même.
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class Handler(NamedTuple):
+    fn: Callable[[Session, models.Job, dict], Optional[dict]]
+    # Tâches de ce type exécutées en même temps, tous workers confondus
+    concurrency: int
+    max_attempts: int
+    # Période en secondes des tâches planifiées (None : à la demande seulement)
+    every: Optional[float]
+
+HANDLERS: Dict[str, Handler] = {}
+
+def handler(kind: str, concurrency: int = 1, max_attempts: int = 3, every: Optional[float] = None):
+    """Déclare la fonction fn(db, job, payload) -> résultat (dict JSON) qui exécute les tâches kind."""
+    def register(fn):
+        HANDLERS[kind] = Handler(fn, concurrency, max_attempts, every or None)
+        return fn
+    return register
+
+# Réveille les workers du processus dès qu'une tâche est ajoutée (sinon : JOB_POLL_SECONDS)
+_wakeup = threading.Event()
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, owner_id: Optional[int] = None, run_after: Optional[datetime] = None) -> models.Job:
+    if kind not in HANDLERS:
+        raise ValueError(f"type de tâche inconnu : {kind}")
+    job = models.Job(
+        kind=kind, payload=json.dumps(payload or {}), owner_id=owner_id,
+        max_attempts=HANDLERS[kind].max_attempts, run_after=run_after or datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wakeup.set()
+    return job
+
+def get_job(db: Session, job_id: int) -> Optional[models.Job]:
+    return db.get(models.Job, job_id)
+
+def claim(db: Session, worker_id: str) -> Optional[models.Job]:
+    """Réserve la prochaine tâche exécutable, dans la limite de concurrence de son type."""
+    now = datetime.utcnow()
+    candidates = db.execute(
+        select(models.Job.id, models.Job.kind)
+        .where(models.Job.status == PENDING, models.Job.run_after <= now)
+        .order_by(models.Job.run_after, models.Job.id)
+        .limit(20)
+    ).all()
+    for job_id, kind in candidates:
+        spec = HANDLERS.get(kind)
+        if spec is None:
+            # Type déclaré par une autre version de l'application
+            continue
+        running = (
+            select(func.count()).select_from(models.Job)
+            .where(models.Job.kind == kind, models.Job.status == RUNNING)
+            .scalar_subquery()
+        )
+        # Statut et limite vérifiés dans l'UPDATE même (écritures sérialisées par SQLite)
+        claimed = db.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == PENDING, running < spec.concurrency)
+            .values(status=RUNNING, locked_by=worker_id, locked_at=now, attempts=models.Job.attempts + 1),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(models.Job, job_id)
+    return None
+
+class _Heartbeat:
+    """Rafraîchit locked_at pendant l'exécution (connexion à part) : requeue_stale ne reprend
+    pas une tâche longue dont le worker est vivant."""
+
+    def __init__(self, job_id: int, worker_id: Optional[str], interval: float):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f"job-heartbeat-{self.job_id}", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = database.SessionLocal()
+            try:
+                db.execute(
+                    update(models.Job)
+                    .where(models.Job.id == self.job_id, models.Job.status == RUNNING, models.Job.locked_by == self.worker_id)
+                    .values(locked_at=datetime.utcnow()),
+                    execution_options={"synchronize_session": False},
+                )
+                db.commit()
+            except Exception:
+                logger.exception("tâche %s : locked_at non rafraîchi", self.job_id)
+            finally:
+                db.close()
+
+def execute(db: Session, job: models.Job):
+    spec = HANDLERS[job.kind]
+    try:
+        with _Heartbeat(job.id, job.locked_by, config.JOB_HEARTBEAT_SECONDS):
+            result = spec.fn(db, job, json.loads(job.payload or "{}"))
+    except Exception as exc:
+        db.rollback()
+        logger.exception("tâche %s (%s) : échec de l'essai %s/%s", job.id, job.kind, job.attempts, job.max_attempts)
+        job.error = f"{type(exc).__name__}: {exc}"
+        if job.attempts < job.max_attempts:
+            job.status = PENDING
+            job.run_after = datetime.utcnow() + timedelta(seconds=config.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+        else:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+    else:
+        job.status = SUCCEEDED
+        job.result = json.dumps(result or {})
+        job.error = None
+        job.finished_at = datetime.utcnow()
+    job.locked_by = None
+    db.commit()
+
+def run_next(worker_id: str = "inline") -> Optional[int]:
+    """Exécute une tâche en attente s'il y en a une ; renvoie son id."""
+    db = database.SessionLocal()
+    try:
+        job = claim(db, worker_id)
+        if job is None:
+            return None
+        execute(db, job)
+        return job.id
+    finally:
+        db.close()
+
+def run_pending(worker_id: str = "inline") -> List[int]:
+    """Exécute les tâches en attente jusqu'à épuisement (tests, scripts)."""
+    done = []
+    while (job_id := run_next(worker_id)) is not None:
+        done.append(job_id)
+    return done
+
+def requeue_stale(db: Session) -> int:
+    """Remet en file les tâches réservées par un worker disparu (au-delà de JOB_LOCK_TIMEOUT_SECONDS)."""
+    limit = datetime.utcnow() - timedelta(seconds=config.JOB_LOCK_TIMEOUT_SECONDS)
+    stale = (models.Job.status == RUNNING, models.Job.locked_at < limit)
+    failed = db.query(models.Job).filter(*stale, models.Job.attempts >= models.Job.max_attempts).update(
+        {models.Job.status: FAILED, models.Job.error: "worker lost", models.Job.finished_at: datetime.utcnow(), models.Job.locked_by: None},
+        synchronize_session=False,
+    )
+    requeued = db.query(models.Job).filter(*stale).update(
+        {models.Job.status: PENDING, models.Job.locked_by: None}, synchronize_session=False,
+    )
+    db.commit()
+    return failed + requeued
+
+def schedule_periodic(db: Session) -> List[str]:
+    """Ajoute la prochaine occurrence des tâches périodiques qui n'en ont pas en file."""
+    scheduled = []
+    for kind, spec in HANDLERS.items():
+        if spec.every is None:
+            continue
+        queued = db.query(models.Job.id).filter(models.Job.kind == kind, models.Job.status.in_((PENDING, RUNNING))).first()
+        if queued is not None:
+            continue
+        # Une période après la dernière exécution (ou après le démarrage, s'il n'y en a pas)
+        last = db.query(func.max(models.Job.finished_at)).filter(models.Job.kind == kind).scalar()
+        run_after = (last or datetime.utcnow()) + timedelta(seconds=spec.every)
+        enqueue(db, kind, run_after=run_after)
+        scheduled.append(kind)
+    return scheduled
+
+def maintain():
+    db = database.SessionLocal()
+    try:
+        requeue_stale(db)
+        schedule_periodic(db)
+    finally:
+        db.close()
+
+class Worker:
+    """Threads d'exécution des tâches, plus un thread de planification (périodiques, tâches bloquées)."""
+
+    def __init__(self, threads: int = config.JOB_WORKERS, poll_seconds: float = config.JOB_POLL_SECONDS):
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self.thread_count = threads
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        targets = [(self._maintenance_loop, "job-scheduler")]
+        targets += [(lambda i=i: self._loop(f"{self.id}:{i}"), f"job-worker-{i}") for i in range(self.thread_count)]
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("worker %s : %s threads", self.id, self.thread_count)
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job_id = run_next(worker_id)
+            except Exception:
+                logger.exception("worker %s : erreur de la file de tâches", worker_id)
+                job_id = None
+            if job_id is None:
+                _wakeup.wait(self.poll_seconds)
+                _wakeup.clear()
+
+    def _maintenance_loop(self):
+        while not self._stop.is_set():
+            try:
+                maintain()
+            except Exception:
+                logger.exception("worker %s : erreur de planification", self.id)
+            self._stop.wait(config.JOB_SCHEDULE_SECONDS)
@@ -1,21 +1,61 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.routers import users, books
-from app.routers import borrows, reviews
-from app import models, database
-import uvicorn
+from app.routers import borrows, reviews, admin, jobs as jobs_router, metrics as metrics_router, profiles as profiles_router
+from app import database, migrations, auth, metrics, config, profiling, ratelimit, jobs, replication
 
-app = FastAPI(title="API Gestion Bibliothèque", description="API REST sécurisée pour la gestion d'une bibliothèque de livres.")
+# Démarrage et arrêt : mise à jour du schéma (une requête si déjà à jour), tâches de fond
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrations.upgrade(database.engine)
+    # Tâches de fond dans le processus de l'API (sinon : python -m app.worker)
+    worker = jobs.Worker() if config.JOBS_IN_PROCESS else None
+    if worker is not None:
+        worker.start()
+    app.state.job_worker = worker
+    try:
+        yield
+    finally:
+        if worker is not None:
+            worker.stop()
 
-# Création des tables au démarrage
-@app.on_event("startup")
-def on_startup():
-    models.Base.metadata.create_all(bind=database.engine)
+app = FastAPI(title="API Gestion Bibliothèque", description="API REST sécurisée pour la gestion d'une bibliothèque de livres.", lifespan=lifespan)
+
+# File de hachage bcrypt saturée : le client est invité à réessayer
+@app.exception_handler(auth.HashingBusy)
+def hashing_busy_handler(request: Request, exc: auth.HashingBusy):
+    return JSONResponse(status_code=503, content={"detail": "Authentication service busy, retry later"}, headers={"Retry-After": "1"})
 
 # Inclusion des routeurs
 app.include_router(users.router)
 app.include_router(books.router)
 app.include_router(borrows.router)
 app.include_router(reviews.router)
+app.include_router(admin.router)
+app.include_router(jobs_router.router)
+
+# Réplique en retard possible : lectures sur la base principale juste après une écriture du même client
+if database.read_routing and config.READ_DATABASE_URL:
+    replication.install(app)
+
+# Limitation de débit : branchée avant les métriques, qui comptent donc aussi les réponses 429
+if config.RATE_LIMIT_ENABLED:
+    ratelimit.install(app)
+
+# Métriques Prometheus : middleware ASGI pur (pas de BaseHTTPMiddleware) et GET /metrics
+if config.METRICS_ENABLED:
+    metrics.install(app)
+    app.include_router(metrics_router.router)
+
+# Profilage à la demande (GET /admin/profiles) et journal des requêtes lentes
+if config.PROFILING_ENABLED:
+    profiling.install(app)
+    app.include_router(profiles_router.router)
+if config.SLOW_QUERY_LOG:
+    for engine in database.engines().values():
+        profiling.install_slow_query_log(engine, config.SLOW_QUERY_LOG, config.SLOW_QUERY_THRESHOLD_MS)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
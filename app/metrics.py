@@ -0,0 +1,255 @@
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Métriques au format texte Prometheus (0.0.4), sans dépendance externe.
+# Chaque observation coûte un verrou et quelques opérations : assez léger pour la production.
+# Les étiquettes sont des gabarits de route (/books/{book_id}), jamais des chemins bruts.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Lignes de la métrique au format texte, en-têtes HELP / TYPE compris."""
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Par combinaison d'étiquettes : [compte par seau (non cumulé) + débordement, somme, total]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(labels)
+            return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        # Collecteurs appelés au moment du scrape (valeurs lues ailleurs : pools, files d'attente)
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter("http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status")))
+http_duration = registry.register(Histogram("http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route")))
+# Le gabarit de route n'est connu qu'après le routage : les requêtes en cours sont comptées par routeur
+http_in_progress = registry.register(Gauge("http_requests_in_progress", "Requêtes HTTP en cours", ("router",)))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Requêtes SQL par requête HTTP", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+))
+request_db_duration = registry.register(Histogram("http_request_db_duration_seconds", "Temps SQL cumulé par requête HTTP", ("method", "route")))
+db_queries = registry.register(Counter("db_queries_total", "Requêtes SQL exécutées", ("engine",)))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Durée des requêtes SQL", ("engine",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+password_hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "Durée des hachages / vérifications bcrypt", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+))
+password_hash_pending = registry.register(Gauge("password_hash_pending", "Hachages bcrypt en cours ou en attente du pool"))
+
+# Accumulateur [nombre de requêtes SQL, secondes] de la requête HTTP en cours.
+# Les contextvars suivent la requête dans le threadpool (run_in_threadpool) et dans run_sync.
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def instrument_engine(engine: Engine, name: str):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        db_queries.inc(name)
+        db_query_duration.observe(elapsed, name)
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # Requête en échec : after_cursor_execute n'est pas appelé
+        starts = context.connection.info.get("metrics_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+def _router_of(path: str) -> str:
+    # Premier segment du chemin (/books/12 -> books) : cardinalité bornée par le nombre de routeurs
+    segment = path.strip("/").split("/", 1)[0]
+    return segment if segment in KNOWN_ROUTERS else "other"
+
+KNOWN_ROUTERS = {"users", "books", "borrows", "reviews", "admin", "metrics"}
+
+class MetricsMiddleware:
+    """Middleware ASGI pur : compte, chronomètre et suit les requêtes en cours par route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        router = _router_of(scope["path"])
+        status_code = 500
+        start = time.perf_counter()
+        db_token = _request_db.set([0, 0.0])
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_progress.inc(router)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_progress.dec(router)
+            elapsed = time.perf_counter() - start
+            queries, db_seconds = _request_db.get()
+            _request_db.reset(db_token)
+            # Gabarit posé dans le scope par le routeur ; sans route (404), étiquette fixe
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, template, str(status_code))
+            http_duration.observe(elapsed, method, template)
+            request_db_queries.observe(queries, method, template)
+            request_db_duration.observe(db_seconds, method, template)
+
+def _gauge_lines(name: str, documentation: str, kind: str, samples: Iterable[Tuple[str, float]]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines.extend(f'{name}{{pool="{pool}"}} {_format_value(value)}' for pool, value in samples if value is not None)
+    return lines
+
+# (nom de la métrique, clé de database.pool_stats(), type, description)
+_POOL_METRICS = [
+    ("db_pool_size", "size", "gauge", "Taille du pool de connexions"),
+    ("db_pool_checked_out", "checked_out", "gauge", "Connexions actuellement prises"),
+    ("db_pool_overflow", "overflow", "gauge", "Connexions en débordement"),
+    ("db_pool_checkouts_total", "checkouts", "counter", "Connexions obtenues du pool"),
+    ("db_pool_timeouts_total", "timeouts", "counter", "Attentes de connexion expirées"),
+    ("db_pool_wait_seconds_total", "wait_seconds_total", "counter", "Temps total d'attente d'une connexion"),
+    ("db_pool_hold_seconds_total", "hold_seconds_total", "counter", "Temps total de détention des connexions"),
+]
+
+def _pool_collector() -> List[str]:
+    from app import database
+    stats = database.pool_stats()
+    lines: List[str] = []
+    for name, key, kind, documentation in _POOL_METRICS:
+        lines.extend(_gauge_lines(name, documentation, kind, ((pool, s[key]) for pool, s in stats.items())))
+    return lines
+
+def install(app):
+    """Branche le middleware et les événements SQLAlchemy (appelé si METRICS_ENABLED)."""
+    from app import database
+    for name, engine in database.engines().items():
+        instrument_engine(engine, name)
+    registry.add_collector(_pool_collector)
+    app.add_middleware(MetricsMiddleware)
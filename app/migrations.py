@@ -0,0 +1,144 @@
+import logging
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app import config, models, search
+
+# Migrations versionnées : chaque étape est appliquée une fois, dans sa propre transaction,
+# et le numéro de version est conservé dans la table schema_version.
+# Les étapes sont idempotentes (IF NOT EXISTS, colonnes vérifiées) : une base créée par
+# create_all avec le modèle courant les traverse sans erreur.
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _create_index(conn: Connection, name: str, table: str, columns: str, unique: bool = False, where: Optional[str] = None):
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(text(sql))
+
+def _initial_schema(conn: Connection):
+    models.Base.metadata.create_all(bind=conn)
+
+def _legacy_columns(conn: Connection):
+    # Bases créées avant l'ajout des rôles et des couvertures
+    _add_column(conn, "users", "role", "VARCHAR NOT NULL DEFAULT 'user'")
+    _add_column(conn, "books", "cover_url", "VARCHAR")
+
+def _full_text_index(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        return
+    try:
+        with conn.begin_nested():
+            search.create_fts(conn)
+    except OperationalError:
+        logger.warning("FTS5 indisponible : la recherche de livres reste en ILIKE")
+
+def _foreign_key_indexes(conn: Connection):
+    _create_index(conn, "ix_borrows_user_id", "borrows", "user_id")
+    _create_index(conn, "ix_borrows_book_id_borrow_date", "borrows", "book_id, borrow_date")
+    # Un seul prêt en cours par livre : les doublons hérités sont clos (on garde le plus ancien)
+    closed = conn.execute(text(
+        "UPDATE borrows SET return_date = CURRENT_TIMESTAMP "
+        "WHERE return_date IS NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM borrows WHERE return_date IS NULL GROUP BY book_id)"
+    )).rowcount
+    if closed:
+        logger.warning("%s emprunt(s) en double clos avant l'index unique ix_borrows_open_book", closed)
+    _create_index(conn, "ix_borrows_open_book", "borrows", "book_id", unique=True, where="return_date IS NULL")
+    _create_index(conn, "ix_reviews_book_id_created_at", "reviews", "book_id, created_at")
+    _create_index(conn, "ix_reviews_user_id", "reviews", "user_id")
+    _create_index(conn, "ix_books_owner_id", "books", "owner_id")
+
+def _rating_aggregates(conn: Connection):
+    _add_column(conn, "books", "review_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "books", "rating_total", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "books", "average_rating", "FLOAT")
+    _create_index(conn, "ix_books_top_rated", "books", "average_rating, review_count")
+    # Les avis existants sont agrégés une fois ; ensuite crud les tient à jour
+    conn.execute(text(
+        "UPDATE books SET "
+        "review_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id), "
+        "rating_total = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.book_id = books.id), "
+        "average_rating = (SELECT AVG(rating) FROM reviews WHERE reviews.book_id = books.id)"
+    ))
+
+def _updated_at_columns(conn: Connection):
+    _add_column(conn, "books", "updated_at", "DATETIME")
+    _add_column(conn, "reviews", "updated_at", "DATETIME")
+    conn.execute(text("UPDATE books SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+    conn.execute(text("UPDATE reviews SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL"))
+
+def _revoked_tokens(conn: Connection):
+    models.RevokedToken.__table__.create(bind=conn, checkfirst=True)
+
+def _jobs_and_due_dates(conn: Connection):
+    models.Job.__table__.create(bind=conn, checkfirst=True)
+    _add_column(conn, "borrows", "due_date", "DATETIME")
+    _add_column(conn, "borrows", "overdue_at", "DATETIME")
+    # Emprunts existants : échéance à la durée de prêt par défaut (LOAN_PERIOD_DAYS)
+    days = config.LOAN_PERIOD_DAYS
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("UPDATE borrows SET due_date = datetime(borrow_date, :offset) WHERE due_date IS NULL"), {"offset": f"+{days} days"})
+    else:
+        conn.execute(text("UPDATE borrows SET due_date = borrow_date + make_interval(days => :days) WHERE due_date IS NULL"), {"days": days})
+    _create_index(conn, "ix_borrows_open_due", "borrows", "due_date", where="return_date IS NULL")
+
+def _revoked_at(conn: Connection):
+    _add_column(conn, "revoked_tokens", "revoked_at", "DATETIME")
+    conn.execute(text("UPDATE revoked_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE revoked_at IS NULL"))
+    _create_index(conn, "ix_revoked_tokens_revoked_at", "revoked_tokens", "revoked_at")
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "schéma initial", _initial_schema),
+    (2, "colonnes users.role et books.cover_url", _legacy_columns),
+    (3, "index plein texte des livres", _full_text_index),
+    (4, "index des clés étrangères et index composites", _foreign_key_indexes),
+    (5, "agrégats des avis sur books (moyenne, nombre)", _rating_aggregates),
+    (6, "colonnes updated_at (ETag / Last-Modified)", _updated_at_columns),
+    (7, "table revoked_tokens (révocation des JWT)", _revoked_tokens),
+    (8, "table jobs, échéance des emprunts et index des prêts en cours", _jobs_and_due_dates),
+    (9, "colonne revoked_tokens.revoked_at (révocations des autres machines)", _revoked_at),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_TABLE):
+            return 0
+        return conn.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar() or 0
+
+def _stored_version(engine: Engine) -> Optional[int]:
+    # Une seule requête, sans réflexion du schéma ; None si la table de version n'existe pas encore
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return None
+
+def upgrade(engine: Engine) -> int:
+    """Applique les migrations en attente et renvoie la version du schéma."""
+    # Cas courant au démarrage d'un worker : schéma déjà à jour, rien d'autre à lire
+    if _stored_version(engine) == LATEST_VERSION:
+        return LATEST_VERSION
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (version INTEGER NOT NULL)"))
+    version = current_version(engine)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        logger.info("migration %s : %s", number, description)
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(text(f"INSERT INTO {VERSION_TABLE} (version) VALUES (:version)"), {"version": number})
+        version = number
+    search.reset_fts_cache()
+    return version
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Index, text
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -21,27 +21,87 @@ class Book(Base):
     author = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=True)
     cover_url = Column(String, nullable=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # Agrégats des avis, tenus à jour par crud.create/update/delete_review
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_total = Column(Integer, nullable=False, default=0, server_default="0")
+    average_rating = Column(Float, nullable=True)
+    # Validateurs HTTP (ETag, Last-Modified) : mis à jour à chaque écriture, agrégats compris
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     owner = relationship("User", back_populates="books")
     borrows = relationship("Borrow", back_populates="book")
+    # Classement GET /books/top-rated (parcouru à l'envers pour l'ordre décroissant)
+    __table_args__ = (Index("ix_books_top_rated", "average_rating", "review_count"),)
 
 class Borrow(Base):
     __tablename__ = "borrows"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
     borrow_date = Column(DateTime, default=datetime.utcnow)
     return_date = Column(DateTime, nullable=True)
+    # Échéance (crud : borrow_date + LOAN_PERIOD_DAYS) ; overdue_at posé par la tâche overdue_scan
+    due_date = Column(DateTime, nullable=True)
+    overdue_at = Column(DateTime, nullable=True)
     user = relationship("User", back_populates="borrows")
     book = relationship("Book", back_populates="borrows")
+    __table_args__ = (
+        # Au plus un emprunt en cours par livre, garanti par la base (index unique partiel)
+        Index(
+            "ix_borrows_open_book", "book_id", unique=True,
+            sqlite_where=text("return_date IS NULL"), postgresql_where=text("return_date IS NULL"),
+        ),
+        # Historique des emprunts d'un livre
+        Index("ix_borrows_book_id_borrow_date", "book_id", "borrow_date"),
+        # Prêts en cours par échéance : retards (GET /borrows/overdue, tâche overdue_scan)
+        Index(
+            "ix_borrows_open_due", "due_date",
+            sqlite_where=text("return_date IS NULL"), postgresql_where=text("return_date IS NULL"),
+        ),
+    )
 
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
     comment = Column(Text, nullable=True)
     rating = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user = relationship("User")
-    book = relationship("Book") 
\ No newline at end of file
+    book = relationship("Book")
+    # Avis d'un livre triés par date (pagination par curseur)
+    __table_args__ = (Index("ix_reviews_book_id_created_at", "book_id", "created_at"),) 
+
+class RevokedToken(Base):
+    # Jetons révoqués avant expiration (POST /users/logout), purgés une fois expirés
+    __tablename__ = "revoked_tokens"
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # Lu par les autres machines pour compléter leur filtre (app.revocation.RevocationList.sync)
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Job(Base):
+    # File des tâches de fond (app.jobs) : l'état survit aux redémarrages
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    # pending, running, succeeded, failed
+    status = Column(String, nullable=False, default="pending")
+    payload = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    __table_args__ = (
+        # Prochaine tâche à exécuter, et tâches en cours par type (limite de concurrence)
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_kind_status", "kind", "status"),
+    )
@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+# Pagination par curseur (keyset) : "WHERE (col1, col2) > (:v1, :v2) ORDER BY col1, col2 LIMIT n"
+# reste en O(limit) quelle que soit la profondeur de page, contrairement à OFFSET.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: type) -> Optional[Tuple[Any, ...]]:
+    """Décode un curseur opaque. Une chaîne vide signifie "première page" et renvoie None."""
+    if cursor == "":
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for t, v in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def seek(query, columns: Sequence, values: Optional[Sequence[Any]]):
+    """Filtre (c1, c2, ...) > (v1, v2, ...) puis trie sur ces colonnes."""
+    if values:
+        # Forme développée plutôt que tuple_() : portable et utilise l'index sur c1
+        clauses = []
+        for i, column in enumerate(columns):
+            equal = [columns[j] == values[j] for j in range(i)]
+            clauses.append(and_(*equal, column > values[i]))
+        query = query.filter(or_(*clauses))
+    return query.order_by(*columns)
+
+def page_limit(after: Optional[str], limit: Optional[int]) -> Optional[int]:
+    """Sans curseur ni limit : liste complète, comme avant la pagination ; sinon pages de DEFAULT_PAGE_SIZE."""
+    if limit is None and after is not None:
+        return DEFAULT_PAGE_SIZE
+    return limit
+
+def set_next_cursor(response: Response, items: Sequence, limit: Optional[int], key: Callable[[Any], Sequence[Any]]):
+    # Page pleine : il peut en rester, le client repasse ce curseur dans ?after=
+    if limit is not None and items and len(items) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(items[-1]))
@@ -0,0 +1,274 @@
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app import config
+
+# Profilage à la demande (en-tête PROFILE_HEADER) ou par échantillonnage (PROFILE_SAMPLE_RATE) :
+# profil cProfile, temps mur et CPU, requêtes SQL avec durée et EXPLAIN QUERY PLAN, temps de
+# sérialisation. Les profils sont consultables via GET /admin/profiles.
+# Le journal des requêtes lentes (SLOW_QUERY_LOG) est indépendant et reste actif en production.
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+class RequestProfile:
+    def __init__(self, profile_id: int, method: str, path: str, query: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.query = query
+        self.started_at = datetime.utcnow()
+        self.status: Optional[int] = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.statements: List[Dict[str, Any]] = []
+        # Un cProfile par thread : boucle d'événements + threads de database.run
+        self.profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_profiler(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def add_statement(self, statement: str, parameters, seconds: float):
+        with self._lock:
+            if len(self.statements) < config.PROFILE_MAX_STATEMENTS:
+                self.statements.append({"statement": statement, "parameters": parameters, "duration_ms": round(seconds * 1000, 3)})
+
+    def stats_text(self, limit: int = 40) -> str:
+        profilers = [p for p in self.profilers if p.getstats()]
+        if not profilers:
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(profilers[0], stream=out)
+        for other in profilers[1:]:
+            stats.add(other)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall_seconds * 1000, 3),
+            "cpu_ms": round(self.cpu_seconds * 1000, 3),
+            "serialization_ms": round(self.serialization_seconds * 1000, 3),
+            "sql_count": len(self.statements),
+            "sql_ms": round(sum(s["duration_ms"] for s in self.statements), 3),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "sql": self.statements, "profile": self.stats_text()}
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+_profiles: "deque[RequestProfile]" = deque(maxlen=config.PROFILE_MAX_STORED)
+_ids = itertools.count(1)
+# cProfile ne supporte qu'un profileur actif par thread : une requête profilée à la fois
+_loop_profiler_lock = threading.Lock()
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return [p.summary() for p in reversed(_profiles)]
+
+def get_profile(profile_id: int) -> Optional[Dict[str, Any]]:
+    for profile in _profiles:
+        if profile.id == profile_id:
+            return profile.to_dict()
+    return None
+
+@contextmanager
+def serialization():
+    """Chronomètre un encodage de réponse fait par l'application (http_cache, projections)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialization_seconds += time.perf_counter() - start
+
+def in_thread(fn):
+    """Enveloppe fn pour profiler aussi son exécution dans un thread du pool (database.run)."""
+    profile = _current.get()
+    if profile is None:
+        return fn
+    def profiled(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ : un seul profileur par interpréteur, celui de la boucle voit déjà ce thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile.add_profiler(profiler)
+    return profiled
+
+def _explain(statements: List[Dict[str, Any]]):
+    from app import database
+    # Contexte copié par run_in_threadpool : les EXPLAIN ne sont pas eux-mêmes enregistrés
+    _current.set(None)
+    plans: Dict[str, List[str]] = {}
+    with database.engine.connect() as conn:
+        for entry in statements:
+            statement = entry["statement"]
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            if statement not in plans:
+                try:
+                    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", entry["parameters"]).fetchall()
+                    plans[statement] = [row[-1] for row in rows]
+                except Exception as exc:
+                    plans[statement] = [f"EXPLAIN impossible : {exc.__class__.__name__}"]
+            entry["plan"] = plans[statement]
+
+_header_name = config.PROFILE_HEADER.lower().encode()
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == _header_name and value not in (b"", b"0"):
+            return True
+    return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+class ProfilingMiddleware:
+    """Middleware ASGI pur : profile les requêtes demandées ou échantillonnées, les autres passent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            return await self.app(scope, receive, send)
+        # Une autre requête est déjà profilée sur la boucle : celle-ci passe sans profil
+        if not _loop_profiler_lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        profile = RequestProfile(next(_ids), scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"))
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER.lower().encode(), str(profile.id).encode())]}
+            await send(message)
+
+        # Le profil de la boucle peut inclure d'autres coroutines qui s'y intercalent
+        # Temps CPU du processus entier : significatif quand le serveur traite peu d'autres requêtes
+        profiler = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            profile.cpu_seconds = time.process_time() - cpu_start
+            profile.wall_seconds = time.perf_counter() - wall_start
+            profile.add_profiler(profiler)
+            _current.reset(token)
+            _loop_profiler_lock.release()
+        if config.PROFILE_EXPLAIN and database_is_sqlite():
+            try:
+                await run_in_threadpool(_explain, profile.statements)
+            except Exception:
+                logger.exception("EXPLAIN QUERY PLAN du profil %s impossible", profile.id)
+        _profiles.append(profile)
+
+def database_is_sqlite() -> bool:
+    from app import database
+    return database.engine.dialect.name == "sqlite"
+
+def _record_statements(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        starts = conn.info.get("profile_query_start")
+        if profile is None or not starts:
+            return
+        profile.add_statement(statement, parameters, time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("profile_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+_engines_instrumented = False
+
+def instrument_engines():
+    global _engines_instrumented
+    if _engines_instrumented:
+        return
+    from app import database
+    for engine in database.engines().values():
+        _record_statements(engine)
+    _engines_instrumented = True
+
+def install(app):
+    """Branche le profilage à la demande (appelé si PROFILING_ENABLED)."""
+    instrument_engines()
+    app.add_middleware(ProfilingMiddleware)
+
+# Journal des requêtes lentes
+def _slow_query_logger(path: str) -> logging.Logger:
+    # Un logger par fichier, sans propagation : le journal ne se mélange pas aux logs applicatifs
+    slow_logger = logging.getLogger(f"app.slow_queries.{path}")
+    if not slow_logger.handlers:
+        handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+    return slow_logger
+
+def install_slow_query_log(engine: Engine, path: str, threshold_ms: float):
+    """Écrit dans path chaque requête SQL de engine plus lente que threshold_ms."""
+    slow_query_logger = _slow_query_logger(path)
+    threshold = threshold_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if elapsed >= threshold:
+            slow_query_logger.info(
+                "%.1fms %s params=%.500r", elapsed * 1000, " ".join(statement.split()), parameters,
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("slow_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
@@ -0,0 +1,230 @@
+import abc
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import anyio
+from jose.exceptions import JWTError
+from app import auth, config, metrics, revocation
+
+# Limitation de débit par seaux à jetons : un seau par (règle, identité), identité = uid du
+# jeton si la requête en porte un valide et non révoqué, sinon l'IP du client. Un seau contient au plus
+# capacity jetons, regarnis au rythme de capacity / per_seconds ; une requête en consomme un.
+
+class Rule(NamedTuple):
+    name: str
+    capacity: int
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+def parse_rules(raw: str) -> Dict[Tuple[str, str], Rule]:
+    """"POST /users/login=10/60;GET /books/export/*=5/60" -> {(méthode, chemin): règle}.
+
+    Méthode "*" : toutes ; chemin terminé par "/*" : préfixe (un seau commun à tout le préfixe).
+    """
+    rules = {}
+    for entry in raw.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            target, limit = entry.rsplit("=", 1)
+            method, path = target.split()
+            capacity, per_seconds = limit.split("/")
+            rules[(method.upper(), path)] = Rule(f"{method.upper()} {path}", int(capacity), float(per_seconds))
+        except ValueError:
+            raise ValueError(f"RATE_LIMITS : règle invalide {entry!r} (attendu \"METHODE /chemin=capacité/secondes\")")
+    return rules
+
+class RateLimitBackend(abc.ABC):
+    """Stockage des seaux. blocking : take() fait des entrées/sorties et part dans un thread."""
+
+    blocking = False
+
+    @abc.abstractmethod
+    def take(self, key: str, rule: Rule) -> float:
+        """Consomme un jeton ; renvoie 0 si la requête passe, sinon le délai (s) avant le prochain jeton."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+def _refill(tokens: float, elapsed: float, rule: Rule) -> Tuple[float, float]:
+    tokens = min(rule.capacity, tokens + max(0.0, elapsed) * rule.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rule.rate
+
+class MemoryBackend(RateLimitBackend):
+    """Seaux locaux au processus (un worker) ; les moins récemment utilisés sont oubliés au-delà de max_keys."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: Rule) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens, updated = bucket if bucket is not None else (rule.capacity, now)
+            tokens, wait = _refill(tokens, now - updated, rule)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Un seau oublié repart plein : au pire quelques requêtes de plus pour un client rare
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+class SQLiteBackend(RateLimitBackend):
+    """Seaux partagés par les workers d'une machine, dans un fichier SQLite (mode WAL).
+
+    Une ligne par seau, lue et réécrite dans une transaction BEGIN IMMEDIATE.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rule: Rule) -> float:
+        # Horloge murale : comparable entre processus
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row is not None else (rule.capacity, now)
+            tokens, wait = _refill(tokens, now - updated, rule)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._takes += 1
+            if self._takes % 10000 == 0:
+                # Seaux inactifs depuis une heure : pleins de toute façon
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM buckets")
+
+def create_backend(url: str) -> RateLimitBackend:
+    """RATE_LIMIT_BACKEND : "memory" ou "sqlite:///chemin/vers/fichier.db"."""
+    if url == "memory":
+        return MemoryBackend(config.RATE_LIMIT_MAX_KEYS)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"RATE_LIMIT_BACKEND inconnu : {url!r}")
+
+backend: RateLimitBackend = create_backend(config.RATE_LIMIT_BACKEND)
+
+def set_backend(new_backend: RateLimitBackend):
+    global backend
+    backend = new_backend
+
+rate_limited = metrics.registry.register(metrics.Counter("http_rate_limited_total", "Requêtes refusées (429) par la limitation de débit", ("rule",)))
+
+def _identity(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    claims = auth.decode_token(token)
+                except JWTError:
+                    claims = {}
+                uid = claims.get("uid")
+                # Jeton révoqué : pas le seau du compte. Filtre de Bloom seul, sans SQL ;
+                # un faux positif compte simplement la requête sur l'IP
+                jti = claims.get("jti")
+                if jti is not None and revocation.revocations.might_be_revoked(jti):
+                    uid = None
+                if uid is not None:
+                    return f"user:{uid}"
+            break
+    if config.RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return "ip:" + value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+class RateLimitMiddleware:
+    """Middleware ASGI pur : O(1) par requête (recherche de règle par dict, un seau par identité)."""
+
+    def __init__(self, app, rules: Optional[Dict[Tuple[str, str], Rule]] = None):
+        self.app = app
+        rules = parse_rules(config.RATE_LIMITS) if rules is None else rules
+        self.exact = {key: rule for key, rule in rules.items() if not key[1].endswith("/*")}
+        # Préfixes : peu nombreux (configuration), parcourus du plus long au plus court
+        self.prefixes: List[Tuple[str, str, Rule]] = sorted(
+            ((method, path[:-1], rule) for (method, path), rule in rules.items() if path.endswith("/*")),
+            key=lambda item: -len(item[1]),
+        )
+
+    def match(self, method: str, path: str) -> Optional[Rule]:
+        rule = self.exact.get((method, path)) or self.exact.get(("*", path))
+        if rule is not None:
+            return rule
+        for rule_method, prefix, rule in self.prefixes:
+            if rule_method in (method, "*") and path.startswith(prefix):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rule = self.match(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+        key = f"{rule.name}|{_identity(scope)}"
+        if backend.blocking:
+            wait = await anyio.to_thread.run_sync(backend.take, key, rule)
+        else:
+            wait = backend.take(key, rule)
+        if not wait:
+            return await self.app(scope, receive, send)
+        rate_limited.inc(rule.name)
+        body = json.dumps({"detail": "Too Many Requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def install(app):
+    """Branche la limitation de débit (appelé si RATE_LIMIT_ENABLED)."""
+    app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,315 @@
+import argparse
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+from app import config, database, models
+
+# Recommandations « ceux qui ont emprunté ce livre ont aussi emprunté » : index précalculé
+# des k plus proches voisins de chaque livre, par co-occurrence dans l'historique des
+# utilisateurs (emprunts et avis d'au moins RECOMMENDATIONS_MIN_RATING).
+# Similarité cosinus : co-occurrences / sqrt(lecteurs du livre a × lecteurs du livre b).
+#
+# L'index est un fichier binaire ouvert en mmap par chaque worker (pages partagées par le
+# cache du système, rien n'est copié en mémoire Python) ; une recherche est une dichotomie
+# sur les identifiants puis une tranche des tableaux de voisins.
+# La tâche refresh_recommendations le tient à jour : seules les lignes des livres touchés
+# par les nouveaux emprunts et avis sont recalculées, reconstruction complète chaque jour.
+
+logger = logging.getLogger(__name__)
+
+Neighbors = List[Tuple[int, float]]
+
+# En-tête : magie, boutisme, k, nombre de livres, nombre de voisins, dernier emprunt et
+# dernier avis pris en compte, date de la dernière reconstruction complète (48 octets).
+# Puis les tableaux (ordre natif) : identifiants triés (uint32), débuts des lignes
+# (uint32, n + 1), voisins (uint32) et scores (float32).
+_HEADER = struct.Struct("<4sBxxxIIIxxxxqqd")
+_MAGIC = b"REC1"
+_BYTEORDER = 1 if sys.byteorder == "little" else 2
+
+def _chunks(values: List[int], size: int = 500) -> Iterable[List[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _interactions(user_ids: Optional[List[int]] = None, book_ids: Optional[List[int]] = None):
+    """Requête (user_id, book_id, date) : emprunts et avis positifs, filtrés si demandé."""
+    borrows = select(models.Borrow.user_id, models.Borrow.book_id, models.Borrow.borrow_date.label("at"))
+    reviews = (
+        select(models.Review.user_id, models.Review.book_id, models.Review.created_at.label("at"))
+        .where(models.Review.rating >= config.RECOMMENDATIONS_MIN_RATING)
+    )
+    if user_ids is not None:
+        borrows = borrows.where(models.Borrow.user_id.in_(user_ids))
+        reviews = reviews.where(models.Review.user_id.in_(user_ids))
+    if book_ids is not None:
+        borrows = borrows.where(models.Borrow.book_id.in_(book_ids))
+        reviews = reviews.where(models.Review.book_id.in_(book_ids))
+    return union_all(borrows, reviews)
+
+def _user_items(db: Session, user_ids: Optional[Set[int]] = None) -> Dict[int, List[int]]:
+    """Livres de chaque utilisateur, les RECOMMENDATIONS_MAX_ITEMS_PER_USER plus récents
+    (borne le coût quadratique des gros lecteurs)."""
+    latest: Dict[int, Dict[int, object]] = defaultdict(dict)
+    queries = [_interactions()] if user_ids is None else [_interactions(user_ids=chunk) for chunk in _chunks(sorted(user_ids))]
+    for query in queries:
+        for user_id, book_id, at in db.execute(query):
+            seen = latest[user_id].get(book_id)
+            if seen is None or (at is not None and at > seen):
+                latest[user_id][book_id] = at
+    limit = config.RECOMMENDATIONS_MAX_ITEMS_PER_USER
+    items = {}
+    for user_id, books in latest.items():
+        if len(books) > limit:
+            books = dict(sorted(books.items(), key=lambda item: (item[1] is not None, item[1]), reverse=True)[:limit])
+        items[user_id] = list(books)
+    return items
+
+def _users_of(db: Session, book_ids: Set[int]) -> Set[int]:
+    users: Set[int] = set()
+    for chunk in _chunks(sorted(book_ids)):
+        users.update(user_id for user_id, _, _ in db.execute(_interactions(book_ids=chunk)))
+    return users
+
+def _popularity(db: Session, book_ids: Set[int]) -> Dict[int, int]:
+    """Nombre de lecteurs distincts de chaque livre."""
+    counts: Dict[int, int] = {}
+    for chunk in _chunks(sorted(book_ids)):
+        pairs = _interactions(book_ids=chunk).subquery()
+        query = select(pairs.c.book_id, func.count(func.distinct(pairs.c.user_id))).group_by(pairs.c.book_id)
+        counts.update(db.execute(query).all())
+    return counts
+
+def _top_k(book_id: int, counts: Counter, popularity: Dict[int, int], k: int) -> Neighbors:
+    own = popularity.get(book_id) or 1
+    scored = [
+        (other, count / math.sqrt(own * (popularity.get(other) or 1)), count)
+        for other, count in counts.items() if other != book_id
+    ]
+    # Score décroissant, puis co-occurrences, puis identifiant : ordre stable d'une reconstruction à l'autre
+    scored.sort(key=lambda item: (-item[1], -item[2], item[0]))
+    return [(other, score) for other, score, _ in scored[:k]]
+
+def compute_rows(db: Session, books: Optional[Set[int]] = None, k: int = config.RECOMMENDATIONS_TOP_K) -> Dict[int, Neighbors]:
+    """Voisins des livres books (tous si None), calculés depuis l'historique."""
+    if books is None:
+        items = _user_items(db)
+    else:
+        # Seuls les lecteurs de ces livres comptent pour leurs lignes
+        items = _user_items(db, _users_of(db, books))
+    counts: Dict[int, Counter] = defaultdict(Counter)
+    for user_books in items.values():
+        for book_id in user_books:
+            if books is None or book_id in books:
+                # Counter.update sur une liste : boucle en C ; counts[a][a] = lecteurs de a
+                counts[book_id].update(user_books)
+    if books is None:
+        popularity = {book_id: row[book_id] for book_id, row in counts.items()}
+    else:
+        popularity = _popularity(db, set().union(*counts.values()) if counts else set())
+    rows = {book_id: _top_k(book_id, row, popularity, k) for book_id, row in counts.items()}
+    return {book_id: neighbors for book_id, neighbors in rows.items() if neighbors}
+
+def _watermark(db: Session) -> Tuple[int, int]:
+    return (
+        db.scalar(select(func.coalesce(func.max(models.Borrow.id), 0))),
+        db.scalar(select(func.coalesce(func.max(models.Review.id), 0))),
+    )
+
+def write_index(path: str, rows: Dict[int, Neighbors], k: int, watermark: Tuple[int, int], built_at: float) -> int:
+    """Écrit l'index (atomique : un worker qui le relit voit l'ancien ou le nouveau) ; renvoie sa taille."""
+    book_ids = array("I", sorted(rows))
+    offsets = array("I", [0])
+    neighbors = array("I")
+    scores = array("f")
+    for book_id in book_ids:
+        for other, score in rows[book_id]:
+            neighbors.append(other)
+            scores.append(score)
+        offsets.append(len(neighbors))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _BYTEORDER, k, len(book_ids), len(neighbors), watermark[0], watermark[1], built_at))
+        for values in (book_ids, offsets, neighbors, scores):
+            values.tofile(f)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+class LoadedIndex:
+    """Vue en lecture seule d'un fichier d'index ouvert en mmap."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, self.k, count, total, borrow_id, review_id, self.built_at = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or byteorder != _BYTEORDER:
+            raise ValueError(f"{path} : index de recommandations invalide")
+        if len(self._mmap) != _HEADER.size + 4 * (2 * count + 1 + 2 * total):
+            raise ValueError(f"{path} : index de recommandations tronqué")
+        self.watermark = (borrow_id, review_id)
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        self.book_ids = view[offset:offset + 4 * count].cast("I")
+        offset += 4 * count
+        self.offsets = view[offset:offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self.neighbor_ids = view[offset:offset + 4 * total].cast("I")
+        offset += 4 * total
+        self.scores = view[offset:offset + 4 * total].cast("f")
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    def _span(self, book_id: int) -> Optional[Tuple[int, int]]:
+        i = bisect_left(self.book_ids, book_id)
+        if i == len(self.book_ids) or self.book_ids[i] != book_id:
+            return None
+        return self.offsets[i], self.offsets[i + 1]
+
+    def similar(self, book_id: int, limit: int) -> Neighbors:
+        span = self._span(book_id)
+        if span is None:
+            return []
+        start, end = span
+        end = min(end, start + limit)
+        return list(zip(self.neighbor_ids[start:end].tolist(), self.scores[start:end].tolist()))
+
+    def rows(self) -> Dict[int, Neighbors]:
+        return {book_id: self.similar(book_id, self.k) for book_id in self.book_ids.tolist()}
+
+class RecommendationIndex:
+    # Au-delà de cette part des lignes à recalculer, une reconstruction complète coûte moins cher
+    full_rebuild_ratio = 0.5
+
+    def __init__(self, path: str, reload_seconds: float):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.loaded: Optional[LoadedIndex] = None
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def reload(self, force: bool = False):
+        """Rouvre le fichier s'il a été réécrit (vérifié au plus toutes les reload_seconds)."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.reload_seconds
+        version = self._file_version()
+        if version == self._version:
+            return
+        try:
+            loaded = LoadedIndex(self.path) if version is not None else None
+        except (OSError, ValueError, struct.error):
+            logger.exception("index de recommandations illisible : %s", self.path)
+            return
+        # L'ancien mmap est libéré avec les dernières vues encore utilisées
+        self.loaded, self._version = loaded, version
+
+    def similar(self, book_id: int, limit: int = config.RECOMMENDATIONS_TOP_K) -> Neighbors:
+        self.reload()
+        loaded = self.loaded
+        return loaded.similar(book_id, limit) if loaded is not None else []
+
+    def recommend(self, book_ids: List[int], limit: int) -> Neighbors:
+        """Livres voisins de ceux de l'historique (scores additionnés), hors historique."""
+        self.reload()
+        loaded = self.loaded
+        if loaded is None:
+            return []
+        seen = set(book_ids)
+        totals: Dict[int, float] = defaultdict(float)
+        for book_id in book_ids:
+            for other, score in loaded.similar(book_id, loaded.k):
+                if other not in seen:
+                    totals[other] += score
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def rebuild(self, db: Session) -> dict:
+        """Reconstruction complète depuis les tables borrows et reviews."""
+        with self._lock:
+            return self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> dict:
+        start = time.perf_counter()
+        watermark = _watermark(db)
+        rows = compute_rows(db)
+        size = write_index(self.path, rows, config.RECOMMENDATIONS_TOP_K, watermark, time.time())
+        self.reload(force=True)
+        return {"mode": "full", "books": len(rows), "bytes": size, "seconds": round(time.perf_counter() - start, 3)}
+
+    def refresh(self, db: Session) -> dict:
+        """Mise à jour incrémentale : recalcule les lignes des livres touchés depuis le dernier passage.
+
+        Reconstruction complète si l'index manque, a changé de k ou date de plus de
+        RECOMMENDATIONS_FULL_REBUILD_SECONDS (elle seule oublie les avis modifiés ou supprimés).
+        """
+        self.reload(force=True)
+        current = self.loaded
+        if (
+            current is None or current.k != config.RECOMMENDATIONS_TOP_K
+            or time.time() - current.built_at > config.RECOMMENDATIONS_FULL_REBUILD_SECONDS
+        ):
+            return self.rebuild(db)
+        with self._lock:
+            start = time.perf_counter()
+            # Filigrane lu avant l'historique : un ajout concurrent sera revu au prochain passage
+            watermark = _watermark(db)
+            last_borrow, last_review = current.watermark
+            new_pairs = set(db.execute(select(models.Borrow.user_id, models.Borrow.book_id).where(models.Borrow.id > last_borrow)))
+            new_pairs.update(db.execute(
+                select(models.Review.user_id, models.Review.book_id)
+                .where(models.Review.id > last_review, models.Review.rating >= config.RECOMMENDATIONS_MIN_RATING)
+            ))
+            if not new_pairs:
+                return {"mode": "incremental", "books": 0, "seconds": round(time.perf_counter() - start, 3)}
+            # Un nouvel emprunt (u, a) change la co-occurrence de a avec chaque livre de u : leurs
+            # lignes. Les lecteurs de a augmentent et ses scores baissent dans les autres lignes :
+            # celles qui citent a sont recalculées aussi (aucune autre ne change).
+            new_books = {book_id for _, book_id in new_pairs}
+            touched = set().union(*_user_items(db, {user_id for user_id, _ in new_pairs}).values())
+            rows = current.rows()
+            stale = touched | {
+                book_id for book_id, neighbors in rows.items()
+                if any(other in new_books for other, _ in neighbors)
+            }
+            if len(stale) > len(rows) * self.full_rebuild_ratio:
+                return self._rebuild(db)
+            for book_id in stale:
+                rows.pop(book_id, None)
+            rows.update(compute_rows(db, stale))
+            size = write_index(self.path, rows, current.k, watermark, current.built_at)
+            self.reload(force=True)
+            return {"mode": "incremental", "books": len(stale), "bytes": size, "seconds": round(time.perf_counter() - start, 3)}
+
+index = RecommendationIndex(config.RECOMMENDATIONS_FILE, config.RECOMMENDATIONS_RELOAD_SECONDS)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Construit ou met à jour l'index de recommandations (RECOMMENDATIONS_FILE).")
+    parser.add_argument("--full", action="store_true", help="reconstruction complète")
+    args = parser.parse_args(argv)
+    db = database.SessionLocal()
+    try:
+        print(index.rebuild(db) if args.full else index.refresh(db))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy.engine import make_url
+from app import config
+
+# Lecture de ses propres écritures : une réponse réussie à une écriture (POST, PUT, PATCH,
+# DELETE) pose un cookie daté ; tant qu'il est valide, les lectures de ce client passent
+# par la base principale plutôt que par la réplique, qui peut être en retard.
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+def is_sticky(request: Request) -> bool:
+    """Le client a écrit il y a moins de READ_STICKY_SECONDS."""
+    value = request.cookies.get(config.READ_STICKY_COOKIE)
+    if not value:
+        return False
+    try:
+        return float(value) > time.time()
+    except ValueError:
+        return False
+
+def reads_from_replica(request: Request) -> bool:
+    """Les lectures de cette requête passent par une réplique, qui peut être en retard."""
+    return config.DB_READ_ROUTING and bool(config.READ_DATABASE_URL) and not is_sticky(request)
+
+class StickyWritesMiddleware:
+    """Middleware ASGI pur : ajoute le cookie de la base principale aux écritures réussies."""
+
+    def __init__(self, app, seconds: float = config.READ_STICKY_SECONDS):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or self.seconds <= 0:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.seconds
+                cookie = (
+                    f"{config.READ_STICKY_COOKIE}={until:.3f}; Max-Age={max(1, round(self.seconds))}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+def install(app):
+    """Branche le cookie de lecture sur la base principale (appelé si READ_DATABASE_URL est défini).
+
+    Sans réplique, le pool de lecture lit la base principale elle-même : rien à rattraper.
+    """
+    app.add_middleware(StickyWritesMiddleware)
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        raise ValueError(f"base SQLite sur fichier attendue : {url!r}")
+    return parsed.database
+
+class SQLiteReplicator:
+    """Réplique de test : recopie la base principale dans le fichier de la réplique (API backup de SQLite).
+
+    Remplace la réplication d'un vrai serveur pour les essais locaux ; le retard de la
+    réplique est l'intervalle entre deux copies.
+    """
+
+    def __init__(self, source: str, target: str, interval: float = config.REPLICATION_INTERVAL_SECONDS):
+        self.source = source
+        self.target = target
+        self.interval = interval
+        self.copies = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sync(self):
+        source = sqlite3.connect(self.source)
+        target = sqlite3.connect(self.target, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000)
+        try:
+            # Copie cohérente (un instantané de la source), appliquée dans une transaction de la cible
+            source.backup(target)
+            self.copies += 1
+        finally:
+            target.close()
+            source.close()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sqlite-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except sqlite3.Error:
+                logger.exception("réplication %s -> %s", self.source, self.target)
+            self._stop.wait(self.interval)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recopie DATABASE_URL dans READ_DATABASE_URL à intervalle fixe (SQLite, tests locaux).")
+    parser.add_argument("--interval", type=float, default=config.REPLICATION_INTERVAL_SECONDS)
+    parser.add_argument("--once", action="store_true", help="une seule copie puis sortie")
+    args = parser.parse_args(argv)
+    if not config.READ_DATABASE_URL:
+        parser.error("READ_DATABASE_URL n'est pas défini")
+    logging.basicConfig(level=logging.INFO)
+    replicator = SQLiteReplicator(sqlite_path(config.DATABASE_URL), sqlite_path(config.READ_DATABASE_URL), args.interval)
+    if args.once:
+        replicator.sync()
+        return
+    replicator.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        replicator.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from app import config, models
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# Révocation des JWT : la table revoked_tokens est la liste exacte (partagée par tous les
+# workers), chaque worker n'en garde en mémoire qu'un filtre de Bloom (≈ 180 Ko pour
+# 100 000 jetons à 0,1 % de faux positifs).
+# Un jeton absent du filtre n'est sûrement pas révoqué : aucune requête SQL. La base n'est
+# consultée que sur un « peut-être » (jeton révoqué ou faux positif, JWT_REVOCATION_ERROR_RATE).
+# Le fichier du filtre est local à la machine : les révocations faites ailleurs sont lues dans
+# la table (revoked_at récents) au plus toutes les JWT_REVOCATION_REFRESH_SECONDS.
+
+class BloomFilter:
+    """Ensemble probabiliste : pas de faux négatif, faux positifs ≈ error_rate jusqu'à capacity éléments."""
+
+    def __init__(self, size: int, hashes: int, bits: Optional[bytearray] = None, count: int = 0):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        capacity = max(1, capacity)
+        size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return cls(size, max(1, round(size / capacity * math.log(2))))
+
+    def capacity(self, error_rate: float) -> int:
+        return int(self.size * math.log(2) ** 2 / -math.log(error_rate))
+
+    def _positions(self, item: str):
+        # Double hachage : les k positions sont dérivées d'un seul blake2b
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+# Fichier : en-tête (magie, taille en bits, nombre de hachages, éléments ajoutés) puis les bits
+_HEADER = struct.Struct("<4sQIQ")
+_MAGIC = b"BLM1"
+
+def read_filter(path: str) -> Optional[BloomFilter]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, size, hashes, count = _HEADER.unpack_from(data)
+    bits = bytearray(data[_HEADER.size:])
+    if magic != _MAGIC or len(bits) != (size + 7) // 8:
+        return None
+    return BloomFilter(size, hashes, bits, count)
+
+def write_filter(path: str, bloom: BloomFilter):
+    # Écriture atomique : un worker qui relit le fichier voit l'ancien ou le nouveau filtre
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, bloom.size, bloom.hashes, bloom.count))
+        f.write(bloom.bits)
+    os.replace(tmp, path)
+
+class RevocationList:
+    # Recouvrement de la lecture de la table : une révocation datée d'avant la lecture
+    # précédente a pu être validée après (transaction lente, horloges décalées)
+    sync_overlap_seconds = 60
+
+    def __init__(self, path: str, capacity: int, error_rate: float, refresh_seconds: float):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.filter: Optional[BloomFilter] = None
+        self._version = None
+        self._next_check = 0.0
+        self._synced_until: Optional[datetime] = None
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force: bool = False):
+        """Relit le filtre si un autre worker l'a réécrit (vérifié au plus toutes les refresh_seconds)."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.refresh_seconds
+        version = self._file_version()
+        if version is not None and version != self._version:
+            loaded = read_filter(self.path)
+            if loaded is not None:
+                self.filter, self._version = loaded, version
+
+    def needs_rebuild(self) -> bool:
+        """Pas de filtre (premier démarrage, fichier supprimé) : à reconstruire depuis la table."""
+        self.refresh()
+        return self.filter is None
+
+    def might_be_revoked(self, jti: str) -> bool:
+        self.refresh()
+        return self.filter is not None and jti in self.filter
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() >= self._next_sync
+
+    def sync(self, db: Session):
+        """Ajoute au filtre les révocations enregistrées depuis la dernière lecture, y compris par les autres machines."""
+        self._next_sync = time.monotonic() + self.refresh_seconds
+        started = datetime.utcnow()
+        query = db.query(models.RevokedToken.jti, models.RevokedToken.revoked_at)
+        if self._synced_until is None:
+            query = query.filter(models.RevokedToken.expires_at > started)
+        else:
+            query = query.filter(models.RevokedToken.revoked_at >= self._synced_until - timedelta(seconds=self.sync_overlap_seconds))
+        rows = query.all()
+        self._synced_until = max([started, *(revoked_at for _, revoked_at in rows if revoked_at is not None)])
+        self.refresh()
+        missing = [jti for jti, _ in rows if self.filter is None or jti not in self.filter]
+        if not missing:
+            return
+        with self._exclusive():
+            # Enregistrés aussi dans le fichier : un worker de la machine qui le relit ne les perd pas
+            self.refresh(force=True)
+            if self.filter is None or self.filter.count + len(missing) > self.filter.capacity(self.error_rate):
+                self._rebuild(db)
+                return
+            for jti in missing:
+                if jti not in self.filter:
+                    self.filter.add(jti)
+            self._save(self.filter)
+
+    def is_revoked(self, db: Session, jti: str) -> bool:
+        # Vérification exacte, après un « peut-être » du filtre
+        return db.query(models.RevokedToken.jti).filter(models.RevokedToken.jti == jti).first() is not None
+
+    @contextmanager
+    def _exclusive(self):
+        # Écritures du fichier sérialisées entre threads et entre workers de la machine
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime):
+        db.merge(models.RevokedToken(jti=jti, expires_at=expires_at))
+        db.commit()
+        with self._exclusive():
+            # Dernier état écrit par les autres workers, pour ne pas écraser leurs ajouts
+            self.refresh(force=True)
+            if self.filter is None or self.filter.count >= self.filter.capacity(self.error_rate):
+                # Filtre saturé : reconstruit sans les jetons expirés
+                self._rebuild(db)
+            else:
+                self.filter.add(jti)
+                self._save(self.filter)
+
+    def rebuild(self, db: Session):
+        with self._exclusive():
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session):
+        started = datetime.utcnow()
+        db.query(models.RevokedToken).filter(models.RevokedToken.expires_at <= started).delete()
+        db.commit()
+        rows = db.query(models.RevokedToken.jti, models.RevokedToken.revoked_at).all()
+        bloom = BloomFilter.for_capacity(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for jti, _ in rows:
+            bloom.add(jti)
+        self._save(bloom)
+        self._synced_until = max([started, *(revoked_at for _, revoked_at in rows if revoked_at is not None)])
+        self._next_sync = time.monotonic() + self.refresh_seconds
+
+    def _save(self, bloom: BloomFilter):
+        write_filter(self.path, bloom)
+        self.filter, self._version = bloom, self._file_version()
+        self._next_check = time.monotonic() + self.refresh_seconds
+
+revocations = RevocationList(
+    config.JWT_REVOCATION_FILE, config.JWT_REVOCATION_CAPACITY,
+    config.JWT_REVOCATION_ERROR_RATE, config.JWT_REVOCATION_REFRESH_SECONDS,
+)
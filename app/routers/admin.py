@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from app import schemas, dependencies, database, cache
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# Statistiques d'exploitation : pools de connexions (dimensionnement des workers) et cache des utilisateurs
+@router.get("/stats")
+def get_stats(current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)):
+    return {
+        "pools": database.pool_stats(),
+        "user_cache": cache.user_cache.stats(),
+    }
@@ -1,105 +1,209 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app import schemas, models, crud, dependencies
-import shutil
-import os
-from fastapi.responses import StreamingResponse
-import csv
-from io import StringIO
+from app import schemas, models, crud_async, dependencies, pagination, export, importer, http_cache, covers, config, serialization, recommendations
+import anyio
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+# Routes async sur dependencies.get_session (AsyncSession si DB_ASYNC), les GET sur
+# get_read_session (pool de lecture) ; l'import, qui lit le fichier de façon bloquante, reste sync sur get_db.
+# Les GET publics portent ETag / Last-Modified (304 si inchangé) ; les listes
+# sont servies depuis http_cache.response_cache, invalidé par les écritures de crud.
 @router.get("/", response_model=List[schemas.Book])
-def read_books(
+async def read_books(
+    request: Request,
     skip: int = 0,
     limit: int = 10,
+    after: Optional[str] = Query(None, description="Curseur X-Next-Cursor de la page précédente (vide pour la première page)"),
     author: Optional[str] = Query(None),
     title: Optional[str] = Query(None),
     keyword: Optional[str] = Query(None),
-    db: Session = Depends(dependencies.get_db)
+    db: Session = Depends(dependencies.get_read_session)
 ):
-    return crud.get_books(db, skip=skip, limit=limit, author=author, title=title, keyword=keyword)
+    # Sans curseur : pagination historique skip/limit, triée par pertinence en cas de recherche
+    after_id = None
+    if after is not None:
+        cursor = pagination.decode_cursor(after, int)
+        after_id = cursor[0] if cursor else 0
+    async def build(response: Response):
+        # FAST_JSON : lignes SQL encodées d'un bloc, sans objets ORM ni validation Pydantic
+        books = await crud_async.get_books(db, skip=skip, limit=limit, author=author, title=title, keyword=keyword, after=after_id, rows=config.FAST_JSON)
+        if after is not None or not (author or title or keyword):
+            pagination.set_next_cursor(response, books, limit, key=lambda b: (b.id,))
+        return serialization.to_payload(books, schemas.Book), http_cache.list_last_modified("books", books)
+    # skip est ignoré en mode curseur : il ne doit pas fragmenter le cache
+    key = http_cache.cache_key(
+        "books", skip=skip if after is None else None, limit=limit, after=after,
+        author=author, title=title, keyword=keyword,
+    )
+    return await http_cache.cached_json(request, key, build)
+
+# Déclarée avant /{book_id}, sinon "top-rated" serait lu comme un identifiant
+@router.get("/top-rated", response_model=List[schemas.Book])
+async def read_top_rated_books(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    min_reviews: int = Query(1, ge=1),
+    db: Session = Depends(dependencies.get_read_session)
+):
+    async def build(response: Response):
+        books = await crud_async.get_top_rated_books(db, limit=limit, min_reviews=min_reviews, rows=config.FAST_JSON)
+        return serialization.to_payload(books, schemas.Book), http_cache.list_last_modified("books", books)
+    key = http_cache.cache_key("books", view="top-rated", limit=limit, min_reviews=min_reviews)
+    return await http_cache.cached_json(request, key, build)
+
+# Déclarée avant /{book_id} : "batch" n'est pas un identifiant
+@router.get("/batch", response_model=List[schemas.BookBatchResult])
+async def read_books_batch(
+    ids: str = Query(..., description="Identifiants séparés par des virgules, ex. 1,2,3"),
+    db: Session = Depends(dependencies.get_read_session)
+):
+    try:
+        book_ids = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not book_ids:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(book_ids) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {config.BATCH_MAX_ITEMS})")
+    books = await crud_async.get_books_by_ids(db, book_ids)
+    return [
+        {"book_id": book_id, "status": 200, "book": books[book_id]} if book_id in books
+        else {"book_id": book_id, "status": 404, "detail": "Book not found"}
+        for book_id in book_ids
+    ]
 
 @router.get("/{book_id}", response_model=schemas.Book)
-def read_book(book_id: int, db: Session = Depends(dependencies.get_db)):
-    db_book = crud.get_book(db, book_id)
+async def read_book(book_id: int, request: Request, response: Response, db: Session = Depends(dependencies.get_read_session)):
+    db_book = await crud_async.get_book(db, book_id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
+    # ETag dérivé de (id, updated_at) : le 304 évite la sérialisation
+    headers = http_cache.validators(http_cache.version_etag("book", db_book.id, db_book.updated_at), db_book.updated_at)
+    if http_cache.is_not_modified(request, headers):
+        return http_cache.not_modified_response(headers)
+    response.headers.update(headers)
     return db_book
 
 @router.post("/", response_model=schemas.Book, status_code=status.HTTP_201_CREATED)
-def create_book(
+async def create_book(
     book: schemas.BookCreate,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    return await crud_async.create_book(db, book, user_id=current_user.id)
+
+@router.post("/import", response_model=schemas.BookImportReport)
+def import_books(
+    file: UploadFile = File(...),
+    fmt: Optional[export.ExportFormat] = Query(None, description="csv ou ndjson (déduit de l'extension par défaut)"),
     db: Session = Depends(dependencies.get_db),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    return crud.create_book(db, book, user_id=current_user.id)
+    # Même format que /books/export/{fmt} : un export peut être réimporté tel quel (.gz compris)
+    compressed = (file.filename or "").lower().endswith(".gz")
+    return importer.import_books(db, file.file, fmt or importer.detect_format(file.filename), owner_id=current_user.id, compressed=compressed)
 
 @router.put("/{book_id}", response_model=schemas.Book)
-def update_book(
+async def update_book(
     book_id: int,
     book_update: schemas.BookUpdate,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_book = crud.get_book(db, book_id)
+    db_book = await crud_async.get_book(db, book_id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
     if db_book.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this book")
-    return crud.update_book(db, db_book, book_update)
+    return await crud_async.update_book(db, db_book, book_update)
 
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_book(
+async def delete_book(
     book_id: int,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_book = crud.get_book(db, book_id)
+    db_book = await crud_async.get_book(db, book_id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
     if db_book.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this book")
-    crud.delete_book(db, db_book)
+    cover_url = db_book.cover_url
+    await crud_async.delete_book(db, db_book)
+    if cover_url:
+        # Vérification et suppression sous le verrou : un upload de la même image attend
+        async with covers.storage_lock():
+            if not await crud_async.cover_in_use(db, cover_url):
+                await anyio.to_thread.run_sync(covers.remove, cover_url)
     return None
 
 @router.post("/{book_id}/cover", response_model=schemas.Book)
-def upload_cover(
+async def upload_cover(
     book_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_book = crud.get_book(db, book_id)
+    db_book = await crud_async.get_book(db, book_id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
     if db_book.owner_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to update this book")
-    # Sauvegarde du fichier dans un dossier 'covers/'
-    os.makedirs("covers", exist_ok=True)
-    file_path = f"covers/book_{book_id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    db_book.cover_url = file_path
-    db.commit()
-    db.refresh(db_book)
+    # Écriture par blocs hors de la boucle, fichier nommé par son sha256 (dédupliqué) ;
+    # cover_url enregistré et ancienne couverture supprimée sous le verrou des fichiers
+    async with covers.stored_upload(file) as path:
+        stale = await crud_async.set_book_cover(db, db_book, path)
+        if stale:
+            await anyio.to_thread.run_sync(covers.remove, stale)
+    covers.schedule_thumbnails(path)
     return db_book
 
-@router.get("/export/csv")
-def export_books_csv(db: Session = Depends(dependencies.get_db)):
-    books = crud.get_books(db, skip=0, limit=10000)
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["id", "title", "author", "description", "cover_url", "owner_id"])
-    for book in books:
-        writer.writerow([
-            book.id,
-            book.title,
-            book.author,
-            book.description or "",
-            book.cover_url or "",
-            book.owner_id
-        ])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=books.csv"}) 
\ No newline at end of file
+@router.get("/{book_id}/cover", response_class=FileResponse)
+async def read_cover(
+    book_id: int,
+    request: Request,
+    size: Optional[int] = Query(None, description="Côté de la miniature (COVER_THUMBNAIL_SIZES) ; original par défaut"),
+    db: Session = Depends(dependencies.get_read_session)
+):
+    if size is not None and size not in config.COVER_THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unsupported size, expected one of {config.COVER_THUMBNAIL_SIZES}")
+    db_book = await crud_async.get_book(db, book_id)
+    if not db_book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    found = await anyio.to_thread.run_sync(covers.resolve, db_book.cover_url, size)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Cover not found")
+    path, media_type, etag = found
+    headers = http_cache.validators(etag)
+    if http_cache.is_not_modified(request, headers):
+        return http_cache.not_modified_response(headers)
+    # FileResponse gère Range / If-Range et délègue l'envoi au serveur (pathsend) quand il le propose
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@router.get("/{book_id}/similar", response_model=List[schemas.Recommendation])
+async def read_similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=config.RECOMMENDATIONS_TOP_K),
+    db: Session = Depends(dependencies.get_read_session)
+):
+    # Voisins lus dans l'index en mmap ; une seule requête SQL pour le livre et ses voisins
+    neighbors = recommendations.index.similar(book_id, limit)
+    books = await crud_async.get_books_by_ids(db, [book_id] + [other for other, _ in neighbors])
+    if book_id not in books:
+        raise HTTPException(status_code=404, detail="Book not found")
+    # Livres supprimés depuis la construction de l'index : ignorés
+    return [{"score": round(score, 4), "book": books[other]} for other, score in neighbors if other in books]
+
+@router.get("/export/{fmt}")
+def export_books(
+    fmt: export.ExportFormat,
+    author: Optional[str] = Query(None),
+    title: Optional[str] = Query(None),
+    keyword: Optional[str] = Query(None),
+    gzip: bool = False
+):
+    columns, build_query = export.dataset(export.Dataset.books, author=author, title=title, keyword=keyword)
+    return export.stream("books", columns, build_query, fmt, gzip=gzip)
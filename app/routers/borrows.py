@@ -1,51 +1,140 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
-from app import schemas, models, crud, dependencies
+from datetime import datetime
+from typing import List, Optional
+from app import schemas, models, crud, crud_async, dependencies, pagination, export, config, serialization
 
 router = APIRouter(prefix="/borrows", tags=["borrows"])
 
 @router.post("/", response_model=schemas.Borrow, status_code=status.HTTP_201_CREATED)
-def borrow_book(
+async def borrow_book(
     borrow: schemas.BorrowCreate,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
     # Vérifier que le livre existe
-    book = crud.get_book(db, borrow.book_id)
+    book = await crud_async.get_book(db, borrow.book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    # Vérifier que le livre n'est pas déjà emprunté (non rendu)
-    for b in book.borrows:
-        if b.return_date is None:
-            raise HTTPException(status_code=400, detail="Book already borrowed")
-    return crud.create_borrow(db, user_id=current_user.id, book_id=borrow.book_id)
+    # Disponibilité vérifiée par la base à l'insertion (pas de course entre deux requêtes)
+    db_borrow = await crud_async.create_borrow(db, user_id=current_user.id, book_id=borrow.book_id)
+    if db_borrow is None:
+        raise HTTPException(status_code=400, detail="Book already borrowed")
+    return db_borrow
+
+BORROW_ERRORS = {
+    crud.BATCH_NOT_FOUND: (404, "Book not found"),
+    crud.BATCH_UNAVAILABLE: (400, "Book already borrowed"),
+}
+RETURN_ERRORS = {
+    crud.BATCH_NOT_FOUND: (404, "Borrow not found"),
+    crud.BATCH_FORBIDDEN: (403, "Not authorized to return this borrow"),
+    crud.BATCH_ALREADY_RETURNED: (400, "Book already returned"),
+}
+
+def _check_batch(ids: List[int]):
+    if not ids:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(ids) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {config.BATCH_MAX_ITEMS})")
+
+# Chariot de livres : une transaction, un résultat par livre (mêmes codes que POST /borrows/)
+@router.post("/batch", response_model=List[schemas.BorrowBatchResult])
+async def borrow_books(
+    batch: schemas.BorrowBatchCreate,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    _check_batch(batch.book_ids)
+    results = await crud_async.create_borrows(db, current_user.id, batch.book_ids)
+    return [
+        {"book_id": book_id, "status": 201, "borrow": borrow} if borrow is not None
+        else {"book_id": book_id, "status": BORROW_ERRORS[error][0], "detail": BORROW_ERRORS[error][1]}
+        for book_id, borrow, error in results
+    ]
+
+@router.post("/return/batch", response_model=List[schemas.BorrowReturnResult])
+async def return_books(
+    batch: schemas.BorrowReturnBatch,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    _check_batch(batch.borrow_ids)
+    results = await crud_async.return_borrows(db, batch.borrow_ids, current_user.id, is_admin=current_user.role == "admin")
+    return [
+        {"borrow_id": borrow_id, "status": 200, "borrow": borrow} if borrow is not None
+        else {"borrow_id": borrow_id, "status": RETURN_ERRORS[error][0], "detail": RETURN_ERRORS[error][1]}
+        for borrow_id, borrow, error in results
+    ]
 
 @router.post("/{borrow_id}/return", response_model=schemas.Borrow)
-def return_book(
+async def return_book(
     borrow_id: int,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_borrow = crud.get_borrow_by_id(db, borrow_id)
+    db_borrow = await crud_async.get_borrow_by_id(db, borrow_id)
     if not db_borrow:
         raise HTTPException(status_code=404, detail="Borrow not found")
     if db_borrow.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to return this borrow")
     if db_borrow.return_date is not None:
         raise HTTPException(status_code=400, detail="Book already returned")
-    return crud.return_borrow(db, borrow_id)
+    return await crud_async.return_borrow(db, borrow_id)
 
 @router.get("/me", response_model=List[schemas.Borrow])
-def get_my_borrows(
-    db: Session = Depends(dependencies.get_db),
+async def get_my_borrows(
+    response: Response,
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Taille de page ; sans curseur ni limit, liste complète"),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    return crud.get_borrows_by_user(db, current_user.id)
+    cursor = pagination.decode_cursor(after, int) if after else None
+    limit = pagination.page_limit(after, limit)
+    borrows = await crud_async.get_borrows_by_user(db, current_user.id, after=cursor, limit=limit)
+    pagination.set_next_cursor(response, borrows, limit, key=lambda b: (b.id,))
+    return borrows
+
+# Prêts en cours dont l'échéance est passée, du plus ancien au plus récent (admin)
+@router.get("/overdue", response_model=List[schemas.Borrow])
+async def get_overdue_borrows(
+    response: Response,
+    after: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(dependencies.get_session),
+    current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)
+):
+    cursor = pagination.decode_cursor(after, datetime, int) if after else None
+    borrows = await crud_async.get_overdue_borrows(db, after=cursor, limit=limit)
+    pagination.set_next_cursor(response, borrows, limit, key=lambda b: (b.due_date, b.id))
+    return borrows
 
 @router.get("/", response_model=List[schemas.Borrow])
-def get_all_borrows(
-    db: Session = Depends(dependencies.get_db),
-    current_admin: models.User = Depends(dependencies.get_current_admin)
+async def get_all_borrows(
+    response: Response,
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Taille de page ; sans curseur ni limit, liste complète"),
+    db: Session = Depends(dependencies.get_session),
+    current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)
+):
+    cursor = pagination.decode_cursor(after, int) if after else None
+    limit = pagination.page_limit(after, limit)
+    if config.FAST_JSON:
+        # Lignes encodées directement : la réponse renvoyée porte elle-même X-Next-Cursor
+        rows = await crud_async.get_all_borrows(db, after=cursor, limit=limit, rows=True)
+        fast = serialization.FastJSONResponse(serialization.records(rows, serialization.fields_of(schemas.Borrow)))
+        pagination.set_next_cursor(fast, rows, limit, key=lambda b: (b.id,))
+        return fast
+    borrows = await crud_async.get_all_borrows(db, after=cursor, limit=limit)
+    pagination.set_next_cursor(response, borrows, limit, key=lambda b: (b.id,))
+    return borrows
+
+@router.get("/export/{fmt}")
+def export_borrows(
+    fmt: export.ExportFormat,
+    gzip: bool = False,
+    current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)
 ):
-    return crud.get_all_borrows(db) 
\ No newline at end of file
+    columns, build_query = export.dataset(export.Dataset.borrows)
+    return export.stream("borrows", columns, build_query, fmt, gzip=gzip)
\ No newline at end of file
@@ -0,0 +1,71 @@
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from app import schemas, models, dependencies, database, export, jobs, tasks
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def _job_out(job: models.Job) -> dict:
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status, "attempts": job.attempts,
+        "max_attempts": job.max_attempts, "error": job.error,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at, "finished_at": job.finished_at,
+    }
+
+async def _get_owned_job(db, job_id: int, current_user: models.User) -> models.Job:
+    job = await database.run(db, jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Tâches planifiées (sans propriétaire) : visibles des admins seulement
+    if job.owner_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to access this job")
+    return job
+
+# Export différé : le fichier est écrit par un worker, à suivre sur GET /jobs/{id}
+@router.post("/exports", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    request: schemas.ExportJobCreate,
+    response: Response,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    try:
+        dataset = export.Dataset(request.dataset)
+        fmt = export.ExportFormat(request.fmt)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown dataset or format")
+    if dataset == export.Dataset.borrows and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    filters = {name: getattr(request, name) for name in ("author", "title", "keyword", "book_id") if getattr(request, name) is not None}
+    payload = {"dataset": dataset.value, "fmt": fmt.value, "gzip": request.gzip, "filters": filters}
+    job = await database.run(db, jobs.enqueue, "export", payload, current_user.id)
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return _job_out(job)
+
+@router.get("/{job_id}", response_model=schemas.Job)
+async def read_job(
+    job_id: int,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    return _job_out(await _get_owned_job(db, job_id, current_user))
+
+@router.get("/{job_id}/download", response_class=FileResponse)
+async def download_job_result(
+    job_id: int,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    job = await _get_owned_job(db, job_id, current_user)
+    if job.kind != "export":
+        raise HTTPException(status_code=404, detail="Job has no file")
+    if job.status != jobs.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    path = tasks.export_path(job.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file expired")
+    result = json.loads(job.result)
+    return FileResponse(path, media_type=result["media_type"], filename=result["filename"])
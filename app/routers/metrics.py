@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app import metrics
+
+router = APIRouter(tags=["metrics"])
+
+# Point de collecte Prometheus (monté seulement si METRICS_ENABLED)
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+from app import schemas, dependencies, profiling
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+# Profils des requêtes, du plus récent au plus ancien (monté seulement si PROFILING_ENABLED)
+@router.get("")
+def list_profiles(current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)) -> List[dict]:
+    return profiling.list_profiles()
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: int, current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
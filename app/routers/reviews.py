@@ -1,50 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from app import schemas, models, crud, dependencies
+from typing import List, Optional
+from datetime import datetime
+from app import schemas, models, crud_async, dependencies, pagination, export, http_cache, config, serialization
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
 @router.post("/", response_model=schemas.Review, status_code=status.HTTP_201_CREATED)
-def create_review(
+async def create_review(
     review: schemas.ReviewCreate,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
     # Vérifier que le livre existe
-    book = crud.get_book(db, review.book_id)
+    book = await crud_async.get_book(db, review.book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    return crud.create_review(db, user_id=current_user.id, review=review)
+    return await crud_async.create_review(db, user_id=current_user.id, review=review)
 
 @router.get("/book/{book_id}", response_model=List[schemas.Review])
-def get_reviews_for_book(book_id: int, db: Session = Depends(dependencies.get_db)):
-    return crud.get_reviews_by_book(db, book_id)
+async def get_reviews_for_book(
+    book_id: int,
+    request: Request,
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Taille de page ; sans curseur ni limit, liste complète"),
+    db: Session = Depends(dependencies.get_read_session)
+):
+    # Réponse en cache serveur avec ETag / Last-Modified, invalidée par les écritures d'avis
+    cursor = pagination.decode_cursor(after, datetime, int) if after else None
+    limit = pagination.page_limit(after, limit)
+    async def build(response: Response):
+        reviews = await crud_async.get_reviews_by_book(db, book_id, after=cursor, limit=limit, rows=config.FAST_JSON)
+        pagination.set_next_cursor(response, reviews, limit, key=lambda r: (r.created_at, r.id))
+        return serialization.to_payload(reviews, schemas.Review), http_cache.list_last_modified("reviews", reviews)
+    key = http_cache.cache_key("reviews", book_id=book_id, after=after or None, limit=limit)
+    return await http_cache.cached_json(request, key, build)
 
 @router.put("/{review_id}", response_model=schemas.Review)
-def update_review(
+async def update_review(
     review_id: int,
     review_update: schemas.ReviewUpdate,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_review = crud.get_review_by_id(db, review_id)
+    db_review = await crud_async.get_review_by_id(db, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     if db_review.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to update this review")
-    return crud.update_review(db, db_review, review_update)
+    return await crud_async.update_review(db, db_review, review_update)
 
 @router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review(
+async def delete_review(
     review_id: int,
-    db: Session = Depends(dependencies.get_db),
+    db: Session = Depends(dependencies.get_session),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    db_review = crud.get_review_by_id(db, review_id)
+    db_review = await crud_async.get_review_by_id(db, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     if db_review.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this review")
-    crud.delete_review(db, db_review)
-    return None 
\ No newline at end of file
+    await crud_async.delete_review(db, db_review)
+    return None 
+
+@router.get("/export/{fmt}")
+def export_reviews(fmt: export.ExportFormat, book_id: Optional[int] = None, gzip: bool = False):
+    columns, build_query = export.dataset(export.Dataset.reviews, book_id=book_id)
+    return export.stream("reviews", columns, build_query, fmt, gzip=gzip)
\ No newline at end of file
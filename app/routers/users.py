@@ -1,41 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta
-from typing import List
-from app import schemas, models, crud, auth, dependencies
+from datetime import datetime, timedelta
+from typing import List, Optional
+from app import schemas, models, crud_async, auth, dependencies, profiling, config, serialization, database, revocation, recommendations
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Le hachage bcrypt part dans le pool dédié (auth), les accès DB passent par crud_async
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(dependencies.get_db)):
-    db_user = crud.get_user_by_username(db, user.username)
+async def register(user: schemas.UserCreate, db: Session = Depends(dependencies.get_session)):
+    db_user = await crud_async.get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    db_user = crud.get_user_by_email(db, user.email)
+    db_user = await crud_async.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user)
+    hashed_password = await auth.hash_password(user.password)
+    return await crud_async.create_user(db, user, hashed_password)
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(dependencies.get_db)):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(dependencies.get_session)):
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id, "role": user.role}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Révoque le jeton courant jusqu'à son expiration
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    db: Session = Depends(dependencies.get_session),
+    claims: schemas.TokenClaims = Depends(dependencies.get_token_claims)
+):
+    if claims.jti is None:
+        raise HTTPException(status_code=400, detail="Token cannot be revoked (no jti), wait for its expiry")
+    await database.run(db, revocation.revocations.revoke, claims.jti, datetime.utcfromtimestamp(claims.exp))
+    return None
+
+USER_FIELDS = list(schemas.User.model_fields)
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def _project(user: models.User, fields: List[str]) -> dict:
+    return {
+        f: [schemas.Book.model_validate(b) for b in user.books] if f == "books" else getattr(user, f)
+        for f in fields
+    }
+
+FIELDS_QUERY = Query(None, description="Champs à renvoyer, ex. id,username,role (books n'est chargé que s'il est demandé)")
+
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(dependencies.get_current_user)):
-    return current_user
+async def read_users_me(
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(dependencies.get_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    selected = _parse_fields(fields)
+    if selected is None or "books" in selected:
+        await crud_async.load_user_books(db, current_user)
+    if selected is None:
+        return current_user
+    with profiling.serialization():
+        return JSONResponse(jsonable_encoder(_project(current_user, selected)))
+
+@router.get("/me/recommendations", response_model=List[schemas.Recommendation])
+async def read_my_recommendations(
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(dependencies.get_read_session),
+    current_user: models.User = Depends(dependencies.get_current_user)
+):
+    # Voisins des livres de l'historique (index des recommandations), hors livres déjà lus
+    history = await crud_async.get_history_book_ids(db, current_user.id, config.RECOMMENDATIONS_MAX_ITEMS_PER_USER)
+    suggested = recommendations.index.recommend(history, limit)
+    if not suggested:
+        # Sans historique (ou sans voisins) : les mieux notés
+        seen = set(history)
+        top = await crud_async.get_top_rated_books(db, limit=limit + len(seen))
+        return [{"score": 0.0, "book": book} for book in top if book.id not in seen][:limit]
+    books = await crud_async.get_books_by_ids(db, [book_id for book_id, _ in suggested])
+    return [{"score": round(score, 4), "book": books[book_id]} for book_id, score in suggested if book_id in books]
 
 # Route admin : liste tous les utilisateurs
 @router.get("/", response_model=List[schemas.User])
-def list_users(
-    db: Session = Depends(dependencies.get_db),
-    current_admin: models.User = Depends(dependencies.get_current_admin)
+async def list_users(
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(dependencies.get_session),
+    current_admin: schemas.TokenClaims = Depends(dependencies.get_current_admin)
 ):
-    return db.query(models.User).all() 
\ No newline at end of file
+    selected = _parse_fields(fields)
+    if selected is None and config.FAST_JSON:
+        return serialization.FastJSONResponse(await crud_async.get_user_records(db))
+    users = await crud_async.get_users(db, with_books=selected is None or "books" in selected)
+    if selected is None:
+        return users
+    with profiling.serialization():
+        return JSONResponse(jsonable_encoder([_project(user, selected) for user in users]))
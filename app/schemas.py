@@ -17,9 +17,36 @@ class BookUpdate(BookBase):
 class Book(BookBase):
     id: int
     owner_id: Optional[int]
+    average_rating: Optional[float] = None
+    review_count: int = 0
 
     class Config:
         orm_mode = True
+        from_attributes = True
+
+# Rapport d'import en masse (POST /books/import)
+class BookImportRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class BookImportReport(BaseModel):
+    inserted: int
+    rejected: int
+    errors: List[BookImportRowError] = []
+    duration_seconds: float
+    rows_per_second: float
+
+# GET /books/batch : un résultat par identifiant demandé
+class BookBatchResult(BaseModel):
+    book_id: int
+    status: int
+    detail: Optional[str] = None
+    book: Optional[Book] = None
+
+# Recommandations : livre et score de similarité (0 : repli sur les mieux notés, sans historique)
+class Recommendation(BaseModel):
+    score: float
+    book: Book
 
 class UserBase(BaseModel):
     username: str
@@ -35,6 +62,7 @@ class User(UserBase):
 
     class Config:
         orm_mode = True
+        from_attributes = True
 
 # Schémas pour les emprunts
 class BorrowBase(BaseModel):
@@ -48,9 +76,56 @@ class Borrow(BorrowBase):
     user_id: int
     borrow_date: datetime
     return_date: Optional[datetime] = None
+    due_date: Optional[datetime] = None
 
     class Config:
         orm_mode = True
+        from_attributes = True
+
+# Opérations groupées : un résultat par élément demandé, dans l'ordre de la demande,
+# avec le code HTTP qu'aurait renvoyé l'opération unitaire
+class BorrowBatchCreate(BaseModel):
+    book_ids: List[int]
+
+class BorrowReturnBatch(BaseModel):
+    borrow_ids: List[int]
+
+class BorrowBatchResult(BaseModel):
+    book_id: int
+    status: int
+    detail: Optional[str] = None
+    borrow: Optional[Borrow] = None
+
+class BorrowReturnResult(BaseModel):
+    borrow_id: int
+    status: int
+    detail: Optional[str] = None
+    borrow: Optional[Borrow] = None
+
+# Tâches de fond (GET /jobs/{id}) et exports différés (POST /jobs/exports)
+class ExportJobCreate(BaseModel):
+    dataset: str
+    fmt: str = "csv"
+    gzip: bool = False
+    author: Optional[str] = None
+    title: Optional[str] = None
+    keyword: Optional[str] = None
+    book_id: Optional[int] = None
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
 
 class Token(BaseModel):
     access_token: str
@@ -59,6 +134,15 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+# Contenu d'un jeton d'accès : uid et role évitent de relire l'utilisateur pour autoriser
+# (absents des jetons émis avant leur ajout)
+class TokenClaims(BaseModel):
+    sub: str
+    uid: Optional[int] = None
+    role: Optional[str] = None
+    jti: Optional[str] = None
+    exp: int
+
 # Schémas pour les commentaires/notes
 class ReviewBase(BaseModel):
     book_id: int
@@ -78,4 +162,5 @@ class Review(ReviewBase):
     created_at: datetime
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+        from_attributes = True
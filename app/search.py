@@ -0,0 +1,112 @@
+import re
+from typing import Dict, Optional
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Query, Session
+from app import models
+
+# Index plein texte SQLite FTS5 sur books(title, author, description).
+# Table "external content" : le texte n'est pas dupliqué, seul l'index l'est.
+# remove_diacritics 2 : "Misérables" est trouvé avec "miserables".
+FTS_TABLE = "books_fts"
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    # Triggers : l'index suit les INSERT/UPDATE/DELETE, y compris ceux faits hors ORM
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author, description ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+]
+
+# Poids bm25 par colonne : un terme trouvé dans le titre compte plus que dans la description
+_BM25_WEIGHTS = "10.0, 5.0, 1.0"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_available: Dict[str, bool] = {}
+
+def create_fts(conn: Connection):
+    """Crée l'index FTS5 et ses triggers. OperationalError si SQLite est compilé sans FTS5."""
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first()
+    for ddl in _FTS_DDL:
+        conn.execute(text(ddl))
+    if not exists:
+        # Indexation des livres déjà présents
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def setup_fts(engine: Engine) -> bool:
+    """Crée l'index FTS5 (SQLite uniquement). Renvoie False si indisponible."""
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            create_fts(conn)
+    except OperationalError:
+        # SQLite compilé sans FTS5 : on reste sur le chemin ILIKE
+        _fts_available[str(engine.url)] = False
+        return False
+    _fts_available[str(engine.url)] = True
+    return True
+
+def reset_fts_cache():
+    _fts_available.clear()
+
+def fts_available(db: Session) -> bool:
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = str(bind.url)
+    if key not in _fts_available:
+        _fts_available[key] = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first() is not None
+    return _fts_available[key]
+
+def build_match(author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None) -> Optional[str]:
+    """Traduit les filtres de GET /books/ en requête MATCH FTS5 (préfixe sur chaque mot)."""
+    clauses = []
+    for column, value in (("author", author), ("title", title), ("description", keyword)):
+        # Les mots sont toujours entre guillemets : aucune syntaxe FTS5 ne passe depuis l'URL
+        terms = _TOKEN_RE.findall(value or "")
+        if terms:
+            clauses.append(f"{column} : (" + " AND ".join(f'"{term}"*' for term in terms) + ")")
+    return " AND ".join(clauses) or None
+
+def filter_books(query: Query, author: Optional[str] = None, title: Optional[str] = None, keyword: Optional[str] = None, ranked: bool = True) -> Query:
+    # Filtre sans aucun mot ("!!!", "-") : rien à chercher dans l'index, comparaison ILIKE comme sans FTS5
+    for column, value in ((models.Book.author, author), (models.Book.title, title), (models.Book.description, keyword)):
+        if value and not _TOKEN_RE.search(value):
+            query = query.filter(column.ilike(f"%{value}%"))
+    match = build_match(author=author, title=title, keyword=keyword)
+    if match is None:
+        return query
+    hits = (
+        text(f"SELECT rowid, bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match")
+        .bindparams(match=match)
+        .columns(rowid=Integer, rank=Float)
+        .subquery("book_matches")
+    )
+    query = query.join(hits, hits.c.rowid == models.Book.id)
+    if ranked:
+        query = query.order_by(hits.c.rank, models.Book.id)
+    return query
@@ -0,0 +1,56 @@
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.responses import Response
+from app import config
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel : repli sur le module json, même sortie octet pour octet
+    orjson = None
+
+# Sérialisation rapide des listes (FAST_JSON) : les routes lisent des lignes (colonnes du schéma,
+# dans l'ordre de ses champs) au lieu d'objets ORM, sans validation Pydantic objet par objet,
+# et les encodent d'un bloc. La sortie est identique au chemin FastAPI / JSONResponse :
+# JSON compact, UTF-8 non échappé, dates ISO 8601 sans fuseau.
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+def render(content: Any) -> bytes:
+    """Corps JSON : encodeur rapide sur des données simples, sinon le chemin jsonable_encoder historique."""
+    if config.FAST_JSON:
+        return dumps(content)
+    return JSONResponse(jsonable_encoder(content)).body
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def fields_of(schema) -> List[str]:
+    return list(schema.model_fields)
+
+def columns_of(schema, model, exclude: Sequence[str] = ()) -> list:
+    """Colonnes de model correspondant aux champs de schema, dans le même ordre."""
+    return [getattr(model, name) for name in schema.model_fields if name not in exclude]
+
+def records(rows: Iterable[Sequence[Any]], names: Sequence[str]) -> List[dict]:
+    # zip s'arrête aux champs du schéma : des colonnes en plus (updated_at...) ne sont pas exposées
+    return [dict(zip(names, row)) for row in rows]
+
+def to_payload(items: Iterable[Any], schema) -> List[Any]:
+    """Lignes (FAST_JSON) en dicts, ou objets ORM validés un par un par schema (chemin historique)."""
+    if config.FAST_JSON:
+        return records(items, fields_of(schema))
+    return [schema.model_validate(item) for item in items]
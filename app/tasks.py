@@ -0,0 +1,62 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app import config, crud, export, jobs, models, recommendations
+
+# Tâches de fond de l'application (exécutées par app.jobs)
+
+logger = logging.getLogger(__name__)
+
+def export_path(job_id: int) -> str:
+    return os.path.join(config.JOB_EXPORT_DIR, f"job-{job_id}")
+
+@jobs.handler("export", concurrency=config.JOB_EXPORT_CONCURRENCY)
+def run_export(db: Session, job: models.Job, payload: dict) -> dict:
+    """Écrit un export (mêmes colonnes et filtres que /{dataset}/export/{fmt}) dans JOB_EXPORT_DIR."""
+    fmt = export.ExportFormat(payload["fmt"])
+    name = export.Dataset(payload["dataset"])
+    gzip = payload.get("gzip", False)
+    columns, build_query = export.dataset(name, **payload.get("filters", {}))
+    os.makedirs(config.JOB_EXPORT_DIR, exist_ok=True)
+    size = export.write_file(export_path(job.id), columns, build_query, fmt, gzip=gzip)
+    return {
+        "filename": export.filename_for(name.value, fmt, gzip),
+        "media_type": export.media_type_for(fmt, gzip),
+        "bytes": size,
+    }
+
+@jobs.handler("overdue_scan", every=config.OVERDUE_SCAN_SECONDS)
+def overdue_scan(db: Session, job: models.Job, payload: dict) -> dict:
+    flagged = crud.flag_overdue_borrows(db)
+    if flagged:
+        logger.info("%s emprunt(s) passé(s) en retard", flagged)
+    return {"flagged": flagged}
+
+@jobs.handler("rebuild_ratings", every=config.RATINGS_REBUILD_SECONDS)
+def rebuild_ratings(db: Session, job: models.Job, payload: dict) -> dict:
+    return {"books": crud.rebuild_book_ratings(db)}
+
+@jobs.handler("refresh_recommendations", every=config.RECOMMENDATIONS_REFRESH_SECONDS)
+def refresh_recommendations(db: Session, job: models.Job, payload: dict) -> dict:
+    """Index des recommandations : lignes des livres touchés depuis le dernier passage (complet si payload["full"])."""
+    if payload.get("full"):
+        return recommendations.index.rebuild(db)
+    return recommendations.index.refresh(db)
+
+@jobs.handler("purge_jobs", every=3600)
+def purge_jobs(db: Session, job: models.Job, payload: dict) -> dict:
+    """Supprime les tâches terminées depuis plus de JOB_RETENTION_HOURS, et leurs fichiers d'export."""
+    limit = datetime.utcnow() - timedelta(hours=config.JOB_RETENTION_HOURS)
+    old = db.query(models.Job).filter(models.Job.status.in_((jobs.SUCCEEDED, jobs.FAILED)), models.Job.finished_at < limit).all()
+    removed = 0
+    for finished in old:
+        if finished.kind == "export":
+            try:
+                os.remove(export_path(finished.id))
+            except FileNotFoundError:
+                pass
+        db.delete(finished)
+        removed += 1
+    db.commit()
+    return {"removed": removed}
@@ -0,0 +1,58 @@
+import os
+from contextlib import contextmanager
+import pytest
+
+# Les tests enchaînent les logins depuis la même IP : limitation de débit coupée pour l'application
+# importée par les tests (test_ratelimit branche son propre middleware)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app import database
+from app.main import app
+
+client = TestClient(app)
+
+@contextmanager
+def _count_queries():
+    # Tous les pools : écritures sur la base principale, GET du catalogue sur le pool de lecture
+    engines = list(database.engines().values())
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+@pytest.fixture
+def count_queries():
+    """Requêtes SQL exécutées dans le bloc : with count_queries() as statements."""
+    return _count_queries
+
+def _login_headers(username, password):
+    token = client.post("/users/login", data={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def login_headers():
+    """En-tête Authorization d'un nouveau jeton : login_headers(username, password)."""
+    return _login_headers
+
+@pytest.fixture(scope="session")
+def admin_headers():
+    user = {"username": "countadmin", "email": "countadmin@example.com", "password": "countpass", "role": "admin"}
+    client.post("/users/register", json=user)
+    token = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    # Quelques utilisateurs avec des livres : le nombre de requêtes ne doit pas en dépendre
+    for i in range(3):
+        other = {"username": f"countuser{i}", "email": f"countuser{i}@example.com", "password": "countpass"}
+        client.post("/users/register", json=other)
+        other_token = client.post("/users/login", data={"username": other["username"], "password": other["password"]}).json()["access_token"]
+        client.post("/books/", json={"title": f"Count Book {i}", "author": "Author Q"}, headers={"Authorization": f"Bearer {other_token}"})
+    client.get("/users/me", headers=headers)
+    return headers
@@ -1,6 +1,16 @@
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+import anyio
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from sqlalchemy import update
+from app import config, covers, crud, crud_async, database, models
 
 client = TestClient(app)
 
@@ -36,4 +46,223 @@ def test_update_book(user_token):
 def test_delete_book(user_token):
     headers = {"Authorization": f"Bearer {user_token}"}
     response = client.delete(f"/books/1", headers=headers)
-    assert response.status_code in [204, 403, 404] 
\ No newline at end of file
+    assert response.status_code in [204, 403, 404] 
+
+def test_search_books(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book = {"title": "Les Misérables", "author": "Victor Hugo", "description": "Roman historique et social."}
+    book_id = client.post("/books/", json=book, headers=headers).json()["id"]
+    # Préfixe, casse et accents ignorés
+    response = client.get("/books/", params={"title": "miserab", "author": "hugo", "limit": 100})
+    assert response.status_code == 200
+    assert book_id in [b["id"] for b in response.json()]
+    # L'index suit les mises à jour
+    update = {"title": "Notre-Dame de Paris", "author": "Victor Hugo"}
+    client.put(f"/books/{book_id}", json=update, headers=headers)
+    response = client.get("/books/", params={"title": "miserables", "limit": 100})
+    assert book_id not in [b["id"] for b in response.json()]
+    response = client.get("/books/", params={"title": "notre dame", "limit": 100})
+    assert book_id in [b["id"] for b in response.json()]
+    client.delete(f"/books/{book_id}", headers=headers)
+
+
+def test_search_punctuation_only(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    author = f"Punct {uuid.uuid4().hex[:8]}"
+    plain = client.post("/books/", json={"title": "Plain", "author": author}, headers=headers).json()["id"]
+    dashed = client.post("/books/", json={"title": "A - B", "author": author}, headers=headers).json()["id"]
+    # Filtre sans mot : comparé tel quel (ILIKE), jamais ignoré
+    assert client.get("/books/", params={"author": "!!!", "limit": 1000}).json() == []
+    listed = client.get("/books/", params={"author": author, "title": "-", "limit": 1000}).json()
+    assert [b["id"] for b in listed] == [dashed]
+    assert plain not in [b["id"] for b in client.get("/books/", params={"title": " - ", "limit": 1000}).json()]
+
+def test_read_books_cursor(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    for i in range(3):
+        client.post("/books/", json={"title": f"Cursor Book {i}", "author": "Author C"}, headers=headers)
+    # Parcours complet par curseur : chaque livre une seule fois, dans l'ordre des ids
+    seen = []
+    after = ""
+    while after is not None:
+        response = client.get("/books/", params={"after": after, "limit": 2})
+        assert response.status_code == 200
+        seen.extend(b["id"] for b in response.json())
+        after = response.headers.get("X-Next-Cursor")
+    assert seen == sorted(set(seen))
+    assert len(seen) >= 3
+    # skip/limit reste disponible
+    assert client.get("/books/", params={"skip": 1, "limit": 1}).json()[0]["id"] == seen[1]
+    assert client.get("/books/", params={"after": "not-a-cursor"}).status_code == 400
+
+
+def test_export_books(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    author = f"Exporteur {uuid.uuid4().hex[:8]}"
+    client.post("/books/", json={"title": "Export Book", "author": author}, headers=headers)
+    response = client.get("/books/export/csv", params={"author": author})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "title", "author", "description", "cover_url", "owner_id"]
+    assert [r[1] for r in rows[1:]] == ["Export Book"]
+    response = client.get("/books/export/ndjson", params={"author": author, "gzip": True})
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert json.loads(lines[0])["title"] == "Export Book"
+
+
+def test_import_books(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    # Auteur propre à l'exécution : la suite peut être relancée sur la même base
+    author = f"Importeur {uuid.uuid4().hex[:8]}"
+    content = f"title,author,description\nImported One,{author},\n,Sans Titre,x\nImported Two,{author},Desc\n"
+    response = client.post("/books/import", files={"file": ("books.csv", content, "text/csv")}, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["rejected"] == 1
+    assert report["errors"][0]["row"] == 2
+    # Aller-retour avec l'export
+    exported = client.get("/books/export/ndjson", params={"author": author, "gzip": True})
+    response = client.post("/books/import", files={"file": ("books.ndjson.gz", exported.content, "application/gzip")}, headers=headers)
+    assert response.json()["inserted"] == 2
+    assert len(client.get("/books/", params={"author": author, "limit": 100}).json()) == 4
+
+def test_import_unreadable_files(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    author = f"Importeur {uuid.uuid4().hex[:8]}"
+    # Latin-1 : la ligne fautive est signalée dans le rapport et la lecture s'arrête
+    content = f"title,author\nPremier,{author}\nÉté,{author}\n".encode("latin-1")
+    response = client.post("/books/import", files={"file": ("books.csv", content, "text/csv")}, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rejected"] == 1 and "UTF-8" in report["errors"][0]["errors"][0]
+    bogus = gzip.compress(f"title,author\nTronqué,{author}\n".encode())[:-8]
+    for content in (b"not gzip at all", bogus):
+        response = client.post("/books/import", files={"file": ("books.csv.gz", content, "application/gzip")}, headers=headers)
+        assert response.status_code == 200
+        assert "gzip" in response.json()["errors"][-1]["errors"][0]
+    # Champ au-delà de csv.field_size_limit() : csv.Error
+    content = "title,author\n" + "x" * (csv.field_size_limit() + 1) + f",{author}\n"
+    response = client.post("/books/import", files={"file": ("books.csv", content, "text/csv")}, headers=headers)
+    assert response.status_code == 200
+    assert "invalid CSV" in response.json()["errors"][0]["errors"][0]
+
+def test_rating_aggregates(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book = client.post("/books/", json={"title": "Rated", "author": "Critic"}, headers=headers).json()
+    assert book["review_count"] == 0 and book["average_rating"] is None
+    first = client.post("/reviews/", json={"book_id": book["id"], "rating": 5}, headers=headers).json()
+    client.post("/reviews/", json={"book_id": book["id"], "rating": 2}, headers=headers)
+    data = client.get(f"/books/{book['id']}").json()
+    assert (data["review_count"], data["average_rating"]) == (2, 3.5)
+    client.put(f"/reviews/{first['id']}", json={"rating": 4}, headers=headers)
+    assert client.get(f"/books/{book['id']}").json()["average_rating"] == 3.0
+    client.delete(f"/reviews/{first['id']}", headers=headers)
+    data = client.get(f"/books/{book['id']}").json()
+    assert (data["review_count"], data["average_rating"]) == (1, 2.0)
+    # Le recalcul en masse retombe sur les mêmes valeurs, sans toucher updated_at (ETag)
+    etag = client.get(f"/books/{book['id']}").headers["etag"]
+    db = database.SessionLocal()
+    try:
+        crud.rebuild_book_ratings(db)
+        assert crud.rebuild_book_ratings(db) == 0
+        assert client.get(f"/books/{book['id']}").headers["etag"] == etag
+        # Agrégats faussés (écriture hors ORM) : seul ce livre est réécrit
+        db.execute(update(models.Book).where(models.Book.id == book["id"]).values(review_count=7))
+        db.commit()
+        assert crud.rebuild_book_ratings(db) == 1
+    finally:
+        db.close()
+    data = client.get(f"/books/{book['id']}").json()
+    assert (data["review_count"], data["average_rating"]) == (1, 2.0)
+    top = client.get("/books/top-rated", params={"limit": 100}).json()
+    assert book["id"] in [b["id"] for b in top]
+    ratings = [b["average_rating"] for b in top]
+    assert ratings == sorted(ratings, reverse=True)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+
+def test_cover_upload_and_serving(user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    first = client.post("/books/", json={"title": "Cover 1", "author": "Painter"}, headers=headers).json()
+    second = client.post("/books/", json={"title": "Cover 2", "author": "Painter"}, headers=headers).json()
+    cover_urls = []
+    for book in (first, second):
+        response = client.post(f"/books/{book['id']}/cover", files={"file": ("c.png", PNG, "image/png")}, headers=headers)
+        assert response.status_code == 200
+        cover_urls.append(response.json()["cover_url"])
+    # Même contenu, même fichier
+    assert cover_urls[0] == cover_urls[1] and os.path.exists(cover_urls[0])
+
+    served = client.get(f"/books/{first['id']}/cover")
+    assert served.status_code == 200 and served.content == PNG
+    assert served.headers["content-type"] == "image/png"
+    assert client.get(f"/books/{first['id']}/cover", headers={"If-None-Match": served.headers["etag"]}).status_code == 304
+    partial = client.get(f"/books/{first['id']}/cover", headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206 and partial.content == PNG[:8]
+    # Pas encore de miniature (ou pas de Pillow) : l'original est servi
+    assert client.get(f"/books/{first['id']}/cover", params={"size": 128}).status_code == 200
+    assert client.get(f"/books/{first['id']}/cover", params={"size": 7}).status_code == 400
+
+    # Remplacée sur les deux livres, l'ancienne couverture est supprimée du disque
+    other = PNG + b"\x01"
+    for book in (first, second):
+        client.post(f"/books/{book['id']}/cover", files={"file": ("c.png", other, "image/png")}, headers=headers)
+    assert not os.path.exists(cover_urls[0])
+
+    assert client.post(f"/books/{first['id']}/cover", files={"file": ("c.txt", b"not an image", "text/plain")}, headers=headers).status_code == 415
+    monkeypatch.setattr(config, "COVER_MAX_BYTES", 100)
+    assert client.post(f"/books/{first['id']}/cover", files={"file": ("c.png", PNG, "image/png")}, headers=headers).status_code == 413
+
+def test_cover_removal_does_not_race_upload(user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    content = PNG + uuid.uuid4().bytes
+    first = client.post("/books/", json={"title": "Shared Cover 1", "author": "Painter"}, headers=headers).json()
+    second = client.post("/books/", json={"title": "Shared Cover 2", "author": "Painter"}, headers=headers).json()
+    cover_url = client.post(f"/books/{first['id']}/cover", files={"file": ("c.png", content, "image/png")}, headers=headers).json()["cover_url"]
+    upload = threading.Thread(target=lambda: client.post(f"/books/{second['id']}/cover", files={"file": ("c.png", content, "image/png")}, headers=headers))
+    cover_in_use = crud_async.cover_in_use
+
+    async def slow_cover_in_use(db, url):
+        in_use = await cover_in_use(db, url)
+        # Upload de la même image entre la vérification et la suppression
+        upload.start()
+        await anyio.sleep(0.3)
+        return in_use
+
+    monkeypatch.setattr(crud_async, "cover_in_use", slow_cover_in_use)
+    assert client.delete(f"/books/{first['id']}", headers=headers).status_code == 204
+    upload.join()
+    assert os.path.exists(cover_url)
+    assert client.get(f"/books/{second['id']}/cover").content == content
+
+def test_legacy_cover_still_served(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book = client.post("/books/", json={"title": "Legacy Cover", "author": "Painter"}, headers=headers).json()
+    # Chemin écrit par l'ancien upload : covers/book_<id>_<nom du fichier>
+    legacy = f"{config.COVERS_DIR}/book_{book['id']}_old.png"
+    os.makedirs(config.COVERS_DIR, exist_ok=True)
+    with open(legacy, "wb") as f:
+        f.write(PNG)
+    with database.SessionLocal() as db:
+        crud.set_book_cover(db, crud.get_book(db, book["id"]), legacy)
+    served = client.get(f"/books/{book['id']}/cover")
+    assert served.status_code == 200 and served.content == PNG
+    assert served.headers["content-type"] == "image/png"
+    assert client.get(f"/books/{book['id']}/cover", headers={"If-None-Match": served.headers["etag"]}).status_code == 304
+    assert client.get(f"/books/{book['id']}/cover", params={"size": 128}).content == PNG
+
+def test_cover_thumbnails(user_token):
+    Image = pytest.importorskip("PIL.Image")
+    headers = {"Authorization": f"Bearer {user_token}"}
+    image = io.BytesIO()
+    Image.new("RGB", (600, 300), (200, 30, 30)).save(image, format="PNG")
+    book = client.post("/books/", json={"title": "Thumbnail", "author": "Painter"}, headers=headers).json()
+    cover_url = client.post(f"/books/{book['id']}/cover", files={"file": ("t.png", image.getvalue(), "image/png")}, headers=headers).json()["cover_url"]
+    # Exécuté ici plutôt que dans le pool : la miniature est prête à la requête suivante
+    covers._thumbnail_job(cover_url)
+    served = client.get(f"/books/{book['id']}/cover", params={"size": 128})
+    assert served.status_code == 200 and served.headers["etag"].endswith('-128"')
+    with Image.open(io.BytesIO(served.content)) as thumbnail:
+        assert thumbnail.size == (128, 64)
@@ -0,0 +1,110 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from app import pagination
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def user_token():
+    user = {"username": "borrowuser", "email": "borrowuser@example.com", "password": "borrowpass"}
+    client.post("/users/register", json=user)
+    resp = client.post("/users/login", data={"username": user["username"], "password": user["password"]})
+    return resp.json()["access_token"]
+
+def test_borrow_and_return(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book_id = client.post("/books/", json={"title": "Borrow Book", "author": "Author B"}, headers=headers).json()["id"]
+    response = client.post("/borrows/", json={"book_id": book_id}, headers=headers)
+    assert response.status_code == 201
+    borrow_id = response.json()["id"]
+    assert client.post("/borrows/", json={"book_id": book_id}, headers=headers).status_code == 400
+    assert client.post(f"/borrows/{borrow_id}/return", headers=headers).status_code == 200
+    assert client.post("/borrows/", json={"book_id": book_id}, headers=headers).status_code == 201
+
+def test_concurrent_borrows(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book_id = client.post("/books/", json={"title": "Contested Book", "author": "Author B"}, headers=headers).json()["id"]
+    def borrow(_):
+        return client.post("/borrows/", json={"book_id": book_id}, headers=headers).status_code
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        statuses = list(pool.map(borrow, range(20)))
+    # Un seul emprunt passe, les autres sont refusés proprement (pas d'erreur 500)
+    assert statuses.count(201) == 1
+    assert statuses.count(400) == 19
+
+def test_borrows_cursor_paging(user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    for i in range(3):
+        book_id = client.post("/books/", json={"title": f"Paged Borrow {i}", "author": "Author B"}, headers=headers).json()["id"]
+        client.post("/borrows/", json={"book_id": book_id}, headers=headers)
+    monkeypatch.setattr(pagination, "DEFAULT_PAGE_SIZE", 2)
+    # Sans curseur ni limit : liste complète, comme avant la pagination
+    everything = client.get("/borrows/me", headers=headers)
+    assert len(everything.json()) >= 3 and "X-Next-Cursor" not in everything.headers
+    assert len(client.get("/borrows/me", params={"after": ""}, headers=headers).json()) == 2
+    seen, after = [], ""
+    while after is not None:
+        page = client.get("/borrows/me", params={"after": after, "limit": 2}, headers=headers)
+        assert page.status_code == 200 and len(page.json()) <= 2
+        seen.extend(b["id"] for b in page.json())
+        after = page.headers.get("X-Next-Cursor")
+    assert seen == [b["id"] for b in everything.json()]
+
+def test_batch_borrow_and_return(user_token, count_queries):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book_ids = [client.post("/books/", json={"title": f"Cart Book {i}", "author": "Author B"}, headers=headers).json()["id"] for i in range(4)]
+    client.post("/borrows/", json={"book_id": book_ids[3]}, headers=headers)
+    with count_queries() as statements:
+        response = client.post("/borrows/batch", json={"book_ids": book_ids + [book_ids[0], 999999]}, headers=headers)
+    assert response.status_code == 200
+    assert [(r["book_id"], r["status"]) for r in response.json()] == [
+        (book_ids[0], 201), (book_ids[1], 201), (book_ids[2], 201), (book_ids[3], 400), (book_ids[0], 400), (999999, 404),
+    ]
+    # Deux SELECT ensemblistes et un INSERT multi-lignes, quel que soit le nombre de livres
+    assert len(statements) <= 3
+    borrow_ids = [r["borrow"]["id"] for r in response.json() if r["borrow"]]
+    other = {"username": "cartother", "email": "cartother@example.com", "password": "cartpass"}
+    client.post("/users/register", json=other)
+    other_token = client.post("/users/login", data={"username": other["username"], "password": other["password"]}).json()["access_token"]
+    forbidden = client.post("/borrows/return/batch", json={"borrow_ids": borrow_ids[:1]}, headers={"Authorization": f"Bearer {other_token}"})
+    assert forbidden.json()[0]["status"] == 403
+    response = client.post("/borrows/return/batch", json={"borrow_ids": borrow_ids + [borrow_ids[0], 888888]}, headers=headers)
+    assert [r["status"] for r in response.json()] == [200, 200, 200, 400, 404]
+    assert all(r["borrow"]["return_date"] for r in response.json()[:3])
+    assert client.post("/borrows/batch", json={"book_ids": []}, headers=headers).status_code == 400
+
+def test_batch_borrow_savepoint_fallback(user_token):
+    # Un emprunt concurrent arrive entre la vérification et l'INSERT groupé
+    from sqlalchemy import event
+    from app import crud, database, models
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book_ids = [client.post("/books/", json={"title": f"Race Book {i}", "author": "Author B"}, headers=headers).json()["id"] for i in range(3)]
+    db = database.SessionLocal()
+    user_id = db.query(models.User.id).filter(models.User.username == "borrowuser").scalar()
+    def concurrent_borrow(orm_execute_state):
+        if orm_execute_state.is_insert and not concurrent_borrow.done:
+            concurrent_borrow.done = True
+            other = database.SessionLocal()
+            other.add(models.Borrow(user_id=user_id, book_id=book_ids[1]))
+            other.commit()
+            other.close()
+    concurrent_borrow.done = False
+    event.listen(db, "do_orm_execute", concurrent_borrow)
+    try:
+        results = crud.create_borrows(db, user_id, book_ids)
+    finally:
+        db.close()
+    assert [(book_id, error) for book_id, _, error in results] == [
+        (book_ids[0], None), (book_ids[1], crud.BATCH_UNAVAILABLE), (book_ids[2], None),
+    ]
+
+def test_books_batch(user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    book_id = client.post("/books/", json={"title": "Lookup Book", "author": "Author B"}, headers=headers).json()["id"]
+    response = client.get(f"/books/batch?ids={book_id},777777")
+    assert response.status_code == 200
+    assert [(r["book_id"], r["status"]) for r in response.json()] == [(book_id, 200), (777777, 404)]
+    assert response.json()[0]["book"]["title"] == "Lookup Book"
+    assert client.get("/books/batch?ids=1,abc").status_code == 400
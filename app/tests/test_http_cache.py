@@ -0,0 +1,83 @@
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app import pagination
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def headers():
+    user = {"username": "cacheuser", "email": "cacheuser@example.com", "password": "cachepass"}
+    client.post("/users/register", json=user)
+    token = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_book_conditional_get(headers):
+    book = client.post("/books/", json={"title": "Etag", "author": "Cache"}, headers=headers).json()
+    first = client.get(f"/books/{book['id']}")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] and first.headers["last-modified"]
+    not_modified = client.get(f"/books/{book['id']}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert client.get(f"/books/{book['id']}", headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+    client.put(f"/books/{book['id']}", json={"title": "Etag 2", "author": "Cache"}, headers=headers)
+    changed = client.get(f"/books/{book['id']}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    # Un nouvel avis change les agrégats, donc l'ETag du livre
+    client.post("/reviews/", json={"book_id": book["id"], "rating": 4}, headers=headers)
+    assert client.get(f"/books/{book['id']}", headers={"If-None-Match": changed.headers["etag"]}).status_code == 200
+
+def test_list_response_cache(headers, count_queries):
+    # Auteur propre à l'exécution : la suite peut être relancée sur la même base
+    author = f"Cache{uuid.uuid4().hex[:8]}"
+    client.post("/books/", json={"title": "Listed", "author": author}, headers=headers)
+    params = {"limit": 5, "author": f"{author} "}
+    first = client.get("/books/", params=params)
+    assert first.status_code == 200
+    # Même requête, paramètres dans un autre ordre : servie par le cache, sans SQL
+    with count_queries() as statements:
+        again = client.get(f"/books/?author={author}&limit=5")
+    assert statements == [] and again.content == first.content
+    assert client.get("/books/", params=params, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    # Une écriture invalide les listes
+    client.post("/books/", json={"title": "Fresh", "author": author}, headers=headers)
+    fresh = client.get("/books/", params=params)
+    assert fresh.headers["etag"] != first.headers["etag"]
+    assert "Fresh" in [b["title"] for b in fresh.json()]
+
+def test_reviews_list_invalidation(headers):
+    book = client.post("/books/", json={"title": "Reviewed", "author": "Cache"}, headers=headers).json()
+    assert client.get(f"/reviews/book/{book['id']}").json() == []
+    review = client.post("/reviews/", json={"book_id": book["id"], "rating": 3, "comment": "ok"}, headers=headers).json()
+    assert [r["id"] for r in client.get(f"/reviews/book/{book['id']}").json()] == [review["id"]]
+    client.put(f"/reviews/{review['id']}", json={"comment": "edited"}, headers=headers)
+    assert client.get(f"/reviews/book/{book['id']}").json()[0]["comment"] == "edited"
+    client.delete(f"/reviews/{review['id']}", headers=headers)
+    assert client.get(f"/reviews/book/{book['id']}").json() == []
+
+def test_list_revalidation_after_delete(headers):
+    # Supprimer un avis ne change l'updated_at d'aucun avis restant : la liste ne doit pas répondre 304
+    book = client.post("/books/", json={"title": "Deleted Review", "author": "Cache"}, headers=headers).json()
+    older = client.post("/reviews/", json={"book_id": book["id"], "rating": 2}, headers=headers).json()
+    client.post("/reviews/", json={"book_id": book["id"], "rating": 5}, headers=headers)
+    listed = client.get(f"/reviews/book/{book['id']}")
+    assert len(listed.json()) == 2
+    client.delete(f"/reviews/{older['id']}", headers=headers)
+    again = client.get(f"/reviews/book/{book['id']}", headers={"If-Modified-Since": listed.headers["last-modified"]})
+    assert again.status_code == 200 and len(again.json()) == 1
+    assert again.headers["last-modified"] != listed.headers["last-modified"]
+
+def test_reviews_cursor_paging(headers, monkeypatch):
+    book = client.post("/books/", json={"title": "Paged Reviews", "author": "Cache"}, headers=headers).json()
+    ids = [client.post("/reviews/", json={"book_id": book["id"], "rating": 1 + i}, headers=headers).json()["id"] for i in range(5)]
+    monkeypatch.setattr(pagination, "DEFAULT_PAGE_SIZE", 2)
+    everything = client.get(f"/reviews/book/{book['id']}")
+    assert [r["id"] for r in everything.json()] == ids and "X-Next-Cursor" not in everything.headers
+    seen, after = [], ""
+    while after is not None:
+        page = client.get(f"/reviews/book/{book['id']}", params={"after": after})
+        assert len(page.json()) <= 2
+        seen.extend(r["id"] for r in page.json())
+        after = page.headers.get("X-Next-Cursor")
+    assert seen == ids
@@ -0,0 +1,138 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app import config, crud, database, jobs, models
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def user_headers():
+    user = {"username": "jobuser", "email": "jobuser@example.com", "password": "jobpass"}
+    client.post("/users/register", json=user)
+    token = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_export_job(user_headers, admin_headers):
+    client.post("/books/", json={"title": "Exported Later", "author": "Job Author"}, headers=user_headers)
+    response = client.post("/jobs/exports", json={"dataset": "books", "fmt": "csv", "author": "Job Author"}, headers=user_headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "pending" and response.headers["location"] == f"/jobs/{job['id']}"
+    assert client.get(f"/jobs/{job['id']}/download", headers=user_headers).status_code == 409
+    assert job["id"] in jobs.run_pending()
+    job = client.get(f"/jobs/{job['id']}", headers=user_headers).json()
+    assert job["status"] == "succeeded" and job["attempts"] == 1
+    download = client.get(f"/jobs/{job['id']}/download", headers=user_headers)
+    assert download.status_code == 200
+    assert download.content == client.get("/books/export/csv?author=Job+Author").content
+    assert "Exported Later" in download.text
+    # Les emprunts restent réservés aux admins
+    assert client.post("/jobs/exports", json={"dataset": "borrows"}, headers=user_headers).status_code == 403
+    assert client.post("/jobs/exports", json={"dataset": "users"}, headers=admin_headers).status_code == 400
+
+def test_job_access(user_headers, admin_headers):
+    job_id = client.post("/jobs/exports", json={"dataset": "borrows", "fmt": "ndjson"}, headers=admin_headers).json()["id"]
+    assert client.get(f"/jobs/{job_id}", headers=user_headers).status_code == 403
+    assert client.get(f"/jobs/{job_id}", headers=admin_headers).status_code == 200
+    assert client.get("/jobs/999999", headers=admin_headers).status_code == 404
+    jobs.run_pending()
+
+def test_retries_and_failures(monkeypatch):
+    monkeypatch.setattr(config, "JOB_RETRY_BACKOFF_SECONDS", 0)
+    calls = []
+    def flaky(db, job, payload):
+        calls.append(job.attempts)
+        if len(calls) < 2:
+            raise RuntimeError("transient")
+        return {"ok": True}
+    def broken(db, job, payload):
+        raise RuntimeError("permanent")
+    monkeypatch.setitem(jobs.HANDLERS, "test_flaky", jobs.Handler(flaky, 1, 3, None))
+    monkeypatch.setitem(jobs.HANDLERS, "test_broken", jobs.Handler(broken, 1, 2, None))
+    db = database.SessionLocal()
+    try:
+        flaky_job = jobs.enqueue(db, "test_flaky")
+        broken_job = jobs.enqueue(db, "test_broken")
+        jobs.run_pending()
+        db.expire_all()
+        assert (flaky_job.status, flaky_job.attempts, calls) == ("succeeded", 2, [1, 2])
+        assert (broken_job.status, broken_job.attempts) == ("failed", 2)
+        assert "permanent" in broken_job.error
+    finally:
+        db.close()
+
+def test_concurrency_limit(monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "test_limited", jobs.Handler(lambda db, job, payload: None, 1, 1, None))
+    db = database.SessionLocal()
+    try:
+        first, second = jobs.enqueue(db, "test_limited"), jobs.enqueue(db, "test_limited")
+        claimed = jobs.claim(db, "worker-a")
+        assert claimed.id == first.id
+        # Limite de 1 atteinte : la seconde attend la fin de la première
+        assert jobs.claim(db, "worker-b") is None
+        jobs.execute(db, claimed)
+        assert jobs.claim(db, "worker-b").id == second.id
+        # Worker disparu : la tâche bloquée repart en file (échouée si plus d'essai)
+        monkeypatch.setattr(config, "JOB_LOCK_TIMEOUT_SECONDS", -1)
+        assert jobs.requeue_stale(db) == 1
+        db.expire_all()
+        assert second.status == "failed"
+    finally:
+        db.close()
+
+def test_heartbeat_keeps_long_job_locked(monkeypatch):
+    monkeypatch.setattr(config, "JOB_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(config, "JOB_LOCK_TIMEOUT_SECONDS", 0.2)
+    requeued = []
+    def slow(db, job, payload):
+        time.sleep(0.4)
+        # Plus long que JOB_LOCK_TIMEOUT_SECONDS, mais locked_at a été rafraîchi entre-temps
+        with database.SessionLocal() as other:
+            requeued.append(jobs.requeue_stale(other))
+    monkeypatch.setitem(jobs.HANDLERS, "test_slow", jobs.Handler(slow, 1, 1, None))
+    db = database.SessionLocal()
+    try:
+        job = jobs.enqueue(db, "test_slow")
+        claimed = jobs.claim(db, "worker-slow")
+        assert claimed.id == job.id
+        jobs.execute(db, claimed)
+        db.expire_all()
+        assert requeued == [0] and job.status == "succeeded"
+    finally:
+        db.close()
+
+def test_overdue_scan(user_headers, admin_headers):
+    book_id = client.post("/books/", json={"title": "Late Book", "author": "Job Author"}, headers=user_headers).json()["id"]
+    borrow = client.post("/borrows/", json={"book_id": book_id}, headers=user_headers).json()
+    assert borrow["due_date"] is not None
+    assert client.get("/borrows/overdue", headers=user_headers).status_code == 403
+    assert borrow["id"] not in [b["id"] for b in client.get("/borrows/overdue", headers=admin_headers).json()]
+    db = database.SessionLocal()
+    try:
+        db.query(models.Borrow).filter(models.Borrow.id == borrow["id"]).update({models.Borrow.due_date: datetime.utcnow() - timedelta(days=1)})
+        db.commit()
+        assert borrow["id"] in [b["id"] for b in client.get("/borrows/overdue", headers=admin_headers).json()]
+        job = jobs.enqueue(db, "overdue_scan")
+        jobs.run_pending()
+        db.expire_all()
+        assert job.status == "succeeded"
+        assert db.get(models.Borrow, borrow["id"]).overdue_at is not None
+        # Déjà signalé : pas compté deux fois
+        assert crud.flag_overdue_borrows(db) == 0
+    finally:
+        db.close()
+
+def test_periodic_scheduling(monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "test_periodic", jobs.Handler(lambda db, job, payload: None, 1, 1, 60))
+    db = database.SessionLocal()
+    try:
+        assert "test_periodic" in jobs.schedule_periodic(db)
+        assert "test_periodic" not in jobs.schedule_periodic(db)
+        queued = db.query(models.Job).filter(models.Job.kind == "test_periodic").one()
+        assert queued.run_after > datetime.utcnow() + timedelta(seconds=50)
+        db.delete(queued)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,54 @@
+import re
+from typing import Optional
+import pytest
+from fastapi.testclient import TestClient
+from app import config, metrics
+from app.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.skipif(not config.METRICS_ENABLED, reason="METRICS_ENABLED désactivé")
+
+def sample(text: str, name: str, default: Optional[float] = None, **labels) -> float:
+    """Valeur d'une série dont les étiquettes contiennent celles demandées."""
+    for line in text.splitlines():
+        if not line.startswith(name + "{") and not line.startswith(name + " "):
+            continue
+        if all(f'{k}="{v}"' in line for k, v in labels.items()):
+            return float(line.rsplit(" ", 1)[1])
+    if default is not None:
+        return default
+    raise AssertionError(f"{name} {labels} absent")
+
+def test_metrics_endpoint():
+    user = {"username": "metricsuser", "email": "metricsuser@example.com", "password": "metricspass"}
+    client.post("/users/register", json=user)
+    client.post("/users/login", data={"username": user["username"], "password": user["password"]})
+    before = client.get("/metrics").text
+    # Série absente tant qu'aucun GET /books/{id} n'a répondu 404 (un DELETE 404 ne compte pas)
+    count_before = sample(before, "http_requests_total", method="GET", route="/books/{book_id}", status="404", default=0)
+    for _ in range(3):
+        client.get("/books/999999")
+    client.get("/no-such-route")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    # Étiquette = gabarit de route, pas le chemin brut
+    assert sample(text, "http_requests_total", method="GET", route="/books/{book_id}", status="404") == count_before + 3
+    assert "/books/999999" not in text
+    assert sample(text, "http_requests_total", route="unmatched", status="404") >= 1
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route="/books/{book_id}") >= 3
+    assert sample(text, "http_request_db_queries_sum", method="GET", route="/books/{book_id}") >= 3
+    assert sample(text, "http_requests_in_progress", router="metrics") == 1
+    assert sample(text, "db_queries_total") > 0
+    assert sample(text, "password_hash_duration_seconds_count", operation="verify") >= 1
+    assert re.search(r'^db_pool_checkouts_total\{pool="primary"\} \d+', text, re.M)
+
+def test_metric_requires_render():
+    class Incomplete(metrics.Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "sans render")
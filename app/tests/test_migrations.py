@@ -0,0 +1,98 @@
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, inspect, text
+from app import crud, database, migrations, models
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, username VARCHAR NOT NULL, email VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL)",
+    "CREATE TABLE books (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR NOT NULL, author VARCHAR NOT NULL, description TEXT, owner_id INTEGER)",
+    "CREATE TABLE borrows (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL, borrow_date DATETIME, return_date DATETIME)",
+    "CREATE TABLE reviews (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL, comment TEXT, rating INTEGER NOT NULL, created_at DATETIME)",
+    "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')",
+]
+
+def test_upgrade_legacy_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for sql in LEGACY_SCHEMA:
+            conn.execute(text(sql))
+    assert migrations.upgrade(engine) == migrations.LATEST_VERSION
+    inspector = inspect(engine)
+    assert "role" in {c["name"] for c in inspector.get_columns("users")}
+    assert "ix_borrows_user_id" in {i["name"] for i in inspector.get_indexes("borrows")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT role FROM users WHERE id = 1")).scalar() == "user"
+    # Une seconde exécution ne fait rien
+    assert migrations.upgrade(engine) == migrations.LATEST_VERSION
+    engine.dispose()
+
+def test_upgrade_closes_duplicate_open_borrows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'duplicates.db'}")
+    with engine.begin() as conn:
+        for sql in LEGACY_SCHEMA:
+            conn.execute(text(sql))
+        conn.execute(text("INSERT INTO books (id, title, author) VALUES (1, 'Double', 'A'), (2, 'Simple', 'B')"))
+        conn.execute(text(
+            "INSERT INTO borrows (id, user_id, book_id, borrow_date, return_date) VALUES "
+            "(1, 1, 1, '2024-01-01', NULL), (2, 1, 1, '2024-01-02', NULL), (3, 1, 1, '2024-01-03', NULL), "
+            "(4, 1, 2, '2024-01-01', '2024-01-05'), (5, 1, 2, '2024-01-06', NULL)"
+        ))
+    assert migrations.upgrade(engine) == migrations.LATEST_VERSION
+    with engine.connect() as conn:
+        still_open = conn.execute(text("SELECT id FROM borrows WHERE return_date IS NULL ORDER BY id")).scalars().all()
+    assert still_open == [1, 5]
+    engine.dispose()
+
+@contextmanager
+def captured_statements(engine):
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def test_upgrade_up_to_date_is_one_query(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'current.db'}")
+    migrations.upgrade(engine)
+    # Démarrage d'un worker sur une base à jour : ni réflexion du schéma ni DDL
+    with captured_statements(engine) as statements:
+        assert migrations.upgrade(engine) == migrations.LATEST_VERSION
+    assert [s for s, _ in statements] == ["SELECT MAX(version) FROM schema_version"]
+    engine.dispose()
+
+def query_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+# Requêtes chaudes : aucune ne doit parcourir toute la table
+HOT_QUERIES = {
+    "borrows_by_user": lambda db: crud.get_borrows_by_user(db, 1, limit=100),
+    "reviews_by_book": lambda db: crud.get_reviews_by_book(db, 1, limit=100),
+    "user_books": lambda db: db.query(models.Book).filter(models.Book.owner_id == 1).all(),
+    "borrow_by_id": lambda db: crud.get_borrow_by_id(db, 1),
+    "top_rated": lambda db: crud.get_top_rated_books(db, limit=10),
+    "overdue_borrows": lambda db: crud.get_overdue_borrows(db, limit=100),
+    "user_history": lambda db: crud.get_history_book_ids(db, 1, limit=200),
+}
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_queries_use_indexes(name):
+    engine = database.engine
+    if engine.dialect.name != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN est propre à SQLite")
+    db = database.SessionLocal()
+    try:
+        with captured_statements(engine) as statements:
+            HOT_QUERIES[name](db)
+    finally:
+        db.close()
+    selects = [(s, p) for s, p in statements if s.lstrip().upper().startswith("SELECT")]
+    assert selects
+    for statement, parameters in selects:
+        plan = query_plan(engine, statement, parameters)
+        full_scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+        assert not full_scans, f"{name}: {plan}"
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app import profiling
+from app.main import app
+from app.routers import profiles
+
+# PROFILING_ENABLED reste désactivé par défaut : l'application de test est enveloppée
+# directement, avec les routes /admin/profiles devant l'application principale
+profiling.instrument_engines()
+profiled = FastAPI()
+profiled.include_router(profiles.router)
+profiled.mount("/", app)
+client = TestClient(profiling.ProfilingMiddleware(profiled))
+
+def test_profile_on_demand(admin_headers):
+    plain = client.get("/books/", params={"keyword": "profile"})
+    assert profiling.PROFILE_ID_HEADER not in plain.headers
+    response = client.get("/books/", params={"keyword": "profile", "limit": 3}, headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = int(response.headers[profiling.PROFILE_ID_HEADER])
+
+    summaries = client.get("/admin/profiles", headers=admin_headers).json()
+    assert profile_id in [p["id"] for p in summaries]
+    profile = client.get(f"/admin/profiles/{profile_id}", headers=admin_headers).json()
+    assert profile["path"] == "/books/" and profile["status"] == 200
+    assert profile["wall_ms"] > 0 and profile["sql_count"] >= 1
+    selects = [s for s in profile["sql"] if s["statement"].lstrip().upper().startswith("SELECT")]
+    assert selects and all(s["plan"] for s in selects)
+    assert "cumulative" in profile["profile"]
+    assert client.get("/admin/profiles/999999", headers=admin_headers).status_code == 404
+
+def test_profiles_require_admin():
+    assert client.get("/admin/profiles").status_code == 401
+
+def test_profiles_not_mounted_by_default(admin_headers):
+    assert TestClient(app).get("/admin/profiles", headers=admin_headers).status_code == 404
+
+def test_slow_query_log(tmp_path):
+    path = str(tmp_path / "slow.log")
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    profiling.install_slow_query_log(engine, path, threshold_ms=0)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1 + :n"), {"n": 41})
+    engine.dispose()
+    with open(path, encoding="utf-8") as log:
+        content = log.read()
+    assert "SELECT 1 + ?" in content and "41" in content
+
+def test_failed_statement_does_not_leak_start_time(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profiled.db'}")
+    profiling._record_statements(engine)
+    token = profiling._current.set(profiling.RequestProfile(0, "GET", "/", ""))
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert not conn.info.get("profile_query_start")
+    finally:
+        profiling._current.reset(token)
+        engine.dispose()
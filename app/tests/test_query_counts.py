@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+# Nombre maximal de requêtes SQL par endpoint (cache utilisateur chaud).
+# Un dépassement signale un N+1 ou un chargement paresseux réintroduit.
+QUERY_BUDGETS = {
+    "/users/": 2,
+    "/users/?fields=id,username,role": 1,
+    "/users/me": 1,
+    "/users/me?fields=id,username": 0,
+    "/books/?limit=50": 1,
+    "/borrows/": 1,
+    "/borrows/me": 1,
+    "/reviews/book/1": 1,
+}
+
+@pytest.mark.parametrize("url", sorted(QUERY_BUDGETS))
+def test_query_budget(url, admin_headers, count_queries):
+    with count_queries() as statements:
+        response = client.get(url, headers=admin_headers)
+    assert response.status_code == 200
+    assert len(statements) <= QUERY_BUDGETS[url], "\n".join(statements)
+
+def test_fields_projection(admin_headers):
+    users = client.get("/users/", params={"fields": "id,username"}, headers=admin_headers).json()
+    assert users and all(set(u) == {"id", "username"} for u in users)
+    me = client.get("/users/me", params={"fields": "username,books"}, headers=admin_headers).json()
+    assert me == {"username": "countadmin", "books": []}
+    assert client.get("/users/", params={"fields": "password"}, headers=admin_headers).status_code == 400
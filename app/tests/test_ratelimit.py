@@ -0,0 +1,60 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app import ratelimit, revocation
+from app.main import app
+
+RULES = ratelimit.parse_rules("POST /users/login=3/60;GET /books/export/*=2/60")
+client = TestClient(ratelimit.RateLimitMiddleware(app, RULES))
+
+@pytest.fixture(autouse=True)
+def fresh_buckets(monkeypatch):
+    monkeypatch.setattr(ratelimit, "backend", ratelimit.MemoryBackend(1000))
+
+def test_login_limited_per_ip():
+    form = {"username": "nobody", "password": "wrong"}
+    assert [client.post("/users/login", data=form).status_code for _ in range(3)] == [401, 401, 401]
+    response = client.post("/users/login", data=form)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    # Routes sans règle : jamais limitées
+    assert client.get("/books/?limit=1").status_code == 200
+
+def test_buckets_per_user(admin_headers):
+    user = {"username": "limiteduser", "email": "limiteduser@example.com", "password": "limitpass"}
+    client.post("/users/register", json=user)
+    token = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    # Préfixe : csv et ndjson partagent le seau de chaque utilisateur
+    assert client.get("/books/export/csv", headers=headers).status_code == 200
+    assert client.get("/books/export/ndjson", headers=headers).status_code == 200
+    assert client.get("/books/export/csv", headers=headers).status_code == 429
+    assert client.get("/books/export/csv", headers=admin_headers).status_code == 200
+    assert client.get("/books/export/csv").status_code == 200
+
+def test_revoked_token_counted_on_ip(login_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(revocation, "revocations", revocation.RevocationList(str(tmp_path / "revoked.bloom"), 1000, 0.001, 0))
+    user = {"username": "revokedlimit", "email": "revokedlimit@example.com", "password": "limitpass"}
+    client.post("/users/register", json=user)
+    headers = login_headers(user["username"], user["password"])
+    scope = {"headers": [(b"authorization", headers["Authorization"].encode())], "client": ("10.0.0.1", 1234)}
+    assert ratelimit._identity(scope).startswith("user:")
+    assert client.post("/users/logout", headers=headers).status_code == 204
+    assert ratelimit._identity(scope) == "ip:10.0.0.1"
+
+def test_token_bucket_refill():
+    rule = ratelimit.Rule("GET /x", 2, 0.1)
+    backend = ratelimit.MemoryBackend(10)
+    assert [backend.take("k", rule) for _ in range(3)][:2] == [0, 0]
+    assert backend.take("k", rule) > 0
+    time.sleep(0.06)
+    assert backend.take("k", rule) == 0
+
+def test_sqlite_backend_shared_between_workers(tmp_path):
+    rule = ratelimit.Rule("POST /users/login", 2, 60)
+    path = str(tmp_path / "ratelimit.db")
+    worker_a, worker_b = ratelimit.SQLiteBackend(path), ratelimit.SQLiteBackend(path)
+    assert worker_a.take("ip:1.2.3.4", rule) == 0
+    assert worker_b.take("ip:1.2.3.4", rule) == 0
+    assert worker_a.take("ip:1.2.3.4", rule) == pytest.approx(30, abs=1)
+    assert worker_b.take("ip:5.6.7.8", rule) == 0
@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from app import config, database, models, recommendations
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Index de recommandations dans un fichier temporaire, relu à chaque appel."""
+    rec_index = recommendations.RecommendationIndex(str(tmp_path / "recommendations.idx"), reload_seconds=0)
+    monkeypatch.setattr(recommendations, "index", rec_index)
+    return rec_index
+
+@pytest.fixture(scope="module")
+def library():
+    """Trois lecteurs, cinq livres : a et b lus ensemble deux fois, a et c une fois."""
+    # Noms uniques : la suite peut être relancée sur la même base
+    run = uuid.uuid4().hex[:8]
+    db = database.SessionLocal()
+    users = [models.User(username=f"recuser{i}-{run}", email=f"recuser{i}-{run}@example.com", hashed_password="x") for i in range(3)]
+    books = [models.Book(title=f"Rec Book {name}", author="Author Rec") for name in "abcde"]
+    db.add_all(users + books)
+    db.flush()
+    a, b, c, d, e = (book.id for book in books)
+    history = {users[0].id: [a, b], users[1].id: [a, b, c], users[2].id: [d]}
+    # Emprunts rendus : les livres restent disponibles
+    db.add_all(
+        models.Borrow(user_id=user_id, book_id=book_id, return_date=datetime.utcnow())
+        for user_id, book_ids in history.items() for book_id in book_ids
+    )
+    # Avis mal noté : pas une lecture appréciée
+    db.add(models.Review(user_id=users[2].id, book_id=e, rating=1))
+    db.commit()
+    ids = {"users": [user.id for user in users], "books": dict(zip("abcde", (a, b, c, d, e)))}
+    db.close()
+    return ids
+
+def test_similar_books(index, library):
+    db = database.SessionLocal()
+    stats = index.rebuild(db)
+    db.close()
+    assert stats["mode"] == "full" and stats["books"] >= 3
+    books = library["books"]
+    neighbors = index.similar(books["a"])
+    assert [other for other, _ in neighbors] == [books["b"], books["c"]]
+    # cosinus : a et b ont les deux mêmes lecteurs
+    assert neighbors[0][1] == pytest.approx(1.0)
+    assert neighbors[1][1] == pytest.approx(1 / 2 ** 0.5, rel=1e-6)
+    assert index.similar(books["e"]) == []
+    response = client.get(f"/books/{books['a']}/similar", params={"limit": 1})
+    assert response.status_code == 200
+    assert [(r["book"]["id"], r["score"]) for r in response.json()] == [(books["b"], 1.0)]
+    assert client.get("/books/999999/similar").status_code == 404
+
+def test_incremental_refresh(index, library, monkeypatch):
+    # Petite base de test : sans cela, la plupart des lignes changent et l'index est reconstruit
+    monkeypatch.setattr(index, "full_rebuild_ratio", 1.0)
+    books = library["books"]
+    db = database.SessionLocal()
+    index.rebuild(db)
+    assert index.similar(books["d"]) == []
+    db.add(models.Borrow(user_id=library["users"][2], book_id=books["c"], return_date=datetime.utcnow()))
+    db.commit()
+    stats = index.refresh(db)
+    assert stats["mode"] == "incremental"
+    # Lignes recalculées : livres du lecteur qui vient d'emprunter (c, d), et a, b qui citent c
+    assert stats["books"] == 4
+    assert [other for other, _ in index.similar(books["d"])] == [books["c"]]
+    assert books["d"] in [other for other, _ in index.similar(books["c"])]
+    assert index.refresh(db)["books"] == 0
+    # Même résultat qu'une reconstruction complète
+    incremental = {book_id: index.similar(book_id) for book_id in books.values()}
+    index.rebuild(db)
+    assert {book_id: index.similar(book_id) for book_id in books.values()} == incremental
+    db.close()
+
+def test_user_recommendations(index, library, login_headers):
+    books = library["books"]
+    db = database.SessionLocal()
+    index.rebuild(db)
+    db.close()
+    # Nouveau lecteur à chaque exécution : aucun historique
+    run = uuid.uuid4().hex[:8]
+    user = {"username": f"recreader-{run}", "email": f"recreader-{run}@example.com", "password": "recpass"}
+    client.post("/users/register", json=user)
+    headers = login_headers(user["username"], user["password"])
+    # Sans historique : les mieux notés, score 0
+    fallback = client.get("/users/me/recommendations", headers=headers)
+    assert fallback.status_code == 200
+    assert all(r["score"] == 0.0 for r in fallback.json())
+    assert client.post("/borrows/", json={"book_id": books["b"]}, headers=headers).status_code == 201
+    suggested = client.get("/users/me/recommendations", headers=headers).json()
+    # Voisins de b, hors b lui-même (déjà emprunté)
+    assert [r["book"]["id"] for r in suggested][:2] == [books["a"], books["c"]]
+    assert books["b"] not in [r["book"]["id"] for r in suggested]
+    assert client.get("/users/me/recommendations").status_code == 401
+
+def test_index_file_rejected_when_invalid(index, tmp_path):
+    with open(index.path, "wb") as f:
+        f.write(b"not an index")
+    index.reload(force=True)
+    assert index.loaded is None and index.similar(1) == []
+    recommendations.write_index(index.path, {1: [(2, 0.5)], 2: [(1, 0.5)]}, config.RECOMMENDATIONS_TOP_K, (0, 0), 0.0)
+    assert index.similar(2) == [(1, 0.5)]
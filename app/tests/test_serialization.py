@@ -0,0 +1,56 @@
+import pytest
+from fastapi.testclient import TestClient
+from app import config, serialization
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def library(admin_headers):
+    user = {"username": "jsonuser", "email": "jsonuser@example.com", "password": "jsonpass"}
+    client.post("/users/register", json=user)
+    token = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    # Accents, guillemets, caractères de contrôle, emoji, valeurs nulles, moyennes non entières
+    titles = ["Élégie \"nocturne\"", "Tab\tet\nretour", "🐉 Dragons", "Ünïcödé   séparateur", "Plain"]
+    ids = []
+    for i, title in enumerate(titles):
+        book = {"title": title, "author": "Jsön Äuteur", "description": None if i % 2 else "desc \\ échappée"}
+        ids.append(client.post("/books/", json=book, headers=headers).json()["id"])
+    for rating in (5, 4, 4):
+        client.post("/reviews/", json={"book_id": ids[0], "rating": rating, "comment": "très « bien »"}, headers=headers)
+    borrow = client.post("/borrows/", json={"book_id": ids[1]}, headers=headers).json()
+    client.post(f"/borrows/{borrow['id']}/return", headers=headers)
+    client.post("/borrows/", json={"book_id": ids[2]}, headers=headers)
+    return ids
+
+def urls(book_ids):
+    return [
+        "/books/?limit=100",
+        "/books/?keyword=dragons",
+        "/books/?after=&limit=2",
+        "/books/top-rated?limit=50",
+        f"/reviews/book/{book_ids[0]}",
+        "/borrows/?limit=1000",
+        "/users/",
+    ]
+
+def fetch(url, headers, fast, monkeypatch):
+    monkeypatch.setattr(config, "FAST_JSON", fast)
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_json_is_byte_identical(library, admin_headers, monkeypatch, use_orjson):
+    monkeypatch.setattr(config, "RESPONSE_CACHE_ENABLED", False)
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson non installé")
+    for url in urls(library):
+        slow = fetch(url, admin_headers, False, monkeypatch)
+        fast = fetch(url, admin_headers, True, monkeypatch)
+        assert fast.content == slow.content, url
+        assert fast.headers.get("x-next-cursor") == slow.headers.get("x-next-cursor"), url
+        assert fast.headers["content-type"] == slow.headers["content-type"], url
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from app import config, jobs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importés d'abord dans le même processus : leur temps sert d'étalon à la machine
+FRAMEWORK_MODULES = ("fastapi", "sqlalchemy.orm")
+# Budget des imports propres à app.main, en fraction du temps d'import de FRAMEWORK_MODULES
+# (≈ 0,3 mesuré) : indépendant de la vitesse de la machine
+IMPORT_TIME_BUDGET_RATIO = float(os.getenv("IMPORT_TIME_BUDGET_RATIO", "0.6"))
+# Chargés au premier jeton / premier mot de passe / première miniature, pas au démarrage
+DEFERRED_MODULES = ("jose.jwt", "jose.jwk", "passlib.context", "PIL.Image", "uvicorn")
+
+def import_times(tmp_path):
+    """{module: temps cumulé en ms} pour FRAMEWORK_MODULES puis app.main dans un processus neuf."""
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    code = f"import {', '.join(FRAMEWORK_MODULES)}; import app.main"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+def import_ratio(times):
+    # app.main ne compte plus que ses propres modules : le framework est déjà chargé
+    return times["app.main"] / sum(times[module] for module in FRAMEWORK_MODULES)
+
+def test_import_time_budget(tmp_path):
+    times = import_times(tmp_path)
+    for module in DEFERRED_MODULES:
+        assert module not in times, f"{module} importé au démarrage"
+    # Meilleure de deux mesures : un seul pic de charge de la machine ne fait pas échouer le test
+    ratio = import_ratio(times)
+    if ratio > IMPORT_TIME_BUDGET_RATIO:
+        ratio = min(ratio, import_ratio(import_times(tmp_path)))
+    assert ratio <= IMPORT_TIME_BUDGET_RATIO, (
+        f"import de app.main : {times['app.main']:.0f} ms, {ratio:.2f} x le framework (budget {IMPORT_TIME_BUDGET_RATIO:.2f})"
+    )
+
+class FakeWorker:
+    """Remplace jobs.Worker : le lifespan est vérifié sans exécuter de tâches sur la base partagée."""
+
+    def __init__(self):
+        self.calls = []
+
+    def start(self):
+        self.calls.append("start")
+
+    def stop(self):
+        self.calls.append("stop")
+
+def test_lifespan_starts_and_stops_job_worker(monkeypatch):
+    from app.main import app
+    monkeypatch.setattr(config, "JOBS_IN_PROCESS", True)
+    monkeypatch.setattr(jobs, "Worker", FakeWorker)
+    with TestClient(app) as client:
+        worker = app.state.job_worker
+        assert isinstance(worker, FakeWorker) and worker.calls == ["start"]
+        assert client.get("/books/").status_code == 200
+    assert worker.calls == ["start", "stop"]
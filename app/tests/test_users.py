@@ -1,5 +1,7 @@
+import uuid
 import pytest
 from fastapi.testclient import TestClient
+from app import cache
 from app.main import app
 
 client = TestClient(app)
@@ -30,4 +32,157 @@ def test_get_profile(test_user):
     response = client.get("/users/me", headers=headers)
     assert response.status_code == 200
     data = response.json()
-    assert data["username"] == test_user["username"] 
\ No newline at end of file
+    assert data["username"] == test_user["username"]
+
+@pytest.fixture
+def cache_user():
+    # Utilisateur dédié : son rôle change pendant le test, testuser reste admin
+    user = {"username": f"cacheduser-{uuid.uuid4().hex[:8]}", "email": f"cached-{uuid.uuid4().hex[:8]}@example.com", "password": "cachedpass"}
+    client.post("/users/register", json=user)
+    return user
+
+def test_current_user_cache(cache_user, login_headers):
+    from app import cache, database, models
+    headers = login_headers(cache_user["username"], cache_user["password"])
+    client.get("/users/me", headers=headers)
+    hits = cache.user_cache.stats()["hits"]
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 200
+    assert cache.user_cache.stats()["hits"] == hits + 1
+    # Un changement de rôle invalide l'entrée
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == cache_user["username"]).first()
+    user.role = "admin"
+    db.commit()
+    db.close()
+    assert client.get("/users/me", headers=headers).json()["role"] == "admin"
+
+class SharedCache(cache.CacheBackend):
+    """Cache partagé de test : un dict commun, comme le serait un Redis entre workers."""
+
+    def __init__(self, store: dict):
+        self.store = store
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = dict(value)
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def clear(self):
+        self.store.clear()
+
+def test_shared_user_cache_backend(cache_user, login_headers, monkeypatch):
+    from app import database, models
+    store = {}
+    monkeypatch.setattr(cache, "user_cache", cache.user_cache)
+    cache.set_user_cache_backend(SharedCache(store))
+    headers = login_headers(cache_user["username"], cache_user["password"])
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert store[cache_user["username"]]["username"] == cache_user["username"]
+    assert "hashed_password" not in store[cache_user["username"]]
+    # Entrée posée par un autre worker : servie sans lire la table
+    store[cache_user["username"]]["email"] = "from-another-worker@example.com"
+    assert client.get("/users/me", headers=headers).json()["email"] == "from-another-worker@example.com"
+    # Une modification par l'ORM vide l'entrée partagée
+    with database.SessionLocal() as db:
+        db.query(models.User).filter(models.User.username == cache_user["username"]).first().role = "user"
+        db.commit()
+    assert cache_user["username"] not in store
+    with pytest.raises(TypeError):
+        cache.CacheBackend()
+
+def test_login_rehashes_outdated_hash():
+    from passlib.context import CryptContext
+    from app import auth, config, database, models
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "rehashuser").first()
+    if user is None:
+        user = models.User(username="rehashuser", email="rehashuser@example.com", hashed_password="")
+        db.add(user)
+    user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("rehashpass")
+    db.commit()
+    response = client.post("/users/login", data={"username": "rehashuser", "password": "rehashpass"})
+    assert response.status_code == 200
+    db.refresh(user)
+    assert user.hashed_password.startswith(f"$2b${config.BCRYPT_ROUNDS:02d}$")
+    assert auth.verify_password("rehashpass", user.hashed_password)
+    db.close()
+
+def test_admin_stats(test_user):
+    login_resp = client.post("/users/login", data={"username": test_user["username"], "password": test_user["password"]})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    response = client.get("/admin/stats", headers=headers)
+    assert response.status_code == 200
+    pool = response.json()["pools"]["primary"]
+    assert pool["checkouts"] > 0
+    assert "wait_seconds_max" in pool
+
+def test_token_claims_authorize_admin_without_db(test_user, login_headers, count_queries):
+    from jose import jwt
+    from app import auth
+    headers = login_headers(test_user["username"], test_user["password"])
+    token = headers["Authorization"].split()[1]
+    claims = jwt.get_unverified_claims(token)
+    assert claims["sub"] == test_user["username"] and claims["role"] == "admin"
+    assert {"uid", "jti", "exp"} <= set(claims)
+    assert jwt.get_unverified_header(token)["kid"] == auth.ACTIVE_KID
+    client.get("/admin/stats", headers=headers)
+    with count_queries() as statements:
+        assert client.get("/admin/stats", headers=headers).status_code == 200
+    assert statements == []
+
+def test_logout_revokes_token(test_user, login_headers, tmp_path, monkeypatch):
+    from jose import jwt
+    from app import database, revocation
+    local = revocation.RevocationList(str(tmp_path / "revoked_tokens.bloom"), 1000, 0.001, 0)
+    monkeypatch.setattr(revocation, "revocations", local)
+    # Autre machine : son propre fichier, construit avant la révocation
+    remote = revocation.RevocationList(str(tmp_path / "remote.bloom"), 1000, 0.001, 0)
+    with database.SessionLocal() as db:
+        remote.rebuild(db)
+    headers = login_headers(test_user["username"], test_user["password"])
+    other = login_headers(test_user["username"], test_user["password"])
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert client.post("/users/logout", headers=headers).status_code == 204
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.get("/admin/stats", headers=headers).status_code == 401
+    # Les autres jetons du même utilisateur restent valides
+    assert client.get("/users/me", headers=other).status_code == 200
+    jti = jwt.get_unverified_claims(headers["Authorization"].split()[1])["jti"]
+    # Un autre worker de la machine relit le filtre depuis le fichier partagé
+    assert revocation.RevocationList(local.path, 1000, 0.001, 0).might_be_revoked(jti)
+    # L'autre machine l'apprend par la table revoked_tokens
+    assert not remote.might_be_revoked(jti)
+    with database.SessionLocal() as db:
+        remote.sync(db)
+    assert remote.might_be_revoked(jti)
+
+def test_signing_key_rotation(test_user, login_headers):
+    from app import auth
+    previous = dict(auth.SIGNING_KEYS)
+    old_headers = login_headers(test_user["username"], test_user["password"])
+    try:
+        auth.set_signing_keys({"rotated": "new-secret", **previous})
+        new_headers = login_headers(test_user["username"], test_user["password"])
+        assert client.get("/users/me", headers=new_headers).status_code == 200
+        assert client.get("/users/me", headers=old_headers).status_code == 200
+        # Ancienne clé retirée : les jetons qu'elle a signés sont refusés
+        auth.set_signing_keys({"rotated": "new-secret"})
+        assert client.get("/users/me", headers=old_headers).status_code == 401
+        assert client.get("/users/me", headers=new_headers).status_code == 200
+    finally:
+        auth.set_signing_keys(previous)
+
+def test_bloom_filter():
+    from app.revocation import BloomFilter
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    added = [f"jti-{i}" for i in range(1000)]
+    for item in added:
+        bloom.add(item)
+    assert all(item in bloom for item in added)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
@@ -0,0 +1,28 @@
+"""Worker de tâches de fond dédié, hors du processus de l'API.
+
+Usage : python -m app.worker [--threads N]
+Lancer l'API avec JOBS_IN_PROCESS=0 pour que seuls ces workers exécutent les tâches.
+"""
+import argparse
+import logging
+import signal
+import threading
+from app import config, database, jobs, migrations, tasks  # noqa: F401 (tasks déclare les types de tâches)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=config.JOB_WORKERS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+    migrations.upgrade(database.engine)
+    worker = jobs.Worker(threads=args.threads)
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    worker.start()
+    stopped.wait()
+    # Les tâches en cours se terminent ; une tâche interrompue sera reprise (JOB_LOCK_TIMEOUT_SECONDS)
+    worker.stop()
+
+if __name__ == "__main__":
+    main()
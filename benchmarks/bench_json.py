@@ -0,0 +1,75 @@
+"""Compare la sérialisation des listes : chemin historique (ORM + Pydantic) contre FAST_JSON.
+
+Pages de --limit lignes sur GET /books/, /reviews/book/{id}, /borrows/ et /users/, cache de
+réponses désactivé. Vérifie au passage que les deux corps sont identiques.
+
+Usage : python -m benchmarks.bench_json --rows 1000 --rounds 30
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.suite import percentile
+
+def measure(client, url, headers, rounds):
+    timings = []
+    body = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+        body = response.content
+    return percentile(timings, 50), percentile(timings, 95), body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000, help="lignes par page (et par table)")
+    parser.add_argument("--rounds", type=int, default=30)
+    args = parser.parse_args()
+    # Le cache de réponses masquerait le coût de sérialisation
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from sqlalchemy import insert
+        from fastapi.testclient import TestClient
+        from app import auth, config, crud, database, migrations, models, serialization
+        from app.main import app
+
+        migrations.upgrade(database.engine)
+        hashed = auth.get_password_hash("benchpass")
+        n = args.rows
+        with database.engine.begin() as conn:
+            conn.execute(insert(models.User), [
+                {"username": f"json{i}", "email": f"json{i}@example.com", "hashed_password": hashed, "role": "admin" if i == 0 else "user"}
+                for i in range(n)
+            ])
+            conn.execute(insert(models.Book), [
+                {"title": f"Livre n°{i} « été »", "author": "Auteur", "description": "Résumé " * 10, "owner_id": i % n + 1}
+                for i in range(n)
+            ])
+            conn.execute(insert(models.Review), [{"user_id": i % n + 1, "book_id": 1, "rating": i % 5 + 1, "comment": "Très bien"} for i in range(n)])
+            conn.execute(insert(models.Borrow), [{"user_id": i % n + 1, "book_id": i + 1} for i in range(n)])
+        db = database.SessionLocal()
+        crud.rebuild_book_ratings(db)
+        db.close()
+
+        client = TestClient(app)
+        token = client.post("/users/login", data={"username": "json0", "password": "benchpass"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        urls = [f"/books/?after=&limit={n}", f"/reviews/book/1?limit={n}", f"/borrows/?limit={n}", "/users/"]
+        print(f"encodeur rapide : {'orjson' if serialization.orjson is not None else 'json (orjson absent)'}")
+        for url in urls:
+            config.FAST_JSON = False
+            slow_p50, slow_p95, slow_body = measure(client, url, headers, args.rounds)
+            config.FAST_JSON = True
+            fast_p50, fast_p95, fast_body = measure(client, url, headers, args.rounds)
+            same = "identiques" if slow_body == fast_body else "DIFFÉRENTS"
+            print(f"{url:28s} historique p50={slow_p50:7.2f}ms p95={slow_p95:7.2f}ms | "
+                  f"rapide p50={fast_p50:7.2f}ms p95={fast_p95:7.2f}ms | x{slow_p50 / fast_p50:.1f}, corps {same}")
+        database.engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Latence de GET /books/ pendant une rafale de connexions (/users/login).
+
+Mesure le p50/p99 de GET /books/ seul, puis pendant que --logins threads enchaînent
+des logins bcrypt. Le hachage tourne dans le pool dédié (PASSWORD_HASH_WORKERS) :
+le p99 de GET /books/ ne doit pas se dégrader.
+
+Les clients tournent dans le même processus que l'API : au-delà de quelques threads
+de login par cœur, la contention du GIL côté clients fausse la mesure.
+
+Usage : python -m benchmarks.bench_login --logins 4 --requests 500
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def measure_books(client, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        assert client.get("/books/").status_code == 200
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": percentile(timings, 50), "p99_ms": percentile(timings, 99)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=4, help="threads de login concurrents")
+    parser.add_argument("--requests", type=int, default=300, help="GET /books/ mesurés par phase")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # La base SQLite est relative au répertoire courant
+        os.chdir(tmp)
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            user = {"username": "bench", "email": "bench@example.com", "password": "benchpass"}
+            client.post("/users/register", json=user)
+            idle = measure_books(client, args.requests)
+
+            stop = threading.Event()
+            logins = []
+            def storm():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    status = client.post("/users/login", data={"username": user["username"], "password": user["password"]}).status_code
+                    logins.append((status, (time.perf_counter() - start) * 1000))
+            threads = [threading.Thread(target=storm) for _ in range(args.logins)]
+            for t in threads:
+                t.start()
+            time.sleep(1)
+            loaded = measure_books(client, args.requests)
+            stop.set()
+            for t in threads:
+                t.join()
+
+        ok = [ms for status, ms in logins if status == 200]
+        busy = sum(1 for status, _ in logins if status == 503)
+        print(f"GET /books/ seul          p50={idle['p50_ms']:.2f}ms p99={idle['p99_ms']:.2f}ms")
+        print(f"GET /books/ sous logins   p50={loaded['p50_ms']:.2f}ms p99={loaded['p99_ms']:.2f}ms")
+        if ok:
+            print(f"logins: {len(ok)} ok, {busy} refusés (503), p99={percentile(ok, 99):.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Index de recommandations : temps de construction, de mise à jour incrémentale et de recherche.
+
+Remplit une base temporaire d'emprunts regroupés par « goûts » (chaque lecteur emprunte
+surtout dans un des --clusters groupes de livres), puis mesure :
+  - la reconstruction complète (secondes, taille du fichier) ;
+  - la mise à jour incrémentale après --new-borrows emprunts ;
+  - la latence de index.similar() et index.recommend() (µs, p50/p99) ;
+  - la latence de GET /books/{id}/similar (ms, p50/p99), requête SQL comprise.
+
+Usage : python -m benchmarks.bench_recommendations --users 5000 --books 20000 --borrows 200000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def seed(args, rnd):
+    from sqlalchemy import insert
+    from app import database, models
+    now = datetime.utcnow()
+    cluster_size = max(1, args.books // args.clusters)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"username": f"rec{i}", "email": f"rec{i}@example.com", "hashed_password": "x", "role": "user"}
+            for i in range(args.users)
+        ])
+        conn.execute(insert(models.Book), [
+            {"title": f"Livre {i}", "author": f"Auteur {i % 500}"} for i in range(args.books)
+        ])
+        borrows = []
+        for i in range(args.borrows):
+            user_id = rnd.randint(1, args.users)
+            # 80 % des emprunts dans le groupe du lecteur, le reste au hasard
+            if rnd.random() < 0.8:
+                cluster = user_id % args.clusters
+                book_id = cluster * cluster_size + rnd.randint(1, cluster_size)
+            else:
+                book_id = rnd.randint(1, args.books)
+            borrows.append({
+                "user_id": user_id, "book_id": min(book_id, args.books),
+                "borrow_date": now - timedelta(days=60, minutes=i), "return_date": now - timedelta(days=30, minutes=i),
+            })
+        for start in range(0, len(borrows), 10000):
+            conn.execute(insert(models.Borrow), borrows[start:start + 10000])
+
+def add_borrows(args, rnd, count):
+    from sqlalchemy import insert
+    from app import database, models
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Borrow), [
+            {"user_id": rnd.randint(1, args.users), "book_id": rnd.randint(1, args.books), "borrow_date": now, "return_date": now}
+            for _ in range(count)
+        ])
+
+def time_calls(fn, samples):
+    timings = []
+    for sample in samples:
+        start = time.perf_counter_ns()
+        fn(sample)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    return {"p50_us": round(percentile(timings, 50), 2), "p99_us": round(percentile(timings, 99), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--borrows", type=int, default=50000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--new-borrows", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    rnd = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Base SQLite et index relatifs au répertoire courant
+        os.chdir(tmp)
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+        os.environ.setdefault("JOBS_IN_PROCESS", "0")
+        from fastapi.testclient import TestClient
+        from app import database, migrations, recommendations
+        from app.main import app
+        migrations.upgrade(database.engine)
+        seed(args, rnd)
+        index = recommendations.index
+        report = {"params": vars(args)}
+
+        db = database.SessionLocal()
+        try:
+            report["full_build"] = index.rebuild(db)
+            add_borrows(args, rnd, args.new_borrows)
+            report["incremental_refresh"] = index.refresh(db)
+        finally:
+            db.close()
+
+        book_ids = [rnd.randint(1, args.books) for _ in range(args.lookups)]
+        report["similar"] = time_calls(lambda book_id: index.similar(book_id, 10), book_ids)
+        histories = [[rnd.randint(1, args.books) for _ in range(20)] for _ in range(args.lookups // 20)]
+        report["recommend_20_books"] = time_calls(lambda history: index.recommend(history, 10), histories)
+
+        client = TestClient(app)
+        timings = []
+        for book_id in book_ids[:args.requests]:
+            start = time.perf_counter()
+            assert client.get(f"/books/{book_id}/similar").status_code == 200
+            timings.append((time.perf_counter() - start) * 1000)
+        report["http_similar"] = {"p50_ms": round(percentile(timings, 50), 2), "p99_ms": round(percentile(timings, 99), 2)}
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare la recherche de GET /books/ : index FTS5 contre scans ILIKE.
+
+Usage : python -m benchmarks.bench_search --books 200000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from app import crud, models, search
+
+WORDS = [
+    "amour", "guerre", "paix", "éducation", "sentimentale", "misérables", "étranger", "peste",
+    "château", "forêt", "mémoires", "océan", "révolution", "lumière", "nuit", "été", "hiver",
+    "histoire", "secret", "voyage", "île", "mystérieuse", "capitaine", "comte", "rouge", "noir",
+]
+AUTHORS = ["Victor Hugo", "Émile Zola", "Albert Camus", "Gustave Flaubert", "Jules Verne", "Honoré de Balzac"]
+
+def vocabulary(size: int):
+    # Mots fréquents + mots synthétiques rares, pour des requêtes plus ou moins sélectives
+    rnd = random.Random(1)
+    syllables = ["ba", "ché", "do", "fé", "gu", "la", "mè", "ni", "po", "ré", "si", "tu", "vo", "zé"]
+    return WORDS + ["".join(rnd.choices(syllables, k=4)) for _ in range(size)]
+
+def seed(engine, n_books: int, words):
+    rnd = random.Random(42)
+    rows = [
+        {
+            "title": " ".join(rnd.choices(words, k=3)).capitalize(),
+            "author": rnd.choice(AUTHORS),
+            "description": " ".join(rnd.choices(words, k=25)),
+        }
+        for _ in range(n_books)
+    ]
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 10000):
+            conn.execute(insert(models.Book), rows[i:i + 10000])
+
+def run(db: Session, fn, queries, limit: int):
+    timings = []
+    for params in queries:
+        start = time.perf_counter()
+        fn(db.query(models.Book), **params).limit(limit).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        search.setup_fts(engine)
+        start = time.perf_counter()
+        words = vocabulary(args.vocabulary)
+        seed(engine, args.books, words)
+        print(f"seed: {args.books} livres en {time.perf_counter() - start:.1f}s (index FTS5 inclus)")
+
+        rnd = random.Random(7)
+        queries = []
+        for _ in range(args.queries):
+            kind = rnd.choice(["title", "author", "keyword"])
+            value = rnd.choice(AUTHORS).split()[-1] if kind == "author" else rnd.choice(words)
+            queries.append({kind: value})
+
+        with Session(engine) as db:
+            for name, fn in (("ilike", crud._filter_books_ilike), ("fts5", search.filter_books)):
+                stats = run(db, fn, queries, args.limit)
+                print(f"{name:6s} " + "  ".join(f"{k}={v:.2f}" for k, v in stats.items()))
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
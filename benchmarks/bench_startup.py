@@ -0,0 +1,65 @@
+"""Démarrage à froid d'un worker : import de app.main, lifespan (migrations), première requête.
+
+Chaque mesure lance un processus Python neuf sur une base déjà à jour (cas d'un worker
+ajouté par l'autoscaling) ; --fresh mesure aussi le premier démarrage sur une base vide.
+Les temps sont les médianes et maximums sur --runs processus.
+
+Usage : python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans le processus mesuré : temps en ms de chaque phase, sur la sortie standard
+PROBE = """
+import json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    started = time.perf_counter()
+    assert client.get("/books/").status_code == 200
+    first = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (started - imported) * 1000,
+    "first_request_ms": (first - started) * 1000,
+    "total_ms": (first - start) * 1000,
+}))
+"""
+
+def run_once(cwd: str) -> dict:
+    env = {**os.environ, "PYTHONPATH": ROOT, "JOBS_IN_PROCESS": "0", "RATE_LIMIT_ENABLED": "0"}
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(samples) -> dict:
+    return {
+        phase: {"p50": round(statistics.median(s[phase] for s in samples), 1), "max": round(max(s[phase] for s in samples), 1)}
+        for phase in samples[0]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10, help="processus mesurés")
+    parser.add_argument("--fresh", action="store_true", help="mesure aussi le démarrage sur une base vide")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Premier démarrage : crée et migre la base (relative au répertoire courant)
+        first = run_once(tmp)
+        if args.fresh:
+            report["fresh_database"] = summarize([first])
+        report["up_to_date_database"] = summarize([run_once(tmp) for _ in range(args.runs)])
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
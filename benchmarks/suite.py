@@ -0,0 +1,299 @@
+"""Suite de charge : bibliothèque synthétique, routes réelles en concurrence, comparaison à une référence.
+
+Remplit une base temporaire (utilisateurs, livres, emprunts, avis insérés par lots), puis
+exécute chaque scénario avec --concurrency threads clients sur l'application en processus.
+Débit et latences p50/p95/p99 sont écrits dans --output (JSON). Si --baseline existe et a
+été mesurée avec les mêmes paramètres, un p95 ou un débit dégradé de plus de --tolerance
+fait échouer la commande (code 1).
+
+Les clients tournent dans le même processus que l'API : comparer des mesures prises sur la
+même machine et avec la même concurrence.
+
+Usage :
+  python -m benchmarks.suite                        # mesure et compare à benchmarks/baseline.json
+  python -m benchmarks.suite --update-baseline      # enregistre la mesure comme référence
+  python -m benchmarks.suite --scenarios books_search,login --concurrency 8
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+PASSWORD = "benchpass"
+
+# Paramètres qui doivent être identiques pour comparer deux mesures
+COMPARABLE_PARAMS = ("users", "books", "borrows", "reviews", "concurrency", "requests")
+
+WORDS = [
+    "amour", "guerre", "paix", "éducation", "misérables", "étranger", "peste", "château", "forêt",
+    "mémoires", "océan", "révolution", "lumière", "nuit", "été", "hiver", "histoire", "secret",
+    "voyage", "île", "mystérieuse", "capitaine", "comte", "rouge", "noir", "jardin", "lettres",
+]
+AUTHORS = ["Victor Hugo", "Émile Zola", "Albert Camus", "Gustave Flaubert", "Jules Verne", "Honoré de Balzac"]
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def seed(args):
+    """Remplit la base par INSERT multi-lignes (pas de hachage bcrypt par utilisateur)."""
+    from sqlalchemy import insert
+    from app import auth, crud, database, models
+    rnd = random.Random(42)
+    hashed = auth.get_password_hash(PASSWORD)
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"username": f"bench{i}", "email": f"bench{i}@example.com", "hashed_password": hashed, "role": "user"}
+            for i in range(args.users)
+        ])
+        conn.execute(insert(models.Book), [
+            {
+                "title": " ".join(rnd.choices(WORDS, k=3)).capitalize(),
+                "author": rnd.choice(AUTHORS),
+                "description": " ".join(rnd.choices(WORDS, k=20)),
+                "owner_id": rnd.randint(1, args.users),
+            }
+            for _ in range(args.books)
+        ])
+        # Emprunts historiques, tous rendus : les livres restent disponibles pour borrow_return
+        conn.execute(insert(models.Borrow), [
+            {
+                "user_id": rnd.randint(1, args.users),
+                "book_id": rnd.randint(1, args.books),
+                "borrow_date": now - timedelta(days=30, minutes=i),
+                "return_date": now - timedelta(days=1, minutes=i),
+            }
+            for i in range(args.borrows)
+        ])
+        conn.execute(insert(models.Review), [
+            {
+                "user_id": rnd.randint(1, args.users),
+                "book_id": rnd.randint(1, args.books),
+                "rating": rnd.randint(1, 5),
+                "comment": " ".join(rnd.choices(WORDS, k=8)),
+                "created_at": now - timedelta(minutes=i),
+                "updated_at": now - timedelta(minutes=i),
+            }
+            for i in range(args.reviews)
+        ])
+    db = database.SessionLocal()
+    try:
+        crud.rebuild_book_ratings(db)
+    finally:
+        db.close()
+
+class Worker:
+    """État d'un thread client : générateur aléatoire, jeton, curseur de pagination."""
+
+    def __init__(self, index: int, args, headers: Dict[str, str]):
+        self.index = index
+        self.rnd = random.Random(index)
+        self.headers = headers
+        self.user = f"bench{index % args.users}"
+        self.cursor = ""
+        self.args = args
+        # Livres réservés à ce thread pour borrow_return : pas de conflit entre threads
+        self.books = list(range(index + 1, args.books + 1, args.concurrency))
+        self.next_book = 0
+
+def books_search(client, w: Worker) -> bool:
+    return client.get("/books/", params={"keyword": w.rnd.choice(WORDS), "limit": 20}).status_code == 200
+
+def books_pagination(client, w: Worker) -> bool:
+    response = client.get("/books/", params={"after": w.cursor, "limit": 50})
+    w.cursor = response.headers.get("X-Next-Cursor", "")
+    return response.status_code == 200
+
+def borrow_return(client, w: Worker) -> bool:
+    book_id = w.books[w.next_book % len(w.books)]
+    w.next_book += 1
+    borrowed = client.post("/borrows/", json={"book_id": book_id}, headers=w.headers)
+    if borrowed.status_code != 201:
+        return False
+    return client.post(f"/borrows/{borrowed.json()['id']}/return", headers=w.headers).status_code == 200
+
+CART_SIZE = 20
+
+def borrow_return_batch(client, w: Worker) -> bool:
+    # Chariot de CART_SIZE livres : un appel pour l'emprunt, un pour le retour
+    start = w.next_book
+    w.next_book += CART_SIZE
+    cart = [w.books[(start + i) % len(w.books)] for i in range(CART_SIZE)]
+    borrowed = client.post("/borrows/batch", json={"book_ids": cart}, headers=w.headers)
+    if borrowed.status_code != 200 or any(r["status"] != 201 for r in borrowed.json()):
+        return False
+    borrow_ids = [r["borrow"]["id"] for r in borrowed.json()]
+    returned = client.post("/borrows/return/batch", json={"borrow_ids": borrow_ids}, headers=w.headers)
+    return returned.status_code == 200 and all(r["status"] == 200 for r in returned.json())
+
+def review_create(client, w: Worker) -> bool:
+    review = {"book_id": w.rnd.randint(1, w.args.books), "rating": w.rnd.randint(1, 5), "comment": "bench"}
+    return client.post("/reviews/", json=review, headers=w.headers).status_code == 201
+
+def login(client, w: Worker) -> bool:
+    return client.post("/users/login", data={"username": w.user, "password": PASSWORD}).status_code == 200
+
+def export_csv(client, w: Worker) -> bool:
+    response = client.get("/books/export/csv")
+    return response.status_code == 200 and len(response.content) > 0
+
+SCENARIOS: Dict[str, Callable] = {
+    "books_search": books_search,
+    "books_pagination": books_pagination,
+    "borrow_return": borrow_return,
+    "borrow_return_batch": borrow_return_batch,
+    "review_create": review_create,
+    "login": login,
+    "export_csv": export_csv,
+}
+# Opérations coûteuses : moins de répétitions
+REQUEST_SCALE = {"login": 0.1, "export_csv": 0.05, "borrow_return_batch": 0.05}
+
+def run_scenario(client, fn, workers: List[Worker], operations: int) -> dict:
+    timings: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = max(1, operations // len(workers))
+
+    def loop(w: Worker):
+        nonlocal errors
+        local, failed = [], 0
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            ok = fn(client, w)
+            local.append((time.perf_counter() - start) * 1000)
+            failed += not ok
+        with lock:
+            timings.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=loop, args=(w,)) for w in workers]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "operations": len(timings),
+        "errors": errors,
+        "throughput_ops": round(len(timings) / elapsed, 2),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Régressions par rapport à la référence (liste vide : rien à signaler)."""
+    failures = []
+    for name, base in baseline["scenarios"].items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {current['p95_ms']:.2f}ms > {base['p95_ms']:.2f}ms (+{tolerance:.0%} toléré)")
+        if current["throughput_ops"] < base["throughput_ops"] * (1 - tolerance):
+            failures.append(f"{name}: débit {current['throughput_ops']:.1f}/s < {base['throughput_ops']:.1f}/s (-{tolerance:.0%} toléré)")
+        if current["errors"] > base["errors"]:
+            failures.append(f"{name}: {current['errors']} erreurs (référence : {base['errors']})")
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--borrows", type=int, default=10000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=4, help="threads clients par scénario")
+    parser.add_argument("--requests", type=int, default=400, help="opérations par scénario (réduit pour login et export)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="liste séparée par des virgules")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="dégradation tolérée (0.3 : 30 %%)")
+    parser.add_argument("--update-baseline", action="store_true", help="écrit la mesure dans --baseline")
+    args = parser.parse_args(argv)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+
+    # Les scénarios (login...) mesurent l'API, pas la limitation de débit
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    with tempfile.TemporaryDirectory() as tmp:
+        # La base SQLite (et les fichiers annexes) sont relatifs au répertoire courant
+        os.chdir(tmp)
+        from fastapi.testclient import TestClient
+        from app import database, migrations
+        from app.main import app
+
+        migrations.upgrade(database.engine)
+        start = time.perf_counter()
+        seed(args)
+        print(f"seed : {args.users} utilisateurs, {args.books} livres, {args.borrows} emprunts, "
+              f"{args.reviews} avis en {time.perf_counter() - start:.1f}s")
+
+        results = {
+            "meta": {
+                **{p: getattr(args, p) for p in COMPARABLE_PARAMS},
+                "date": datetime.utcnow().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+            },
+            "scenarios": {},
+        }
+        with TestClient(app) as client:
+            workers = []
+            for i in range(args.concurrency):
+                username = f"bench{i % args.users}"
+                token = client.post("/users/login", data={"username": username, "password": PASSWORD}).json()["access_token"]
+                workers.append(Worker(i, args, {"Authorization": f"Bearer {token}"}))
+            for name in names:
+                operations = max(args.concurrency, int(args.requests * REQUEST_SCALE.get(name, 1)))
+                stats = run_scenario(client, SCENARIOS[name], workers, operations)
+                results["scenarios"][name] = stats
+                print(f"{name:17s} {stats['throughput_ops']:8.1f} op/s  p50={stats['p50_ms']:.2f}ms "
+                      f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms  erreurs={stats['errors']}")
+        database.engine.dispose()
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"résultats : {output}")
+
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"référence mise à jour : {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print("pas de référence : relancer avec --update-baseline pour en enregistrer une")
+        return 0
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatched = [p for p in COMPARABLE_PARAMS if baseline["meta"].get(p) != results["meta"][p]]
+    if mismatched:
+        print(f"référence ignorée : paramètres différents ({', '.join(mismatched)})")
+        return 0
+    failures = compare(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"RÉGRESSION {failure}")
+    if not failures:
+        print(f"aucune régression par rapport à {baseline_path}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
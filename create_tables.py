@@ -1,5 +1,5 @@
-from app import models, database
+from app import database, migrations
 
 if __name__ == "__main__":
-    models.Base.metadata.create_all(bind=database.engine)
-    print("Tables créées avec succès.") 
\ No newline at end of file
+    version = migrations.upgrade(database.engine)
+    print(f"Tables créées avec succès (schéma version {version}).")
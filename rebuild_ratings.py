@@ -0,0 +1,11 @@
+from app import crud, database, migrations
+
+# Recalcule les agrégats d'avis (moyenne, nombre) de tous les livres, par ex. après un import
+if __name__ == "__main__":
+    migrations.upgrade(database.engine)
+    db = database.SessionLocal()
+    try:
+        count = crud.rebuild_book_ratings(db)
+    finally:
+        db.close()
+    print(f"Agrégats recalculés pour {count} livres.")